@@ -0,0 +1,168 @@
+"""Admission control and load shedding for the search endpoints.
+
+Each modality has a pool of slots. A request takes one slot, except video
+uploads which take one slot per ``video_slot_bytes`` of body so that a few
+large uploads cannot exhaust memory. Requests that do not fit wait in a
+bounded FIFO queue; when the queue is full, or the expected wait exceeds the
+request's deadline, they are rejected immediately with a ``Retry-After``
+hint instead of piling up behind slow upstream calls.
+"""
+
+import asyncio
+import math
+import time
+import weakref
+from collections import deque
+
+from api import metrics
+
+
+class Rejected(Exception):
+    """Raised when a request is shed; carries the HTTP status and retry hint."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class _Pool:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.in_use = 0
+        self.waiters: deque[tuple[int, asyncio.Future]] = deque()
+        # Exponentially weighted average of how long a slot is held.
+        self.service_time = 0.5
+
+    def fits(self, weight: int) -> bool:
+        return self.in_use + weight <= self.capacity
+
+    def expected_wait(self, weight: int) -> float:
+        """Rough time until ``weight`` slots free up behind the current queue."""
+
+        queued = sum(w for w, _ in self.waiters) + weight
+        return self.service_time * queued / max(self.capacity, 1)
+
+    def grant_waiters(self) -> None:
+        while self.waiters and self.fits(self.waiters[0][0]):
+            weight, future = self.waiters.popleft()
+            if future.done():
+                continue
+            self.in_use += weight
+            future.set_result(None)
+
+
+class AdmissionController:
+    def __init__(
+        self,
+        limits: dict[str, int],
+        queue_size: int = 64,
+        max_wait_sec: float = 10.0,
+        video_slot_bytes: int = 5 * 1024 * 1024,
+    ):
+        self.pools = {modality: _Pool(limit) for modality, limit in limits.items() if limit > 0}
+        self.queue_size = queue_size
+        self.max_wait_sec = max_wait_sec
+        self.video_slot_bytes = video_slot_bytes
+
+    def weight(self, modality: str, content_length: int | None) -> int:
+        """Return the slots a request needs, capped at the pool capacity."""
+
+        pool = self.pools[modality]
+        if modality != "video" or not content_length:
+            return 1
+        return max(1, min(pool.capacity, math.ceil(content_length / self.video_slot_bytes)))
+
+    async def acquire(self, modality: str, weight: int, timeout: float | None = None) -> None:
+        """Wait for ``weight`` slots of ``modality`` or raise :class:`Rejected`.
+
+        ``timeout`` is the time the client is still willing to wait; the
+        configured maximum wait applies when it is not given or larger.
+        """
+
+        pool = self.pools[modality]
+        budget = min(timeout, self.max_wait_sec) if timeout is not None else self.max_wait_sec
+
+        if not pool.waiters and pool.fits(weight):
+            pool.in_use += weight
+            return
+
+        retry_after = max(1, math.ceil(pool.expected_wait(weight)))
+        if len(pool.waiters) >= self.queue_size:
+            metrics.admission_rejected.inc(modality=modality, reason="queue_full")
+            raise Rejected(429, "The server is busy. Please retry shortly.", retry_after)
+        if pool.expected_wait(weight) > budget:
+            metrics.admission_rejected.inc(modality=modality, reason="deadline")
+            raise Rejected(503, "The server cannot complete this request in time. Please retry shortly.", retry_after)
+
+        future = asyncio.get_running_loop().create_future()
+        pool.waiters.append((weight, future))
+        metrics.admission_queued.inc(modality=modality)
+        try:
+            await asyncio.wait_for(future, budget)
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # The slots were granted just before the wait was cancelled,
+                # e.g. by a client disconnect; hand them to the next waiter.
+                pool.in_use -= weight
+            else:
+                try:
+                    pool.waiters.remove((weight, future))
+                except ValueError:
+                    pass
+            pool.grant_waiters()
+            if isinstance(e, asyncio.TimeoutError):
+                metrics.admission_rejected.inc(modality=modality, reason="timeout")
+                raise Rejected(503, "The server is busy. Please retry shortly.", retry_after)
+            raise
+        finally:
+            metrics.admission_queued.dec(modality=modality)
+
+    def release(self, modality: str, weight: int, held_sec: float) -> None:
+        pool = self.pools[modality]
+        pool.in_use -= weight
+        pool.service_time = 0.8 * pool.service_time + 0.2 * held_sec
+        pool.grant_waiters()
+
+    async def __call__(self, modality: str, content_length: int | None, timeout: float | None, call):
+        """Run ``call`` once admitted, holding the slots until its response is sent.
+
+        Streamed responses keep working after ``call`` returns their headers,
+        so when the response has a ``body_iterator`` the slots are released
+        once the body is finished, fails or is dropped by a disconnect.
+        """
+
+        weight = self.weight(modality, content_length)
+        await self.acquire(modality, weight, timeout)
+        start = time.monotonic()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if not released:
+                released = True
+                self.release(modality, weight, time.monotonic() - start)
+
+        try:
+            response = await call()
+        except BaseException:
+            release()
+            raise
+
+        body = getattr(response, "body_iterator", None)
+        if body is None:
+            release()
+            return response
+
+        async def held_body():
+            try:
+                async for chunk in body:
+                    yield chunk
+            finally:
+                release()
+
+        response.body_iterator = held_body()
+        # A body that is never iterated, e.g. after an early disconnect, never runs its finally.
+        weakref.finalize(response.body_iterator, release)
+        return response
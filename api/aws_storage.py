@@ -1,8 +1,21 @@
 """Utilities for interacting with AWS storage."""
 
+from urllib.parse import unquote, urlparse
+
+from api import s3
 from api.config import settings
 
 
+class ObjectNotFound(Exception):
+    """Raised when a referenced S3 object does not exist."""
+
+
+def client():
+    """Return the process-wide S3 client, pooled for the threadpool."""
+
+    return s3.shared_client(settings.aws_region, settings.s3_max_pool_connections)
+
+
 def _split_bucket_prefix(path: str) -> tuple[str, str]:
     """Return bucket and key prefix from a path.
 
@@ -55,3 +68,56 @@ def public_url(path: str | None, file_name: str | None) -> str:
 
     key = f"{prefix}{file_name}" if file_name else prefix
     return f"https://{bucket}.s3.amazonaws.com/{key}"
+
+
+def parse_object_ref(ref: str) -> tuple[str, str]:
+    """Return ``(bucket, key)`` for an S3 object reference.
+
+    Accepts ``s3://bucket/key``, virtual-hosted and path-style S3 URLs, as
+    returned in ``s3_public_url``, and bare keys in the configured bucket.
+    Only buckets listed in ``S3_SEARCH_BUCKETS`` may be referenced.
+    """
+
+    ref = (ref or "").strip()
+    parsed = urlparse(ref)
+    if parsed.scheme == "s3":
+        bucket, key = parsed.netloc, parsed.path.lstrip("/")
+    elif parsed.scheme in ("http", "https"):
+        host = parsed.hostname or ""
+        path = unquote(parsed.path.lstrip("/"))
+        if ".s3." in host or host.endswith(".s3.amazonaws.com"):
+            bucket, key = host.split(".s3.", 1)[0], path
+        elif host.startswith("s3.") or host.startswith("s3-"):
+            bucket, _, key = path.partition("/")
+        else:
+            raise ValueError(f"Not an S3 URL: {ref}")
+    else:
+        bucket, key = settings.s3_bucket_name or "", ref.lstrip("/")
+
+    if not bucket or not key:
+        raise ValueError(f"Invalid S3 object reference: {ref}")
+    if bucket not in settings.s3_search_buckets:
+        raise ValueError(f"Searching objects in bucket {bucket} is not allowed")
+    return bucket, key
+
+
+def head_object(bucket: str, key: str) -> dict:
+    """Return the object's metadata (``ETag``, ``ContentLength``, ...)."""
+
+    try:
+        return s3.with_retries(lambda: client().head_object(Bucket=bucket, Key=key))
+    except Exception as e:
+        if s3.is_not_found(e):
+            raise ObjectNotFound(f"s3://{bucket}/{key} does not exist")
+        raise
+
+
+def get_object_bytes(bucket: str, key: str, etag: str | None = None) -> bytes:
+    """Download an object; with ``etag``, only that version of it."""
+
+    try:
+        return s3.download(client(), bucket, key, etag)
+    except Exception as e:
+        if s3.is_not_found(e):
+            raise ObjectNotFound(f"s3://{bucket}/{key} does not exist")
+        raise
@@ -4,6 +4,7 @@ from datetime import datetime, timedelta
 from google.oauth2 import service_account
 from google.auth.transport.requests import Request
 from dotenv import load_dotenv
+from api import metrics
 
 # Load environment variables from a file before accessing them.
 # Priority: DOTENV_PATH env var, otherwise fall back to `.env.<ENVIRONMENT>`.
@@ -19,8 +20,23 @@ class Settings:
         # Google services
         self.project_id = os.getenv('GOOGLE_CLOUD_PROJECT_ID')
         self.location = os.getenv('GOOGLE_CLOUD_PROJECT_LOCATION')
+        # Optional second region that slow embedding calls are hedged to
+        self.secondary_location = os.getenv('GOOGLE_CLOUD_PROJECT_SECONDARY_LOCATION')
+        # Base URL of the Vertex AI API; ``{location}`` is replaced by the region
+        self.vertex_endpoint = os.getenv('VERTEX_API_ENDPOINT') or 'https://{location}-aiplatform.googleapis.com'
+        self.embedding_timeout_sec = float(os.getenv('EMBEDDING_TIMEOUT_SEC', '30'))
+        self.embedding_hedge_after_ms = int(os.getenv('EMBEDDING_HEDGE_AFTER_MS', '1500'))
+        self.circuit_failure_threshold = int(os.getenv('EMBEDDING_CIRCUIT_FAILURES', '5'))
+        self.circuit_reset_sec = float(os.getenv('EMBEDDING_CIRCUIT_RESET_SEC', '30'))
         # AWS S3 bucket used for asset storage
         self.s3_bucket_name = os.getenv('S3_BUCKET_NAME')
+        self.aws_region = os.getenv('AWS_REGION')
+        # Buckets the search endpoints may read objects from by reference,
+        # comma separated; defaults to S3_BUCKET_NAME.
+        self.s3_search_buckets = [b for b in self._split(os.getenv('S3_SEARCH_BUCKETS')) if b] or (
+            [self.s3_bucket_name] if self.s3_bucket_name else []
+        )
+        self.s3_max_pool_connections = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32'))
         self.google_credentials_base64 = os.getenv('GOOGLE_CREDENTIALS_BASE64')
         self.credentials_path = os.getenv('GOOGLE_APPLICATION_CREDENTIALS') or '/tmp/google-credentials.json'
         self.access_token = None
@@ -32,11 +48,67 @@ class Settings:
         self.index_name = os.getenv('PINECONE_INDEX_NAME')
         self.k = int(os.getenv('PINECONE_TOP_K'))
 
+        # Namespaces holding each modality, comma separated. Unset means the
+        # default namespace, as used by indexes that are not partitioned.
+        self.namespaces = {
+            'image': self._split(os.getenv('PINECONE_IMAGE_NAMESPACES')),
+            'video': self._split(os.getenv('PINECONE_VIDEO_NAMESPACES')),
+        }
+
+        # Admission control: concurrent slots per modality (0 disables the
+        # limit), wait queue length per modality and longest wait in seconds.
+        # Video uploads take one slot per ADMISSION_VIDEO_SLOT_MB of body.
+        self.admission_limits = {
+            'text': int(os.getenv('ADMISSION_TEXT_LIMIT', '32')),
+            'image': int(os.getenv('ADMISSION_IMAGE_LIMIT', '16')),
+            'video': int(os.getenv('ADMISSION_VIDEO_LIMIT', '8')),
+        }
+        self.admission_queue_size = int(os.getenv('ADMISSION_QUEUE_SIZE', '64'))
+        self.admission_max_wait_sec = float(os.getenv('ADMISSION_MAX_WAIT_SEC', '10'))
+        self.admission_video_slot_mb = float(os.getenv('ADMISSION_VIDEO_SLOT_MB', '5'))
+
+        # Host-local caches shared by all workers (0 slots disables a cache).
+        # Embedding slots hold one 1408-dim vector stored as float32, float16
+        # or int8; result slots hold a compressed response or cached query.
+        self.shared_cache_dir = os.getenv('SHARED_CACHE_DIR')
+        self.embedding_cache_slots = int(os.getenv('EMBEDDING_CACHE_SLOTS', '8192'))
+        self.embedding_cache_dtype = os.getenv('EMBEDDING_CACHE_DTYPE', 'float16')
+        self.result_cache_slots = int(os.getenv('RESULT_CACHE_SLOTS', '2048'))
+        self.result_cache_ttl_sec = float(os.getenv('RESULT_CACHE_TTL_SEC', '60'))
+
+        # Per-request sampling profiles: requests carrying PROFILE_TOKEN in an
+        # X-Profile header are profiled (unset disables this), and
+        # PROFILE_SAMPLE_RATE of search requests feed an aggregate profile.
+        self.profile_token = os.getenv('PROFILE_TOKEN')
+        self.profile_dir = os.getenv('PROFILE_DIR')
+        self.profile_interval_ms = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+        self.profile_retention = int(os.getenv('PROFILE_RETENTION', '100'))
+        self.profile_max_age_hours = float(os.getenv('PROFILE_MAX_AGE_HOURS', '24'))
+        self.profile_sample_rate = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+        self.profile_flush_sec = float(os.getenv('PROFILE_FLUSH_SEC', '60'))
+        self.profile_max_stacks = int(os.getenv('PROFILE_MAX_STACKS', '2000'))
+
+        # /api/index/info is served from statistics refreshed in the
+        # background every INDEX_STATS_REFRESH_SEC; a request refreshes them
+        # itself only if they are older than INDEX_STATS_MAX_AGE_SEC and the
+        # last refresh did not fail.
+        self.index_stats_refresh_sec = float(os.getenv('INDEX_STATS_REFRESH_SEC', '30'))
+        self.index_stats_max_age_sec = float(os.getenv('INDEX_STATS_MAX_AGE_SEC', '120'))
+
+        # Local index snapshot and precomputed item-to-item neighbors
+        # written by scripts/export_index.py and scripts/build_neighbors.py
+        self.snapshot_path = os.getenv('SNAPSHOT_PATH')
+        self.neighbors_path = os.getenv('NEIGHBORS_PATH')
+
         # Basic validation for required variables
         missing = [var for var in ['PINECONE_API_KEY', 'PINECONE_INDEX_NAME', 'PINECONE_TOP_K'] if not os.getenv(var)]
         if missing:
             raise EnvironmentError(f"Missing required environment variables: {', '.join(missing)}")
     
+    @staticmethod
+    def _split(value):
+        return [item.strip() for item in (value or '').split(',') if item.strip()] or ['']
+
     def get_credentials(self):
         if self.credentials:
             return self.credentials
@@ -79,11 +151,14 @@ class Settings:
 
     def get_access_token(self):
         if self.access_token and self.token_expiry and datetime.now() < self.token_expiry:
+            metrics.cache_hits.inc(cache="access_token")
             return self.access_token
 
+        metrics.cache_misses.inc(cache="access_token")
         try:
             credentials = self.get_credentials()
-            credentials.refresh(Request())
+            with metrics.timed("token_refresh", upstream="google_auth"):
+                credentials.refresh(Request())
             self.access_token = credentials.token
             self.token_expiry = datetime.now() + timedelta(hours=1)
             print("Access token refreshed", self.access_token)
@@ -92,16 +167,19 @@ class Settings:
             print(f"Error getting access token: {str(e)}")
             return None
 
-    def get_embedding_request_data(self, access_token, content_type, content):
+    def get_embedding_request_data(self, access_token, content_type, content, location=None):
         """
         Prepares the request data for the multimodal embedding API.
 
         :param access_token: The access token for authentication
         :param content_type: The type of content ('text', 'image', or 'video')
         :param content: The actual content (query string for text, base64 encoded string for image/video)
+        :param location: The region to call, defaults to GOOGLE_CLOUD_PROJECT_LOCATION
         :return: A tuple containing the URL, headers, and data for the API request
         """
-        url = f"https://{self.location}-aiplatform.googleapis.com/v1/projects/{self.project_id}/locations/{self.location}/publishers/google/models/multimodalembedding@001:predict"
+        location = location or self.location
+        base_url = self.vertex_endpoint.format(location=location)
+        url = f"{base_url}/v1/projects/{self.project_id}/locations/{location}/publishers/google/models/multimodalembedding@001:predict"
         
         headers = {
             "Authorization": f"Bearer {access_token}",
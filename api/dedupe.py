@@ -0,0 +1,238 @@
+"""Near-duplicate detection for ingestion.
+
+Design folders hold many re-exports of the same artwork. Two checks keep
+them out of the index:
+
+1. Before embedding, a 64-bit difference hash (dHash) of the image is
+   compared with the images seen earlier in the run. Resized or
+   re-compressed copies hash within a few bits of the original, so they are
+   caught without a Vertex AI call.
+2. After embedding, the vector is compared with the recently ingested
+   vectors and with its nearest neighbor in the index. A cosine similarity
+   at or above the threshold marks it as a duplicate, which also catches
+   variants the hash misses, such as colorways.
+
+The detector only reports duplicates; callers decide whether to skip them or
+link them to the original with :func:`link_duplicate`.
+"""
+
+import io
+import threading
+
+import numpy as np
+from PIL import Image
+
+
+def dhash(image_bytes: bytes, size: int = 8) -> int:
+    """Return the ``size * size``-bit difference hash of an image.
+
+    Each bit records whether a pixel of the downscaled grayscale image is
+    brighter than its right neighbor, so the hash survives resizing and
+    compression but not crops.
+    """
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PendingDuplicate(Exception):
+    """Raised when an item duplicates one that is reserved but not ingested yet.
+
+    The original may still fail, so the caller should retry the item later
+    rather than skip it or link it to a vector that does not exist.
+    """
+
+    def __init__(self, original_id: str):
+        super().__init__(f"Duplicate of {original_id}, which is still being ingested")
+        self.original_id = original_id
+
+
+class DuplicateDetector:
+    """Find near-duplicates of new items among recent and indexed vectors.
+
+    ``index`` is the Pinecone index queried for existing vectors; without
+    it only items seen in this run are compared. ``recent_size`` bounds the
+    number of hashes and vectors kept in memory. A ``hash_distance`` below 0
+    disables the hash pre-check.
+
+    Recent vectors are kept normalized in a ring buffer, so comparing a new
+    vector with all of them is a single matrix-vector product.
+
+    Checking an item and remembering it is one step under the detector's
+    lock (:meth:`reserve_hash`, :meth:`reserve_vector`), so of two
+    near-duplicates processed at the same time only the first is ingested.
+    A reserved item counts as pending until :meth:`confirm` is called once
+    it was upserted, or is forgotten again by :meth:`release` if that failed.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.97,
+        hash_distance: int = 2,
+        recent_size: int = 5000,
+        index=None,
+        namespace: str = "",
+    ):
+        self.threshold = threshold
+        self.hash_distance = hash_distance
+        self.recent_size = recent_size
+        self.index = index
+        self.namespace = namespace
+        self._ids: list[str | None] = []
+        self._hashes: list[int | None] = []
+        self._vectors: np.ndarray | None = None
+        self._rows: dict[str, int] = {}
+        self._pending: set[str] = set()
+        self._next = 0
+        self._lock = threading.Lock()
+        self.hash_duplicates = 0
+        self.vector_duplicates = 0
+
+    @staticmethod
+    def _normalize(vector: list[float]) -> np.ndarray:
+        normalized = np.asarray(vector, dtype=np.float32)
+        return normalized / (np.linalg.norm(normalized) or 1.0)
+
+    def _store(self, item_id: str, normalized: np.ndarray | None, image_hash: int | None) -> None:
+        # Callers hold the lock.
+        if normalized is not None and self._vectors is None:
+            self._vectors = np.zeros((self.recent_size, normalized.shape[0]), dtype=np.float32)
+        row = self._rows.get(item_id)
+        if row is None:
+            row = self._next
+            self._next = (row + 1) % self.recent_size
+            if row < len(self._ids):
+                self._rows.pop(self._ids[row], None)
+                self._pending.discard(self._ids[row])
+                self._ids[row], self._hashes[row] = item_id, image_hash
+            else:
+                self._ids.append(item_id)
+                self._hashes.append(image_hash)
+            if self._vectors is not None:
+                self._vectors[row] = 0
+            self._rows[item_id] = row
+        elif image_hash is not None:
+            self._hashes[row] = image_hash
+        if normalized is not None:
+            self._vectors[row] = normalized
+
+    def _forget(self, item_id: str) -> None:
+        # Callers hold the lock.
+        row = self._rows.pop(item_id, None)
+        self._pending.discard(item_id)
+        if row is not None:
+            self._ids[row] = self._hashes[row] = None
+            if self._vectors is not None:
+                self._vectors[row] = 0
+
+    def _found(self, original_id: str, item_id: str) -> str:
+        # Callers hold the lock.
+        if original_id in self._pending:
+            self._forget(item_id)
+            raise PendingDuplicate(original_id)
+        self._forget(item_id)
+        return original_id
+
+    def reserve_hash(self, item_id: str, image_hash: int) -> str | None:
+        """Return the id of a recent item whose hash is close to ``image_hash``.
+
+        Otherwise ``item_id`` is reserved with the hash and ``None`` returned.
+        Raises :class:`PendingDuplicate` if the close item is still pending.
+        """
+
+        if self.hash_distance < 0:
+            return None
+        with self._lock:
+            for other_id, other_hash in zip(self._ids, self._hashes):
+                if other_id in (None, item_id) or other_hash is None:
+                    continue
+                if hamming(other_hash, image_hash) <= self.hash_distance:
+                    original_id = self._found(other_id, item_id)
+                    self.hash_duplicates += 1
+                    return original_id
+            self._store(item_id, None, image_hash)
+            self._pending.add(item_id)
+        return None
+
+    def reserve_vector(self, item_id: str, vector: list[float], image_hash: int | None = None) -> tuple[str, float] | None:
+        """Return ``(id, score)`` of the closest duplicate of ``vector``, if any.
+
+        Otherwise ``item_id`` is reserved with the vector and ``None`` returned.
+        Raises :class:`PendingDuplicate` if the duplicate is still pending.
+        """
+
+        query = self._normalize(vector)
+
+        # Only items that are already upserted are found in the index, so it
+        # is queried outside the lock; concurrent items meet in the ring buffer.
+        best: tuple[str, float] | None = None
+        if self.index is not None:
+            matches = self.index.query(vector=vector, top_k=2, namespace=self.namespace)["matches"]
+            # Pinecone returns cosine similarity for cosine indexes.
+            matches = [match for match in matches if match["id"] != item_id]
+            if matches:
+                best = (matches[0]["id"], float(matches[0]["score"]))
+
+        with self._lock:
+            if self._vectors is not None and self._ids:
+                scores = self._vectors[: len(self._ids)] @ query
+                for row, other_id in enumerate(self._ids):
+                    if other_id in (None, item_id):
+                        scores[row] = -np.inf
+                row = int(np.argmax(scores))
+                if np.isfinite(scores[row]) and (best is None or scores[row] > best[1]):
+                    best = (self._ids[row], float(scores[row]))
+
+            if best is not None and best[1] >= self.threshold:
+                best = (self._found(best[0], item_id), best[1])
+                self.vector_duplicates += 1
+                return best
+            self._store(item_id, query, image_hash)
+            self._pending.add(item_id)
+        return None
+
+    def confirm(self, item_id: str) -> None:
+        """Mark a reserved item as ingested, so duplicates of it are skipped or linked."""
+
+        with self._lock:
+            self._pending.discard(item_id)
+
+    def release(self, item_id: str) -> None:
+        """Forget a reserved item that was not ingested."""
+
+        with self._lock:
+            self._forget(item_id)
+
+    def add(self, item_id: str, vector: list[float], image_hash: int | None = None) -> None:
+        """Remember an item that was ingested."""
+
+        with self._lock:
+            self._store(item_id, self._normalize(vector), image_hash)
+            self._pending.discard(item_id)
+
+
+_link_lock = threading.Lock()
+
+
+def link_duplicate(index, original_id: str, file_name: str, namespace: str = "") -> None:
+    """Record ``file_name`` in the ``duplicate_files`` metadata of the original.
+
+    Runs a fetch and an update, so concurrent links within one process are
+    serialized to avoid losing entries.
+    """
+
+    with _link_lock:
+        vectors = index.fetch(ids=[original_id], namespace=namespace).get("vectors", {})
+        if original_id not in vectors:
+            return
+        metadata = vectors[original_id].get("metadata") or {}
+        files = list(metadata.get("duplicate_files") or [])
+        if file_name not in files:
+            files.append(file_name)
+            index.update(id=original_id, set_metadata={"duplicate_files": files}, namespace=namespace)
@@ -0,0 +1,249 @@
+"""Calls to the Vertex AI multimodal embedding model.
+
+A request goes to the primary region (``GOOGLE_CLOUD_PROJECT_LOCATION``). If
+a secondary region is configured and the primary has not answered within
+``EMBEDDING_HEDGE_AFTER_MS``, the same request is sent there as well and the
+first successful response wins. Each region has a circuit breaker: after
+``EMBEDDING_CIRCUIT_FAILURES`` consecutive failures the region is skipped for
+``EMBEDDING_CIRCUIT_RESET_SEC`` and then probed with a single request.
+"""
+
+import base64
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import requests
+
+from api import aws_storage, metrics, profiling, shared_cache, vectors
+from api.config import settings
+
+# Response field holding the embedding for each content type.
+_EXTRACTORS = {
+    "text": lambda prediction: prediction["textEmbedding"],
+    "image": lambda prediction: prediction["imageEmbedding"],
+    "video": lambda prediction: prediction["videoEmbeddings"][0]["embedding"],
+}
+
+EMBEDDING_DIMENSION = 1408
+
+_session = requests.Session()
+_executor = profiling.Executor(max_workers=32, thread_name_prefix="vertex-embedding")
+
+
+class EmbeddingUnavailable(Exception):
+    """Raised when no region could produce an embedding."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, failure_threshold: int, reset_sec: float):
+        self.failure_threshold = failure_threshold
+        self.reset_sec = reset_sec
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Return whether a request may be sent now."""
+
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < self.reset_sec:
+                return False
+            # Half-open: let exactly one request through to test the region.
+            self.probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+_breakers: dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(location: str) -> CircuitBreaker:
+    with _breakers_lock:
+        breaker = _breakers.get(location)
+        if breaker is None:
+            breaker = _breakers[location] = CircuitBreaker(
+                settings.circuit_failure_threshold, settings.circuit_reset_sec
+            )
+        return breaker
+
+
+def _is_client_error(error: Exception) -> bool:
+    """Return whether the request itself was rejected, e.g. an invalid image.
+
+    Such errors would fail in every region, so they neither trip the breaker
+    nor trigger a fallback.
+    """
+
+    response = getattr(error, "response", None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code != 429
+
+
+def _call(location: str, access_token: str, content_type: str, content: str) -> list[float]:
+    breaker = breaker_for(location)
+    url, headers, data = settings.get_embedding_request_data(access_token, content_type, content, location)
+    try:
+        with metrics.timed("embedding_request", upstream="vertex"):
+            response = _session.post(url, headers=headers, json=data, timeout=settings.embedding_timeout_sec)
+            response.raise_for_status()
+            vector = _EXTRACTORS[content_type](response.json()["predictions"][0])
+    except Exception as e:
+        if _is_client_error(e):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            metrics.circuit_open.set(1 if breaker.is_open else 0, region=location)
+        raise
+    breaker.record_success()
+    metrics.circuit_open.set(0, region=location)
+    return vector
+
+
+def _cache():
+    # The dtype is part of the name, so changing it starts a new cache file.
+    dtype = settings.embedding_cache_dtype
+    return shared_cache.get_cache(
+        f"embeddings-{dtype}",
+        settings.embedding_cache_slots,
+        vectors.nbytes(EMBEDDING_DIMENSION, dtype),
+        settings.shared_cache_dir,
+    )
+
+
+def cache_key(content_type: str, content: str) -> str:
+    return f"{content_type}:{hashlib.sha256(content.encode('utf-8')).hexdigest()}"
+
+
+def cached(key: str) -> list[float] | None:
+    """Return a vector from the shared embedding cache, if present."""
+
+    cache = _cache()
+    data = cache.get(key) if cache else None
+    if data is None:
+        metrics.cache_misses.inc(cache="embedding")
+        return None
+    metrics.cache_hits.inc(cache="embedding")
+    return vectors.from_bytes(data, settings.embedding_cache_dtype)
+
+
+def store(key: str, vector: list[float]) -> None:
+    cache = _cache()
+    if cache:
+        cache.set(key, vectors.to_bytes(vector, settings.embedding_cache_dtype))
+
+
+def embed(content_type: str, content: str) -> list[float]:
+    """Return the embedding for ``content``.
+
+    ``content`` is the query text, or the base64 encoded image or video.
+    Vectors are cached host-wide, so repeated queries skip Vertex AI in
+    every worker. Raises :class:`EmbeddingUnavailable` if every region
+    failed or is switched off by its circuit breaker; errors caused by the
+    request itself are re-raised as they are.
+    """
+
+    if content_type not in _EXTRACTORS:
+        raise ValueError(f"Unsupported content type: {content_type}")
+
+    key = cache_key(content_type, content)
+    vector = cached(key)
+    if vector is None:
+        vector = _embed(content_type, content)
+        store(key, vector)
+    return vector
+
+
+def embed_object(content_type: str, bucket: str, key: str, max_bytes: int | None = None, check=None) -> list[float]:
+    """Return the embedding of an S3 object, fetched server-side.
+
+    Vectors are cached by the object's ETag, so an object that was already
+    searched (by any worker) costs only a ``HEAD`` request, and a changed
+    object is embedded again. ``check(content)`` may reject the downloaded
+    bytes by raising.
+    """
+
+    with metrics.timed("s3_head", upstream="s3"):
+        head = aws_storage.head_object(bucket, key)
+    if max_bytes is not None and head.get("ContentLength", 0) > max_bytes:
+        raise ValueError(f"s3://{bucket}/{key} is larger than {max_bytes // (1024 * 1024)} MB")
+
+    etag = head.get("ETag")
+    key_for_object = f"{content_type}:s3:{bucket}/{key}:{etag}"
+    vector = cached(key_for_object) if etag else None
+    if vector is None:
+        with metrics.timed("s3_fetch", upstream="s3"):
+            content = aws_storage.get_object_bytes(bucket, key, etag)
+        if check:
+            check(content)
+        vector = embed(content_type, base64.b64encode(content).decode("utf-8"))
+        if etag:
+            store(key_for_object, vector)
+    return vector
+
+
+def _embed(content_type: str, content: str) -> list[float]:
+    candidates = [
+        location
+        for location in dict.fromkeys([settings.location, settings.secondary_location])
+        if location
+    ]
+
+    def submit_next():
+        # Breakers are only consulted for requests that are actually sent,
+        # so a half-open probe is never claimed without being used.
+        while candidates:
+            location = candidates.pop(0)
+            if breaker_for(location).allow():
+                return _executor.submit(_call, location, access_token, content_type, content)
+        return None
+
+    access_token = settings.get_access_token()
+    first = submit_next()
+    if first is None:
+        raise EmbeddingUnavailable("The embedding service is temporarily unavailable. Please try again shortly.")
+
+    pending = {first}
+    last_error: Exception | None = None
+    while pending:
+        hedge_after = settings.embedding_hedge_after_ms / 1000 if candidates else None
+        done, pending = wait(pending, timeout=hedge_after, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                return future.result()
+            except Exception as e:
+                if _is_client_error(e):
+                    raise
+                last_error = e
+
+        # Hedge when the request is slow, or fall back once it has failed.
+        if not done or not pending:
+            backup = submit_next()
+            if backup is not None:
+                if not done:
+                    metrics.embedding_hedged.inc()
+                pending.add(backup)
+
+    raise EmbeddingUnavailable(f"The embedding service is unavailable: {last_error}")
@@ -1,13 +1,188 @@
-from fastapi import FastAPI
+import os
+import tempfile
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from api.v1.endpoints import text, image, video, index
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.routing import Match
+from api import admission, metrics, profiling
+from api.config import settings
+from api.v1.endpoints import text, image, video, fused, page, index, similar
 
 app = FastAPI()
 
+admission_controller = admission.AdmissionController(
+    settings.admission_limits,
+    queue_size=settings.admission_queue_size,
+    max_wait_sec=settings.admission_max_wait_sec,
+    video_slot_bytes=int(settings.admission_video_slot_mb * 1024 * 1024),
+)
+
+profiler = profiling.Profiler(
+    settings.profile_dir or os.path.join(tempfile.gettempdir(), "sock-scout-profiles"),
+    token=settings.profile_token,
+    interval_ms=settings.profile_interval_ms,
+    retention=settings.profile_retention,
+    max_age_sec=settings.profile_max_age_hours * 3600,
+    sample_rate=settings.profile_sample_rate,
+    flush_sec=settings.profile_flush_sec,
+    max_stacks=settings.profile_max_stacks,
+)
+
+# Search endpoints and the admission pool that guards each of them. Later
+# pages only query Pinecone, so they share the cheap text pool.
+ADMISSION_MODALITIES = {
+    "/api/search/text": "text",
+    "/api/search/page": "text",
+    "/api/search/image": "image",
+    "/api/search/fused": "image",
+    "/api/search/video": "video",
+}
+
 @app.get("/api")
 async def root():
     return {"message": "Welcome to the Sock Scout API!"}
 
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def require_profile_token(request: Request) -> None:
+    # Profiles reveal internals, so without the token they do not exist.
+    if not profiler.requested(request.headers):
+        raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/api/profiles")
+async def list_profiles(request: Request):
+    require_profile_token(request)
+    return {"profiles": await run_in_threadpool(profiler.list)}
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: Request):
+    require_profile_token(request)
+    profile = await run_in_threadpool(profiler.load, profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
+
+@app.on_event("shutdown")
+def flush_aggregate_profile():
+    # Samples merged since the last timed flush would be lost otherwise.
+    profiler.flush()
+
+@app.middleware("http")
+async def admit_search_requests(request: Request, call_next):
+    modality = ADMISSION_MODALITIES.get(request.url.path)
+    if modality not in admission_controller.pools:
+        return await call_next(request)
+
+    content_length = request.headers.get("content-length", "")
+    # Clients may announce how many seconds they will wait for a response.
+    try:
+        timeout = float(request.headers["x-request-timeout"])
+    except (KeyError, ValueError):
+        timeout = None
+
+    try:
+        return await admission_controller(
+            modality,
+            int(content_length) if content_length.isdigit() else None,
+            timeout,
+            lambda: call_next(request),
+        )
+    except admission.Rejected as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.detail},
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+def route_template(request: Request) -> str:
+    """Return the path template of the route serving ``request``, e.g. ``/api/search/text``.
+
+    Used as a metric label instead of the raw path, so unknown paths do not
+    create new label values.
+    """
+
+    route = request.scope.get("route")
+    if route is None:
+        for candidate in app.router.routes:
+            if candidate.matches(request.scope)[0] == Match.FULL:
+                route = candidate
+                break
+    return getattr(route, "path", "unmatched")
+
+# Registered after admission so it also records shed requests.
+@app.middleware("http")
+async def record_search_metrics(request: Request, call_next):
+    if not request.url.path.startswith("/api/search/"):
+        return await call_next(request)
+
+    # Matched here rather than after call_next, so shed requests are labelled too.
+    endpoint = route_template(request)
+    metrics.in_flight.inc(endpoint=endpoint)
+    start = time.perf_counter()
+
+    def done(status: int) -> None:
+        metrics.in_flight.dec(endpoint=endpoint)
+        metrics.request_seconds.observe(time.perf_counter() - start, endpoint=endpoint, status=status)
+
+    try:
+        response = await call_next(request)
+    except Exception:
+        done(500)
+        raise
+
+    body = response.body_iterator
+
+    # Streamed responses are still being produced after the headers, so the
+    # request ends with the body.
+    async def timed_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            done(response.status_code)
+
+    response.body_iterator = timed_body()
+    return response
+
+# Registered last so profiles also cover admission waits and metrics.
+@app.middleware("http")
+async def profile_requests(request: Request, call_next):
+    path = request.url.path
+    requested = not path.startswith("/api/profiles") and profiler.requested(request.headers)
+    if not requested and not (path.startswith("/api/search/") and profiler.should_sample()):
+        return await call_next(request)
+
+    profile = profiler.start(aggregate=not requested)
+    # Tags the threads that work for this request; see profiling.bind.
+    token = profiling.current.set(profile)
+    try:
+        response = await call_next(request)
+    except Exception:
+        profiler.stop(profile)
+        raise
+    finally:
+        profiling.current.reset(token)
+
+    body = response.body_iterator
+
+    # Streamed results are serialized while the body is sent, so the profile
+    # ends with the body rather than with the response headers.
+    async def profiled_body():
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await run_in_threadpool(profiler.finish, profile, request.method, path, response.status_code)
+
+    response.body_iterator = profiled_body()
+    if requested:
+        response.headers["X-Profile-Id"] = profile.id
+    return response
+
 # Add CORS middleware
 # CORS is important for:
 # 1. Allowing controlled cross-origin access
@@ -25,4 +200,7 @@ app.add_middleware(
 app.include_router(text.router, prefix="/api")
 app.include_router(image.router, prefix="/api")
 app.include_router(video.router, prefix="/api")
-app.include_router(index.router, prefix="/api")
\ No newline at end of file
+app.include_router(fused.router, prefix="/api")
+app.include_router(page.router, prefix="/api")
+app.include_router(index.router, prefix="/api")
+app.include_router(similar.router, prefix="/api")
@@ -0,0 +1,254 @@
+"""Index statistics served from a periodically refreshed snapshot.
+
+``/api/index/info`` is polled by every open dashboard, so it must not call
+Pinecone per request. A background thread refreshes the statistics every
+``refresh_sec``; requests read the last result, and only refresh it
+themselves (once, for all concurrent requests) if it is older than
+``max_age_sec``, e.g. on the first request of a worker. After a failed
+refresh, requests do not call Pinecone: they get the last statistics marked
+``stale`` until the background thread succeeds again.
+
+A refresh collects:
+
+- vector counts per namespace from ``describe_index_stats``
+- vector counts per ``file_type``: namespaces holding a single modality (see
+  ``PINECONE_IMAGE_NAMESPACES`` / ``PINECONE_VIDEO_NAMESPACES``) count as a
+  whole; namespaces shared by several modalities are split with
+  ``describe_index_stats(filter=...)`` where the index supports it (pod-based
+  indexes), otherwise using the local index snapshot when one is configured,
+  otherwise their counts are unknown (``None``)
+- the latest ``date_added_ts`` per namespace and ``file_type``. Pinecone
+  cannot sort, so each refresh asks for any vector added after the latest
+  time known so far, with a random query vector, until none is left. That
+  takes about log2(n) queries the first time and a single one afterwards.
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+from api import snapshot
+
+FILE_TYPES = ("image", "video")
+# Queries per namespace and file type and refresh; the next refresh resumes.
+MAX_PROBES = 32
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+class StatsUnavailable(Exception):
+    """Raised when no statistics were collected yet and refreshing fails."""
+
+
+def _isoformat(timestamp: float | None) -> str | None:
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class IndexStats:
+    """Background-refreshed statistics of one index."""
+
+    def __init__(
+        self,
+        index,
+        namespaces: dict[str, list[str]],
+        refresh_sec: float = 30,
+        max_age_sec: float = 120,
+        snapshot_path: str | None = None,
+    ):
+        self.index = index
+        self.namespaces = namespaces
+        self.refresh_sec = refresh_sec
+        self.max_age_sec = max_age_sec
+        self.snapshot_path = snapshot_path
+        self._refresh_lock = threading.Lock()
+        self._current: dict | None = None
+        self._refreshed = 0.0
+        self._latest: dict[tuple[str, str], float] = {}
+        self._snapshot_counts: tuple[str, Counter] | None = None
+        # Serverless indexes reject filters in describe_index_stats.
+        self._filter_supported = True
+        self._failed_at: float | None = None
+        self._thread: threading.Thread | None = None
+        self._rng = np.random.default_rng()
+
+    def _types_of(self, namespace: str) -> list[str]:
+        types = [t for t in FILE_TYPES if namespace in self.namespaces.get(t, [])]
+        return types or list(FILE_TYPES)
+
+    def _latest_added(self, namespace: str, file_type: str, dimension: int) -> float | None:
+        known = self._latest.get((namespace, file_type), 0.0)
+        for _ in range(MAX_PROBES):
+            vector = self._rng.standard_normal(dimension)
+            matches = self.index.query(
+                vector=(vector / np.linalg.norm(vector)).tolist(),
+                top_k=1,
+                namespace=namespace,
+                filter={"$and": [{"file_type": {"$eq": file_type}}, {"date_added_ts": {"$gt": known}}]},
+                include_metadata=True,
+            )["matches"]
+            if not matches:
+                break
+            known = float(matches[0]["metadata"]["date_added_ts"])
+        self._latest[(namespace, file_type)] = known
+        return known or None
+
+    def _counts_from_snapshot(self) -> tuple[str, Counter] | None:
+        """Return the export time and ``(namespace, file_type)`` counts of the snapshot."""
+
+        manifest = snapshot.load_manifest(self.snapshot_path) if self.snapshot_path else None
+        if manifest is None:
+            return None
+        exported_at = manifest.get("exported_at")
+        if self._snapshot_counts is None or self._snapshot_counts[0] != exported_at:
+            counts: Counter = Counter()
+            for _, _, metadata in snapshot.Snapshot(self.snapshot_path).iter_chunks(with_metadata=True):
+                counts.update((row.get("namespace", ""), row.get("file_type")) for row in metadata)
+            self._snapshot_counts = (exported_at, counts)
+        return self._snapshot_counts
+
+    def _counts_from_filter(self) -> Counter | None:
+        """Return ``(namespace, file_type)`` counts from filtered index stats, if supported."""
+
+        if not self._filter_supported:
+            return None
+        counts: Counter = Counter()
+        try:
+            for file_type in FILE_TYPES:
+                stats = self.index.describe_index_stats(filter={"file_type": {"$eq": file_type}})
+                for namespace, info in stats.get("namespaces", {}).items():
+                    counts[(namespace, file_type)] = info["vector_count"]
+        except Exception as e:
+            # The unfiltered call of this refresh succeeded, so the filter is what failed.
+            print(f"Index stats by file type are not available, using the snapshot instead: {e}")
+            self._filter_supported = False
+            return None
+        return counts
+
+    def _split_counts(self) -> tuple[str | None, Counter] | None:
+        """Return counts to split shared namespaces by, and the snapshot time they are from."""
+
+        counts = self._counts_from_filter()
+        if counts is not None:
+            return None, counts
+        return self._counts_from_snapshot()
+
+    def refresh(self) -> dict:
+        """Query the index and replace the current statistics."""
+
+        stats = self.index.describe_index_stats()
+        dimension = stats.get("dimension") or 1408
+        split = None
+        split_loaded = False
+
+        namespaces = {}
+        file_types = {t: {"vector_count": 0, "latest": None} for t in FILE_TYPES}
+        for namespace, info in sorted(stats.get("namespaces", {}).items()):
+            count = info["vector_count"]
+            types = self._types_of(namespace)
+            latest = {t: self._latest_added(namespace, t, dimension) for t in types}
+
+            if len(types) == 1:
+                file_types[types[0]]["vector_count"] += count
+            else:
+                if not split_loaded:
+                    split, split_loaded = self._split_counts(), True
+                for t in types:
+                    if split is None:
+                        file_types[t]["vector_count"] = None
+                    elif file_types[t]["vector_count"] is not None:
+                        file_types[t]["vector_count"] += split[1][(namespace, t)]
+
+            for t, timestamp in latest.items():
+                if timestamp and (file_types[t]["latest"] or 0) < timestamp:
+                    file_types[t]["latest"] = timestamp
+            newest = max((ts for ts in latest.values() if ts), default=None)
+            namespaces[namespace] = {"vector_count": count, "last_ingested_at": _isoformat(newest)}
+
+        newest = max((info["latest"] for info in file_types.values() if info["latest"]), default=None)
+        current = {
+            "total_vectors": stats["total_vector_count"],
+            "namespaces": namespaces,
+            "file_types": {
+                t: {"vector_count": info["vector_count"], "last_ingested_at": _isoformat(info["latest"])}
+                for t, info in file_types.items()
+            },
+            "last_ingested_at": _isoformat(newest),
+            "refreshed_at": datetime.now().isoformat(),
+        }
+        if split is not None and split[0] is not None:
+            # Shared namespaces are split by file type as of the last export.
+            current["file_types_as_of"] = split[0]
+
+        self._current = current
+        self._refreshed = time.monotonic()
+        self._failed_at = None
+        return current
+
+    def _try_refresh(self) -> None:
+        """Refresh, remembering a failure so requests stop retrying."""
+
+        try:
+            self.refresh()
+        except Exception as e:
+            self._failed_at = time.monotonic()
+            print(f"Refreshing index stats failed: {e}")
+
+    def _run(self) -> None:
+        while True:
+            time.sleep(self.refresh_sec)
+            with self._refresh_lock:
+                self._try_refresh()
+
+    def is_fresh(self) -> bool:
+        return self._current is not None and time.monotonic() - self._refreshed <= self.max_age_sec
+
+    def needs_refresh(self) -> bool:
+        """Whether a request has to refresh the statistics before answering.
+
+        Only until a refresh fails: after that, the background thread alone
+        retries and requests are served the last statistics.
+        """
+
+        return not self.is_fresh() and self._failed_at is None
+
+    def get(self) -> dict:
+        """Return the statistics, refreshing them first if they are too old.
+
+        Statistics older than ``max_age_sec`` are marked ``stale``. Raises
+        :class:`StatsUnavailable` if there are none yet and refreshing failed.
+        """
+
+        if self._thread is None:
+            with self._refresh_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="index-stats", daemon=True)
+                    self._thread.start()
+
+        if self.needs_refresh():
+            with self._refresh_lock:
+                # Another request may have refreshed, or failed to, while this one waited.
+                if self.needs_refresh():
+                    self._try_refresh()
+
+        current = self._current
+        if current is None:
+            raise StatsUnavailable("Index statistics are not available yet")
+        return {
+            **current,
+            "age_sec": round(time.monotonic() - self._refreshed, 1),
+            "stale": not self.is_fresh(),
+        }
+
+
+def get_stats(index, namespaces, refresh_sec, max_age_sec, snapshot_path=None) -> IndexStats:
+    """Return the process-wide :class:`IndexStats`, creating it on first use."""
+
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = IndexStats(index, namespaces, refresh_sec, max_age_sec, snapshot_path)
+        return _stats
@@ -0,0 +1,358 @@
+"""Long-running ingestion from object-created events.
+
+Instead of listing a whole S3 prefix, the embedding processors can run as a
+worker that consumes S3 event notifications and ingests each new object as
+it arrives. Events are read from an SQS queue (S3 notifications delivered
+directly, through SNS or through EventBridge) or, for local testing, from a
+directory of JSON files.
+
+Events are handled in micro-batches: the worker waits at most
+``max_wait_sec`` after the first event for up to ``batch_size`` events,
+embeds them concurrently and upserts all resulting vectors together. A
+message is acknowledged only once every object in it was ingested, so
+failures are redelivered by the queue, with a growing delay, until
+``max_attempts`` deliveries have failed.
+
+Queues deliver messages at least once, so the processors derive vector ids
+from the object (:func:`vector_id`): a redelivered object overwrites its
+vectors instead of adding duplicates.
+"""
+
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import unquote_plus
+
+# Vectors per Pinecone upsert request, well below the 2 MB request limit.
+UPSERT_BATCH = 100
+# Objects of a batch embedded concurrently.
+WORKERS = 8
+# Deliveries of a failing message before it is set aside, and the delay
+# before each redelivery: RETRY_BASE_SEC, doubling up to RETRY_MAX_SEC.
+MAX_ATTEMPTS = 5
+RETRY_BASE_SEC = 10.0
+RETRY_MAX_SEC = 600.0
+
+
+def vector_id(bucket: str, key: str, segment: int | None = None) -> str:
+    """Return the id of an object's vector, or of one segment of a video.
+
+    The id only depends on the object, so ingesting it again overwrites
+    the vectors written before.
+    """
+
+    name = f"s3://{bucket}/{key}" if segment is None else f"s3://{bucket}/{key}#{segment}"
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, name))
+
+
+def retry_delay(attempts: int) -> float:
+    """Return the delay before redelivering a message that failed ``attempts`` times."""
+
+    return min(RETRY_BASE_SEC * 2 ** max(attempts - 1, 0), RETRY_MAX_SEC)
+
+
+class ObjectEvent:
+    """An object that was created in a bucket."""
+
+    def __init__(self, bucket: str, key: str):
+        self.bucket = bucket
+        self.key = key
+
+    @property
+    def prefix(self) -> str:
+        return os.path.dirname(self.key)
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.key)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ObjectEvent) and (self.bucket, self.key) == (other.bucket, other.key)
+
+    def __repr__(self) -> str:
+        return f"s3://{self.bucket}/{self.key}"
+
+
+def parse_events(body: str | dict) -> list[ObjectEvent]:
+    """Return the object-created events in a notification message.
+
+    Accepts S3 notifications (``Records``), the same wrapped in an SNS
+    envelope (``Message``), EventBridge ``Object Created`` events and plain
+    ``{"bucket": ..., "key": ...}`` objects. Other events, such as the
+    ``s3:TestEvent`` S3 sends when notifications are configured, yield an
+    empty list.
+    """
+
+    message = json.loads(body) if isinstance(body, str) else body
+    if "Message" in message and isinstance(message["Message"], str):
+        return parse_events(message["Message"])
+
+    if "Records" in message:
+        return [
+            # Keys in S3 notifications are URL-encoded with "+" for spaces.
+            ObjectEvent(record["s3"]["bucket"]["name"], unquote_plus(record["s3"]["object"]["key"]))
+            for record in message["Records"]
+            if record.get("eventName", "").startswith("ObjectCreated")
+        ]
+
+    if message.get("detail-type") == "Object Created":
+        detail = message["detail"]
+        return [ObjectEvent(detail["bucket"]["name"], detail["object"]["key"])]
+
+    if "bucket" in message and "key" in message:
+        return [ObjectEvent(message["bucket"], message["key"])]
+
+    return []
+
+
+class Message:
+    """A queue message, the events it carries and how often it was delivered."""
+
+    def __init__(self, handle, events: list[ObjectEvent], attempts: int = 1):
+        self.handle = handle
+        self.events = events
+        self.attempts = attempts
+
+
+class SqsQueue:
+    """Receive S3 notifications from an SQS queue with long polling.
+
+    Failed messages become visible again after :func:`retry_delay`. Give
+    the queue a redrive policy with a dead-letter queue, e.g. with
+    ``maxReceiveCount`` set to :data:`MAX_ATTEMPTS`, so a message that
+    keeps failing is set aside.
+    """
+
+    def __init__(self, queue_url: str, client):
+        self.queue_url = queue_url
+        self.client = client
+
+    def receive(self, max_messages: int, wait_sec: float) -> list[Message]:
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=max(1, min(max_messages, 10)),
+            WaitTimeSeconds=max(0, min(int(wait_sec), 20)),
+            AttributeNames=["ApproximateReceiveCount"],
+        )
+        messages = []
+        for raw in response.get("Messages", []):
+            try:
+                events = parse_events(raw["Body"])
+            except (ValueError, KeyError) as e:
+                print(f"Dropping malformed message {raw.get('MessageId')}: {e}")
+                events = []
+            attempts = int(raw.get("Attributes", {}).get("ApproximateReceiveCount", 1))
+            messages.append(Message(raw["ReceiptHandle"], events, attempts))
+        return messages
+
+    def ack(self, message: Message) -> None:
+        self.client.delete_message(QueueUrl=self.queue_url, ReceiptHandle=message.handle)
+
+    def nack(self, message: Message) -> None:
+        self.client.change_message_visibility(
+            QueueUrl=self.queue_url,
+            ReceiptHandle=message.handle,
+            VisibilityTimeout=int(retry_delay(message.attempts)),
+        )
+
+
+class DirectoryQueue:
+    """A file queue for local testing: one notification JSON per file.
+
+    New messages are ``*.json`` files in ``path``. A received file is moved
+    to ``processing/`` so it is not picked up twice, then deleted on
+    success. On failure it is moved back with its delivery count in the
+    name and its modification time set to when it may be retried; after
+    ``max_attempts`` deliveries it is moved to ``failed/`` instead.
+    """
+
+    def __init__(self, path: str, poll_sec: float = 0.5, max_attempts: int = MAX_ATTEMPTS):
+        self.path = path
+        self.poll_sec = poll_sec
+        self.max_attempts = max_attempts
+        self.processing = os.path.join(path, "processing")
+        self.failed = os.path.join(path, "failed")
+        os.makedirs(self.processing, exist_ok=True)
+        os.makedirs(self.failed, exist_ok=True)
+
+    @staticmethod
+    def _attempts(name: str) -> int:
+        # "<id>.json" has not been delivered yet; "<id>.attempt-2.json" twice.
+        match = re.search(r"\.attempt-(\d+)\.json$", name)
+        return int(match.group(1)) if match else 0
+
+    def _claim(self, max_messages: int) -> list[Message]:
+        messages = []
+        now = time.time()
+        for name in sorted(os.listdir(self.path)):
+            if len(messages) >= max_messages:
+                break
+            if not name.endswith(".json"):
+                continue
+            try:
+                if os.stat(os.path.join(self.path, name)).st_mtime > now:
+                    continue  # Backing off after a failure.
+            except FileNotFoundError:
+                continue
+            claimed = os.path.join(self.processing, name)
+            try:
+                os.replace(os.path.join(self.path, name), claimed)
+            except FileNotFoundError:
+                continue  # Claimed by another worker.
+            try:
+                with open(claimed) as f:
+                    events = parse_events(f.read())
+            except (ValueError, KeyError) as e:
+                print(f"Dropping malformed message {name}: {e}")
+                events = []
+            messages.append(Message(claimed, events, self._attempts(name) + 1))
+        return messages
+
+    def receive(self, max_messages: int, wait_sec: float) -> list[Message]:
+        deadline = time.monotonic() + wait_sec
+        while True:
+            messages = self._claim(max_messages)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            time.sleep(min(self.poll_sec, max(deadline - time.monotonic(), 0)))
+
+    def ack(self, message: Message) -> None:
+        os.remove(message.handle)
+
+    def nack(self, message: Message) -> None:
+        name = re.sub(r"(\.attempt-\d+)?\.json$", "", os.path.basename(message.handle))
+        if message.attempts >= self.max_attempts:
+            print(f"Giving up on {name} after {message.attempts} attempts; moved to {self.failed}")
+            os.replace(message.handle, os.path.join(self.failed, f"{name}.json"))
+            return
+        retry_at = time.time() + retry_delay(message.attempts)
+        os.utime(message.handle, (retry_at, retry_at))
+        os.replace(message.handle, os.path.join(self.path, f"{name}.attempt-{message.attempts}.json"))
+
+    def put(self, bucket: str, key: str) -> str:
+        """Enqueue an object, e.g. from a test or an upload hook."""
+
+        path = os.path.join(self.path, f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"bucket": bucket, "key": key}, f)
+        os.replace(path + ".tmp", path)
+        return path
+
+
+class BatchUpserter:
+    """Stands in for the Pinecone index while a batch is processed.
+
+    ``upsert`` calls are buffered and sent by :meth:`flush` in a few large
+    requests; other index methods (used by duplicate detection) pass through.
+    Work that must wait until the vectors are stored, such as confirming a
+    duplicate-detector reservation, is deferred with :func:`after_upsert`.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.pending: dict[str, list[dict]] = {}
+        self.callbacks: list[tuple] = []
+
+    def upsert(self, vectors: list[dict], namespace: str = "") -> None:
+        self.pending.setdefault(namespace, []).extend(vectors)
+
+    def flush(self) -> int:
+        """Upsert the buffered vectors, then run the deferred callbacks.
+
+        If an upsert fails, the failure callbacks run instead and the error
+        is raised.
+        """
+
+        pending, self.pending = self.pending, {}
+        callbacks, self.callbacks = self.callbacks, []
+        count = 0
+        try:
+            for namespace, vectors in pending.items():
+                for start in range(0, len(vectors), UPSERT_BATCH):
+                    self.index.upsert(vectors[start : start + UPSERT_BATCH], namespace=namespace)
+                count += len(vectors)
+        except Exception:
+            for _, failed in callbacks:
+                failed()
+            raise
+        for done, _ in callbacks:
+            done()
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def after_upsert(index, done, failed=lambda: None) -> None:
+    """Call ``done()`` once vectors upserted through ``index`` are stored.
+
+    Through a :class:`BatchUpserter` that is after the batch was flushed,
+    and ``failed()`` is called instead if the flush fails; through a plain
+    index it is now.
+    """
+
+    if isinstance(index, BatchUpserter):
+        index.callbacks.append((done, failed))
+    else:
+        done()
+
+
+def run_worker(
+    queue,
+    process,
+    index,
+    accept=lambda event: True,
+    batch_size: int = 16,
+    max_wait_sec: float = 2.0,
+    workers: int = WORKERS,
+    max_batches: int | None = None,
+    report=None,
+) -> None:
+    """Ingest objects from ``queue`` until interrupted.
+
+    ``process(event, index)`` ingests one object, upserting through the
+    ``index`` it is given, and returns whether it succeeded. Vectors are
+    only stored once the whole batch is flushed, so anything that depends
+    on them belongs in an :func:`after_upsert` callback. Events that
+    ``accept`` rejects (e.g. other file types) are acknowledged without
+    processing. ``report()`` is called after every batch, e.g. to log
+    transfer rates. ``max_batches`` stops the worker after that many
+    batches, which is mainly useful in tests.
+    """
+
+    batches = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while max_batches is None or batches < max_batches:
+            messages = queue.receive(batch_size, 20)
+            if not messages:
+                continue
+
+            # Micro-batch: keep collecting until the batch is full or the window closes.
+            deadline = time.monotonic() + max_wait_sec
+            while sum(len(m.events) for m in messages) < batch_size and time.monotonic() < deadline:
+                more = queue.receive(batch_size, max(deadline - time.monotonic(), 0))
+                if not more:
+                    break
+                messages.extend(more)
+
+            batches += 1
+            upserter = BatchUpserter(index)
+            work = [(message, event) for message in messages for event in message.events if accept(event)]
+            results = list(executor.map(lambda item: process(item[1], upserter), work))
+            failed = {id(message) for (message, _), ok in zip(work, results) if not ok}
+
+            try:
+                upserted = upserter.flush()
+            except Exception as e:
+                print(f"Upsert of batch failed: {e}")
+                failed = {id(message) for message in messages}
+                upserted = 0
+
+            for message in messages:
+                (queue.nack if id(message) in failed else queue.ack)(message)
+            print(f"Batch of {len(work)} objects: {upserted} vectors upserted, {len(failed)} messages to retry")
+            if report:
+                report()
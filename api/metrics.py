@@ -0,0 +1,163 @@
+"""In-process latency histograms and counters exposed in Prometheus format.
+
+Metrics are plain Python objects guarded by a lock each, so recording a
+sample costs a ``perf_counter`` call, a bisect and a dict update. Each
+uvicorn worker keeps its own values; Prometheus aggregates across workers by
+scraping each of them.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from fast local work up to slow upstream calls.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, ...], object] = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: dict) -> tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple[str, ...], value) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labels, key)} {value}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def total(self) -> float:
+        """Return the sum over all label values."""
+
+        with self._lock:
+            return sum(self._values.values())
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket counts (last slot is +Inf), sum of samples.
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def _render_value(self, key: tuple[str, ...], value) -> list[str]:
+        counts, total = value
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            bucket_labels = _format_labels(self.labels, key, f'le="{le}"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+        labels = _format_labels(self.labels, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+REGISTRY: list[_Metric] = []
+
+stage_seconds = Histogram(
+    "search_stage_seconds", "Time spent in each stage of a search request.", ("stage",)
+)
+request_seconds = Histogram(
+    "search_request_seconds", "Total time to serve a search API request.", ("endpoint", "status")
+)
+in_flight = Gauge("search_in_flight_requests", "Search API requests currently being served.", ("endpoint",))
+cache_hits = Counter("search_cache_hits_total", "Lookups served from a cache.", ("cache",))
+cache_misses = Counter("search_cache_misses_total", "Lookups that missed a cache.", ("cache",))
+admission_rejected = Counter(
+    "search_admission_rejected_total", "Requests shed by admission control.", ("modality", "reason")
+)
+admission_queued = Gauge("search_admission_queued_requests", "Requests waiting for admission.", ("modality",))
+embedding_hedged = Counter(
+    "search_embedding_hedged_total", "Embedding requests also sent to the secondary region."
+)
+circuit_open = Gauge("search_embedding_circuit_open", "Whether a region's circuit breaker is open.", ("region",))
+upstream_errors = Counter("search_upstream_errors_total", "Failed calls to upstream services.", ("upstream",))
+
+
+@contextmanager
+def timed(stage: str, upstream: str | None = None):
+    """Record the duration of the block as ``stage``.
+
+    If ``upstream`` is given, an exception raised in the block also counts
+    as an error for that upstream service.
+    """
+
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if upstream:
+            upstream_errors.inc(upstream=upstream)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def render() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
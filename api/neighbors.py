@@ -0,0 +1,329 @@
+"""Precomputed nearest-neighbor tables for catalog items.
+
+The table is built offline by ``scripts/build_neighbors.py``. Every build is
+written to a new ``build-*`` directory of ``.npy`` files that the API
+memory-maps:
+
+- ``ids.npy``        vector ids, one per row
+- ``neighbors.npy``  ``int32`` matrix of neighbor row numbers (``rows x top_n``)
+- ``scores.npy``     ``float16`` matrix of cosine scores aligned with neighbors
+- ``vectors.npy``    ``float32`` normalized vectors used for incremental rebuilds
+- ``metadata.json``  Pinecone metadata for each row
+
+``manifest.json`` in the table directory names the current build and is
+replaced atomically once a build is complete, so readers switch over by
+reloading it. Files of a build are never rewritten while workers may still
+have them mapped; older builds are deleted once two newer ones exist.
+"""
+
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+
+import numpy as np
+
+MANIFEST = "manifest.json"
+# Builds kept besides the current one, for readers still switching over.
+KEEP_BUILDS = 1
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """Return ``vectors`` scaled to unit length as ``float32``."""
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def top_neighbors(
+    queries: np.ndarray,
+    corpus: np.ndarray,
+    top_n: int,
+    query_offset: int | None = None,
+    batch_size: int = 1024,
+    own_rows: np.ndarray | None = None,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return the ``top_n`` most similar corpus rows for every query row.
+
+    Both matrices must already be normalized. When the queries are a slice of
+    the corpus, ``query_offset`` gives the corpus row of the first query so
+    that each item is not reported as its own neighbor; for queries taken
+    from arbitrary corpus rows, pass those rows as ``own_rows``. Similarities
+    are computed with one matrix multiplication per ``batch_size`` queries to
+    bound memory use.
+    """
+
+    if query_offset is not None:
+        own_rows = np.arange(queries.shape[0]) + query_offset
+    top_n = min(top_n, corpus.shape[0] - (1 if own_rows is not None else 0))
+    rows = queries.shape[0]
+    neighbors = np.zeros((rows, max(top_n, 0)), dtype=np.int32)
+    scores = np.zeros((rows, max(top_n, 0)), dtype=np.float32)
+    if top_n <= 0:
+        return neighbors, scores
+
+    for start in range(0, rows, batch_size):
+        stop = min(start + batch_size, rows)
+        sims = queries[start:stop] @ corpus.T
+        if own_rows is not None:
+            sims[np.arange(stop - start), own_rows[start:stop]] = -np.inf
+
+        part = np.argpartition(-sims, top_n - 1, axis=1)[:, :top_n]
+        part_scores = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_scores, axis=1)
+        neighbors[start:stop] = np.take_along_axis(part, order, axis=1)
+        scores[start:stop] = np.take_along_axis(part_scores, order, axis=1)
+
+    return neighbors, scores
+
+
+def merge_neighbors(
+    neighbors: np.ndarray,
+    scores: np.ndarray,
+    new_neighbors: np.ndarray,
+    new_scores: np.ndarray,
+    top_n: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Merge two neighbor lists per row and keep the best ``top_n``."""
+
+    all_neighbors = np.concatenate([neighbors, new_neighbors], axis=1)
+    all_scores = np.concatenate([scores.astype(np.float32), new_scores], axis=1)
+    top_n = min(top_n, all_scores.shape[1])
+    order = np.argsort(-all_scores, axis=1, kind="stable")[:, :top_n]
+    return (
+        np.take_along_axis(all_neighbors, order, axis=1),
+        np.take_along_axis(all_scores, order, axis=1),
+    )
+
+
+def build_table(vectors: np.ndarray, top_n: int, batch_size: int = 1024) -> tuple[np.ndarray, np.ndarray]:
+    """Compute a full neighbor table for normalized ``vectors``."""
+
+    return top_neighbors(vectors, vectors, top_n, query_offset=0, batch_size=batch_size)
+
+
+def extend_table(
+    vectors: np.ndarray,
+    neighbors: np.ndarray,
+    scores: np.ndarray,
+    new_vectors: np.ndarray,
+    top_n: int,
+    batch_size: int = 1024,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Add ``new_vectors`` to an existing table without a full rebuild.
+
+    New rows are compared against the whole corpus, while existing rows are
+    only compared against the new vectors and merged with their current
+    neighbor lists. Returns the combined vectors, neighbors and scores.
+    """
+
+    old_rows = vectors.shape[0]
+    if old_rows and neighbors.shape[1] != min(top_n, old_rows - 1):
+        raise ValueError(
+            f"The table keeps {neighbors.shape[1]} neighbors per item but {top_n} were requested; "
+            "rebuild it instead of extending it."
+        )
+    corpus = np.concatenate([vectors, new_vectors])
+
+    added_neighbors, added_scores = top_neighbors(
+        new_vectors, corpus, top_n, query_offset=old_rows, batch_size=batch_size
+    )
+
+    if not old_rows:
+        return corpus, added_neighbors, added_scores
+
+    cand_neighbors, cand_scores = top_neighbors(
+        vectors, new_vectors, top_n, batch_size=batch_size
+    )
+    old_neighbors, old_scores = merge_neighbors(
+        neighbors, scores, cand_neighbors + old_rows, cand_scores, top_n
+    )
+    return (
+        corpus,
+        np.concatenate([old_neighbors, added_neighbors]),
+        np.concatenate([old_scores, added_scores]),
+    )
+
+
+def remove_rows(
+    vectors: np.ndarray,
+    neighbors: np.ndarray,
+    scores: np.ndarray,
+    removed: list[int],
+    top_n: int,
+    batch_size: int = 1024,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Drop ``removed`` rows, e.g. items deleted from the index, from a table.
+
+    Neighbor row numbers are renumbered, and rows that listed a removed item
+    as a neighbor are recomputed against the remaining corpus. Returns the
+    remaining vectors, neighbors and scores.
+    """
+
+    keep = np.ones(vectors.shape[0], dtype=bool)
+    keep[removed] = False
+    renumber = np.full(vectors.shape[0], -1, dtype=np.int64)
+    renumber[keep] = np.arange(int(keep.sum()))
+
+    vectors = vectors[keep]
+    width = min(top_n, vectors.shape[0] - 1) if vectors.shape[0] else 0
+    kept_neighbors = renumber[neighbors[keep]][:, :width].astype(np.int32)
+    kept_scores = np.asarray(scores[keep], dtype=np.float32)[:, :width]
+
+    stale = np.flatnonzero((renumber[neighbors[keep]] < 0).any(axis=1))
+    if stale.size and width:
+        fresh_neighbors, fresh_scores = top_neighbors(
+            vectors[stale], vectors, top_n, batch_size=batch_size, own_rows=stale
+        )
+        kept_neighbors[stale] = fresh_neighbors
+        kept_scores[stale] = fresh_scores
+    return vectors, kept_neighbors, kept_scores
+
+
+def diff_snapshot(
+    ids: list[str],
+    vectors: np.ndarray,
+    metadata: list[dict],
+    snapshot_ids: list[str],
+    snapshot_vectors: np.ndarray,
+    snapshot_metadata: list[dict],
+) -> tuple[list[int], list[int]]:
+    """Compare a table with a snapshot for an incremental rebuild.
+
+    Returns the table rows to remove and the snapshot rows to add. Ids missing
+    from the snapshot were deleted and ids missing from the table are new.
+    Ingestion derives ids from the S3 object, so a re-ingested object keeps its
+    id with a new vector or metadata; such ids are both removed and added.
+    """
+
+    snapshot_rows = {vid: row for row, vid in enumerate(snapshot_ids)}
+    removed = [row for row, vid in enumerate(ids) if vid not in snapshot_rows]
+    kept = [row for row, vid in enumerate(ids) if vid in snapshot_rows]
+    kept_snapshot = [snapshot_rows[ids[row]] for row in kept]
+
+    changed = []
+    if kept:
+        # Table vectors were normalized from the snapshot, so unchanged rows match closely.
+        same = np.isclose(vectors[kept], normalize(snapshot_vectors[kept_snapshot]), rtol=0, atol=1e-6).all(axis=1)
+        changed = [
+            (row, snapshot_row)
+            for row, snapshot_row, same_vector in zip(kept, kept_snapshot, same)
+            if not same_vector or metadata[row] != snapshot_metadata[snapshot_row]
+        ]
+
+    known = set(ids)
+    added = [row for row, vid in enumerate(snapshot_ids) if vid not in known]
+    removed = sorted(removed + [row for row, _ in changed])
+    added = sorted(added + [snapshot_row for _, snapshot_row in changed])
+    return removed, added
+
+
+def save_table(
+    path: str,
+    ids: list[str],
+    vectors: np.ndarray,
+    neighbors: np.ndarray,
+    scores: np.ndarray,
+    metadata: list[dict],
+) -> None:
+    """Write a neighbor table to a new build directory under ``path``.
+
+    The manifest pointing at the build is replaced last, so a reader never
+    picks up partially written arrays, and arrays a reader has mapped are
+    never truncated or overwritten.
+    """
+
+    build = f"build-{datetime.now().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(path, build)
+    os.makedirs(directory)
+    np.save(os.path.join(directory, "ids.npy"), np.asarray(ids, dtype=str))
+    np.save(os.path.join(directory, "vectors.npy"), vectors.astype(np.float32))
+    np.save(os.path.join(directory, "neighbors.npy"), neighbors.astype(np.int32))
+    np.save(os.path.join(directory, "scores.npy"), scores.astype(np.float16))
+    with open(os.path.join(directory, "metadata.json"), "w") as f:
+        json.dump(metadata, f)
+
+    manifest = {
+        "build": build,
+        "rows": len(ids),
+        "top_n": int(neighbors.shape[1]),
+        "built_at": datetime.now().isoformat(),
+    }
+    tmp_manifest = os.path.join(path, f"{MANIFEST}.{uuid.uuid4().hex[:8]}.tmp")
+    with open(tmp_manifest, "w") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, os.path.join(path, MANIFEST))
+    prune_builds(path, build)
+
+
+def prune_builds(path: str, current: str) -> None:
+    """Delete builds older than the current one and ``KEEP_BUILDS`` before it.
+
+    Workers that still map an older build keep reading it: unlinking a file
+    does not affect existing mappings.
+    """
+
+    builds = sorted(name for name in os.listdir(path) if name.startswith("build-") and name != current)
+    for name in builds[: max(len(builds) - KEEP_BUILDS, 0)]:
+        shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+class NeighborTable:
+    """Memory-mapped neighbor table with O(1) lookups by vector id."""
+
+    def __init__(self, path: str):
+        self.path = path
+        manifest_path = os.path.join(path, MANIFEST)
+        self.mtime = os.path.getmtime(manifest_path)
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+        # Tables written before builds were versioned keep their files in ``path``.
+        self.directory = os.path.join(path, self.manifest.get("build", ""))
+
+        self.neighbors = np.load(os.path.join(self.directory, "neighbors.npy"), mmap_mode="r")
+        self.scores = np.load(os.path.join(self.directory, "scores.npy"), mmap_mode="r")
+        ids = np.load(os.path.join(self.directory, "ids.npy"), mmap_mode="r")
+        self.ids = [str(i) for i in ids]
+        self.rows = {vid: row for row, vid in enumerate(self.ids)}
+        with open(os.path.join(self.directory, "metadata.json")) as f:
+            self.metadata = json.load(f)
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self.rows
+
+    def lookup(self, vector_id: str, top_k: int | None = None) -> list[tuple[str, float, dict]]:
+        """Return ``(id, score, metadata)`` for the neighbors of ``vector_id``.
+
+        Raises ``KeyError`` if the id is not part of the table.
+        """
+
+        row = self.rows[vector_id]
+        limit = top_k if top_k and top_k > 0 else None
+        neighbors = self.neighbors[row, :limit]
+        scores = self.scores[row, :limit]
+        return [
+            (self.ids[n], float(s), self.metadata[n])
+            for n, s in zip(neighbors, scores)
+        ]
+
+
+_table: NeighborTable | None = None
+
+
+def get_table(path: str | None) -> NeighborTable | None:
+    """Return the table at ``path``, reloading it after a rebuild.
+
+    Returns ``None`` if no table has been built yet.
+    """
+
+    global _table
+    if not path or not os.path.exists(os.path.join(path, MANIFEST)):
+        return None
+
+    mtime = os.path.getmtime(os.path.join(path, MANIFEST))
+    if _table is None or _table.path != path or _table.mtime != mtime:
+        _table = NeighborTable(path)
+    return _table
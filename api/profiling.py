@@ -0,0 +1,325 @@
+"""Sampling profiles of live requests.
+
+A request carrying the configured token in an ``X-Profile`` header is
+profiled on its own: while it runs, a background thread records the Python
+stack of every thread working for it every few milliseconds. The profile is
+written as JSON to the profile directory and its id returned in the
+``X-Profile-Id`` response header.
+
+Threads are attributed to a request through the ``current`` context
+variable, which the profiling middleware sets: work handed to a thread with
+:func:`run_in_threadpool` or an :class:`Executor` registers that thread with
+the request's profile while it runs, so concurrent requests stay out of it.
+Code running on the event loop itself is not sampled.
+
+With a sample rate above zero, that fraction of search requests is profiled
+as well and merged into a per-worker aggregate profile, which shows where
+time goes under real traffic. The aggregate is written every ``flush_sec``
+and keeps its ``max_stacks`` most frequent stacks.
+
+Profiles count samples per folded stack (``frame;frame;...``, the format of
+flamegraph.pl and speedscope) and per category, which separates waiting on
+Vertex AI, Pinecone or S3 from CPU work such as image decoding, base64 and
+serialization. ``in_flight`` records how many search requests were already
+running when a profile started.
+"""
+
+import functools
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+
+from fastapi.concurrency import run_in_threadpool as _run_in_threadpool
+
+from api import metrics
+
+# Leaf-most frame module prefixes that decide a sample's category.
+CATEGORIES = (
+    ("network", ("socket", "ssl", "http.client", "urllib3", "requests", "botocore", "pinecone")),
+    ("waiting", ("threading", "concurrent.futures", "queue", "asyncio", "selectors")),
+    ("image", ("PIL",)),
+    ("base64", ("base64",)),
+    ("serialization", ("json", "zlib", "pydantic", "fastapi.encoders", "starlette.responses", "api.streaming")),
+)
+PROFILE_ID = re.compile(r"^[0-9A-Za-z-]+$")
+# Aggregate stacks beyond the cap are counted under this one.
+OTHER_STACKS = "[other]"
+
+# The profile of the request being served, if it is profiled.
+current: ContextVar["Profile | None"] = ContextVar("profile", default=None)
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+def categorize(frames: list[str]) -> str:
+    """Return the category of a stack, given root-first frame names."""
+
+    for name in reversed(frames):
+        for category, prefixes in CATEGORIES:
+            if any(name == prefix or name.startswith(prefix + ".") for prefix in prefixes):
+                return category
+    return "python"
+
+
+class Profile:
+    """Samples collected for one request."""
+
+    def __init__(self, aggregate: bool = False):
+        self.id = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.aggregate = aggregate
+        self.started = time.perf_counter()
+        # Search requests already running when this one started.
+        self.in_flight = metrics.in_flight.total()
+        self.ticks = 0
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        # Idents of the threads working for this request, with nesting depth.
+        self.threads: Counter = Counter()
+
+
+def bind(fn):
+    """Wrap ``fn`` so the thread running it counts toward the current profile.
+
+    The profile is read when ``fn`` is wrapped, in the thread serving the
+    request, since executors do not carry context variables over.
+    """
+
+    profile = current.get()
+    if profile is None:
+        return fn
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        ident = threading.get_ident()
+        token = current.set(profile)
+        profile.threads[ident] += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.threads[ident] -= 1
+            if not profile.threads[ident]:
+                del profile.threads[ident]
+            current.reset(token)
+
+    return bound
+
+
+async def run_in_threadpool(fn, *args, **kwargs):
+    """``fastapi.concurrency.run_in_threadpool`` that keeps the profile."""
+
+    return await _run_in_threadpool(bind(fn), *args, **kwargs)
+
+
+class Executor(ThreadPoolExecutor):
+    """Thread pool whose tasks count toward the profile of their submitter."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(bind(fn), *args, **kwargs)
+
+
+class Profiler:
+    """Samples the stacks of the worker while profiled requests run.
+
+    A single sampler thread serves all profiles that are active at once and
+    exits when the last one stops, so the profiler costs nothing between
+    profiled requests.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        token: str | None = None,
+        interval_ms: float = 5,
+        retention: int = 100,
+        max_age_sec: float = 86400,
+        sample_rate: float = 0.0,
+        flush_sec: float = 60,
+        max_stacks: int = 2000,
+    ):
+        self.directory = directory
+        self.token = token
+        self.interval = interval_ms / 1000
+        self.retention = retention
+        self.max_age_sec = max_age_sec
+        self.sample_rate = sample_rate
+        self.flush_sec = flush_sec
+        self.max_stacks = max_stacks
+        self._lock = threading.Lock()
+        self._active: list[Profile] = []
+        self._thread: threading.Thread | None = None
+        self._aggregate = {"requests": 0, "ticks": 0, "stacks": Counter(), "categories": Counter()}
+        self._flush_timer: threading.Timer | None = None
+
+    def requested(self, headers) -> bool:
+        """Whether the request asks for a profile with the right token.
+
+        The token is only accepted in a header: query strings end up in
+        access logs and proxies.
+        """
+
+        if not self.token:
+            return False
+        given = headers.get("x-profile") or ""
+        return hmac.compare_digest(given.encode(), self.token.encode())
+
+    def should_sample(self) -> bool:
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, aggregate: bool = False) -> Profile:
+        profile = Profile(aggregate)
+        with self._lock:
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile) -> None:
+        with self._lock:
+            if profile in self._active:
+                self._active.remove(profile)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                profiles = list(self._active)
+            tagged = {ident for profile in profiles for ident in list(profile.threads)}
+
+            samples = {}
+            for ident, frame in sys._current_frames().items():
+                if ident not in tagged:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame))
+                    frame = frame.f_back
+                frames.reverse()
+                samples[ident] = (";".join(frames), categorize(frames))
+
+            with self._lock:
+                for profile in profiles:
+                    profile.ticks += 1
+                    for ident in list(profile.threads):
+                        if ident in samples:
+                            stack, category = samples[ident]
+                            profile.stacks[stack] += 1
+                            profile.categories[category] += 1
+            time.sleep(self.interval)
+
+    def finish(self, profile: Profile, method: str, path: str, status: int) -> str:
+        """Stop ``profile`` and save it, or merge it into the aggregate profile."""
+
+        self.stop(profile)
+        duration = time.perf_counter() - profile.started
+        os.makedirs(self.directory, exist_ok=True)
+
+        if profile.aggregate:
+            with self._lock:
+                aggregate = self._aggregate
+                aggregate["requests"] += 1
+                aggregate["ticks"] += profile.ticks
+                aggregate["stacks"].update(profile.stacks)
+                aggregate["categories"].update(profile.categories)
+                if len(aggregate["stacks"]) > self.max_stacks:
+                    kept = Counter(dict(aggregate["stacks"].most_common(self.max_stacks - 1)))
+                    kept[OTHER_STACKS] += sum(aggregate["stacks"].values()) - sum(kept.values())
+                    aggregate["stacks"] = kept
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.flush_sec, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+            return f"aggregate-{os.getpid()}"
+
+        document = {
+            "id": profile.id,
+            "method": method,
+            "path": path,
+            "status": status,
+            "duration_ms": round(duration * 1000, 2),
+            "interval_ms": self.interval * 1000,
+            "ticks": profile.ticks,
+            "in_flight": profile.in_flight,
+            "categories": dict(profile.categories),
+            "stacks": dict(profile.stacks.most_common()),
+        }
+        self._write(profile.id, document)
+        self.prune()
+        return profile.id
+
+    def flush(self) -> None:
+        """Write the aggregate profile; called ``flush_sec`` after a merge."""
+
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            aggregate = self._aggregate
+            if not aggregate["requests"]:
+                return
+            document = {
+                "id": f"aggregate-{os.getpid()}",
+                "sample_rate": self.sample_rate,
+                "interval_ms": self.interval * 1000,
+                "requests": aggregate["requests"],
+                "ticks": aggregate["ticks"],
+                "categories": dict(aggregate["categories"]),
+                "stacks": dict(aggregate["stacks"].most_common()),
+            }
+        os.makedirs(self.directory, exist_ok=True)
+        self._write(document["id"], document)
+
+    def _write(self, profile_id: str, document: dict) -> None:
+        path = os.path.join(self.directory, f"{profile_id}.json")
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(document, f)
+        os.replace(tmp, path)
+
+    def prune(self) -> None:
+        """Delete request profiles beyond the retention count or age."""
+
+        now = time.time()
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json") and not name.startswith("aggregate-"):
+                path = os.path.join(self.directory, name)
+                try:
+                    profiles.append((os.path.getmtime(path), path))
+                except FileNotFoundError:
+                    continue
+        profiles.sort(reverse=True)
+        for position, (mtime, path) in enumerate(profiles):
+            if position >= self.retention or now - mtime > self.max_age_sec:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def list(self) -> list[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        names = [name[: -len(".json")] for name in os.listdir(self.directory) if name.endswith(".json")]
+        return sorted(names, reverse=True)
+
+    def load(self, profile_id: str) -> dict | None:
+        if not PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json")) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
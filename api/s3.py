@@ -0,0 +1,251 @@
+"""Pooled S3 clients and downloads shared by the API and the ingestion scripts.
+
+This module does not read the API settings, so the standalone scripts can
+use it without the API's environment. :mod:`api.aws_storage` builds the
+API's client from the settings on top of it.
+
+- :func:`make_client` returns a client whose connection pool is sized for the
+  number of threads sharing it; botocore's default of 10 connections makes
+  larger thread pools wait for a free connection.
+- :func:`download` fetches small objects with a single GET and large ones as
+  byte ranges in parallel; :func:`download_to_file` writes the ranges straight
+  into a file at their offsets instead of joining them in memory.
+- Every request is retried by :func:`with_retries` alone, with jittered
+  exponential backoff. botocore's own retries are disabled, so a failure is
+  not retried at two levels.
+- Downloaded bytes and time are recorded in :data:`stats` and in the
+  ``search_s3_*`` metrics, so both sides can report throughput.
+"""
+
+import random
+import re
+import threading
+import time
+
+from api import metrics, profiling
+
+DEFAULT_POOL_CONNECTIONS = 32
+# Objects larger than one part are downloaded as parallel ranged GETs.
+PART_SIZE = 8 * 1024 * 1024
+PART_WORKERS = 8
+MAX_ATTEMPTS = 3
+BASE_DELAY_SEC = 0.5
+MAX_DELAY_SEC = 10.0
+
+# Error codes that retrying cannot fix.
+PERMANENT_ERRORS = {
+    "404", "NoSuchKey", "NotFound", "NoSuchBucket", "403", "AccessDenied",
+    "412", "PreconditionFailed", "InvalidRange", "InvalidObjectState",
+}
+
+_clients: dict[tuple, object] = {}
+_clients_lock = threading.Lock()
+# Separate from the callers' pools so a download never waits on its own thread.
+_parts = profiling.Executor(max_workers=PART_WORKERS, thread_name_prefix="s3-part")
+
+downloaded_bytes = metrics.Counter("search_s3_downloaded_bytes_total", "Bytes downloaded from S3.")
+download_seconds = metrics.Counter("search_s3_download_seconds_total", "Time spent downloading from S3.")
+
+
+class TransferStats:
+    """Bytes and time spent downloading, for throughput reports."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.objects = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.retries = 0
+
+    def record(self, nbytes: int, seconds: float) -> None:
+        with self._lock:
+            self.objects += 1
+            self.bytes += nbytes
+            self.seconds += seconds
+        downloaded_bytes.inc(nbytes)
+        download_seconds.inc(seconds)
+
+    def retried(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+    def summary(self) -> str:
+        with self._lock:
+            rate = self.bytes / self.seconds if self.seconds else 0.0
+            return (
+                f"S3: {self.objects} objects, {self.bytes / 1e6:.1f} MB in {self.seconds:.1f} s of transfers "
+                f"({rate / 1e6:.1f} MB/s per download), {self.retries} retries"
+            )
+
+
+stats = TransferStats()
+
+
+def make_client(region: str | None = None, max_pool_connections: int = DEFAULT_POOL_CONNECTIONS):
+    """Return a new S3 client with a connection pool of the given size."""
+
+    import boto3
+    from botocore.config import Config
+
+    return boto3.client(
+        "s3",
+        region_name=region,
+        config=Config(
+            max_pool_connections=max_pool_connections,
+            # with_retries owns retries; botocore makes a single attempt.
+            retries={"total_max_attempts": 1, "mode": "standard"},
+            tcp_keepalive=True,
+        ),
+    )
+
+
+def shared_client(region: str | None = None, max_pool_connections: int = DEFAULT_POOL_CONNECTIONS):
+    """Return the process-wide client for ``region``.
+
+    boto3 clients are thread safe, so one pooled client is shared by all
+    threads instead of creating one per request or per file.
+    """
+
+    key = (region, max_pool_connections)
+    with _clients_lock:
+        if key not in _clients:
+            _clients[key] = make_client(region, max_pool_connections)
+        return _clients[key]
+
+
+def error_code(error: Exception) -> str | None:
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def is_not_found(error: Exception) -> bool:
+    return error_code(error) in ("404", "NoSuchKey", "NotFound")
+
+
+def with_retries(call, max_attempts: int = MAX_ATTEMPTS):
+    """Run ``call()``, retrying transient failures with jittered backoff.
+
+    This is the only retry layer for clients from :func:`make_client`. It
+    also covers errors while reading a response body, such as a connection
+    reset halfway through a download, which botocore would not retry.
+    """
+
+    for attempt in range(max_attempts):
+        try:
+            return call()
+        except Exception as e:
+            if error_code(e) in PERMANENT_ERRORS or attempt == max_attempts - 1:
+                raise
+            stats.retried()
+            time.sleep(random.uniform(0, min(MAX_DELAY_SEC, BASE_DELAY_SEC * 2**attempt)))
+
+
+def _total_size(response: dict) -> int:
+    # "bytes 0-8388607/52428800" for a ranged GET.
+    match = re.search(r"/(\d+)$", response.get("ContentRange") or "")
+    return int(match.group(1)) if match else response.get("ContentLength", 0)
+
+
+def _fetch(client, bucket: str, key: str, etag: str | None, part_size: int, max_attempts: int, write) -> int:
+    """Fetch an object part by part, passing each to ``write(offset, data)``.
+
+    The first request asks for the first ``part_size`` bytes, which is the
+    whole object for images. Larger objects, such as videos, are completed
+    with parallel ranged GETs pinned to the ETag of the first response, so
+    the parts cannot come from different versions. Returns the object size.
+    """
+
+    def get(byte_range: str | None, if_match: str | None) -> dict:
+        kwargs = {}
+        if byte_range:
+            kwargs["Range"] = byte_range
+        if if_match:
+            kwargs["IfMatch"] = if_match
+
+        def call():
+            response = client.get_object(Bucket=bucket, Key=key, **kwargs)
+            return {**response, "Body": response["Body"].read()}
+
+        return with_retries(call, max_attempts)
+
+    try:
+        first = get(f"bytes=0-{part_size - 1}", etag)
+    except Exception as e:
+        # Empty objects cannot be read with a range.
+        if error_code(e) != "InvalidRange":
+            raise
+        first = get(None, etag)
+
+    write(0, first["Body"])
+    total = _total_size(first)
+    if len(first["Body"]) < total:
+        pinned = etag or first.get("ETag")
+
+        # Each part is written as soon as it arrives, so at most one part
+        # per download thread is held in memory.
+        def fetch_part(offset: int) -> None:
+            write(offset, get(f"bytes={offset}-{min(offset + part_size, total) - 1}", pinned)["Body"])
+
+        list(_parts.map(fetch_part, range(len(first["Body"]), total, part_size)))
+    return max(total, len(first["Body"]))
+
+
+def download(
+    client,
+    bucket: str,
+    key: str,
+    etag: str | None = None,
+    part_size: int = PART_SIZE,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> bytes:
+    """Download an object; with ``etag``, only that version of it."""
+
+    start = time.perf_counter()
+    parts: dict[int, bytes] = {}
+    _fetch(client, bucket, key, etag, part_size, max_attempts, parts.__setitem__)
+    body = b"".join(parts[offset] for offset in sorted(parts))
+
+    stats.record(len(body), time.perf_counter() - start)
+    return body
+
+
+def download_to_file(
+    client,
+    bucket: str,
+    key: str,
+    file,
+    etag: str | None = None,
+    part_size: int = PART_SIZE,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> int:
+    """Download an object into the binary ``file``; return its size.
+
+    Parts are written at their offsets as they arrive, so large videos are
+    never held in memory as a whole.
+    """
+
+    start = time.perf_counter()
+    lock = threading.Lock()
+
+    def write(offset: int, data: bytes) -> None:
+        with lock:
+            file.seek(offset)
+            file.write(data)
+
+    size = _fetch(client, bucket, key, etag, part_size, max_attempts, write)
+    file.flush()
+
+    stats.record(size, time.perf_counter() - start)
+    return size
+
+
+def list_keys(client, bucket: str, prefix: str = "") -> list[str]:
+    """Return all keys under ``prefix``, following continuation tokens."""
+
+    keys = []
+    kwargs = {"Bucket": bucket, "Prefix": prefix}
+    while True:
+        response = with_retries(lambda: client.list_objects_v2(**kwargs))
+        keys.extend(obj["Key"] for obj in response.get("Contents", []))
+        if not response.get("IsTruncated"):
+            return keys
+        kwargs["ContinuationToken"] = response["NextContinuationToken"]
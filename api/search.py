@@ -0,0 +1,619 @@
+"""Helpers shared by the search endpoints."""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+import uuid
+import zlib
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+from api.config import settings
+from api import aws_storage, deps, metrics, profiling, shared_cache
+
+# Largest result set a single search may page through.
+MAX_TOP_K = 1000
+
+# Matches requested per result when collapsing video segments; widened
+# automatically when a page is still short of distinct files.
+GROUP_OVERFETCH = 2
+
+# Query vectors are kept so later pages can be served without re-embedding.
+# They live in the host-wide result cache so any worker can serve a cursor;
+# the in-process cache is only used when that is disabled or full.
+QUERY_CACHE_SIZE = 1024
+QUERY_CACHE_TTL_SEC = 600
+
+# Compressed first pages and queries larger than this are not cached.
+RESULT_SLOT_SIZE = 16 * 1024
+
+_queries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_queries_lock = threading.Lock()
+
+# Queries spanning several namespaces are sent to Pinecone in parallel.
+_fanout = profiling.Executor(max_workers=8, thread_name_prefix="pinecone-query")
+
+# Rank offset of reciprocal rank fusion; 60 is the usual choice and damps
+# the influence of the very top ranks of either list.
+RRF_K = 60
+FUSION_METHODS = ("blend", "rrf")
+
+# Ranked lists fused with RRF are collected in parallel.
+_fusion = profiling.Executor(max_workers=4, thread_name_prefix="fused-query")
+
+# Incremental first pages start with this many results from a shallow query,
+# sent while the full page is still being collected.
+PREVIEW_SIZE = 10
+_pages = profiling.Executor(max_workers=8, thread_name_prefix="search-page")
+
+
+class CursorExpired(Exception):
+    """Raised when a cursor refers to a query that is no longer cached."""
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor cannot be decoded or its fields are out of range."""
+
+
+class ItemNotFound(Exception):
+    """Raised when no namespace holds a requested vector id."""
+
+
+def format_result(score: float, meta: dict | None) -> dict:
+    """Return the API representation of a single Pinecone match.
+
+    Older vectors only carry ``gcs_*`` metadata, so those fields are used as
+    a fallback when the ``s3_*`` fields are missing.
+    """
+
+    meta = meta or {}
+    s3_name = meta.get("s3_file_name")
+    s3_path = meta.get("s3_file_path")
+    gcs_name = meta.get("gcs_file_name")
+    gcs_path = meta.get("gcs_file_path")
+
+    file_name = s3_name or gcs_name or ""
+    file_path = s3_path or gcs_path or settings.s3_bucket_name or ""
+
+    url = ""
+    if s3_name or s3_path:
+        url = aws_storage.public_url(file_path, file_name)
+    if not url and (gcs_name or gcs_path):
+        url = f"https://storage.googleapis.com/{gcs_path or ''}{gcs_name or ''}"
+
+    return {
+        "score": score,
+        "metadata": {
+            "s3_file_name": file_name,
+            "s3_file_path": file_path,
+            "s3_public_url": url,
+            "file_type": meta.get("file_type"),
+            "segment": meta.get("segment"),
+            "start_offset_sec": meta.get("start_offset_sec"),
+            "end_offset_sec": meta.get("end_offset_sec"),
+            "interval_sec": meta.get("interval_sec"),
+        },
+    }
+
+
+def _timestamp(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Invalid date: {value}. Use ISO 8601, e.g. 2024-05-01 or 2024-05-01T12:00:00.")
+
+
+def build_filter(
+    file_type: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+) -> dict | None:
+    """Return a Pinecone metadata filter for the request options.
+
+    ``file_type`` may be a comma-separated list. Dates are ISO 8601 strings
+    compared against the numeric ``date_added_ts`` metadata field, since
+    Pinecone range filters only apply to numbers.
+    """
+
+    conditions = []
+    if file_type:
+        types = [t.strip() for t in file_type.split(",") if t.strip()]
+        if len(types) == 1:
+            conditions.append({"file_type": {"$eq": types[0]}})
+        elif types:
+            conditions.append({"file_type": {"$in": types}})
+
+    date_range = {}
+    start = _timestamp(date_from)
+    end = _timestamp(date_to)
+    if start is not None:
+        date_range["$gte"] = start
+    if end is not None:
+        date_range["$lte"] = end
+    if date_range:
+        conditions.append({"date_added_ts": date_range})
+
+    if not conditions:
+        return None
+    if len(conditions) == 1:
+        return conditions[0]
+    return {"$and": conditions}
+
+
+def modalities_for(file_type: str | None, default: list[str]) -> list[str]:
+    """Return the modalities a search covers.
+
+    An explicit ``file_type`` filter wins over the endpoint's ``default``.
+    """
+
+    if file_type:
+        return [t.strip() for t in file_type.split(",") if t.strip()]
+    return default
+
+
+def route_namespaces(modalities: list[str]) -> list[str]:
+    """Return the namespaces holding ``modalities``, without duplicates."""
+
+    namespaces: list[str] = []
+    for modality in modalities:
+        for namespace in settings.namespaces.get(modality, [""]):
+            if namespace not in namespaces:
+                namespaces.append(namespace)
+    return namespaces or [""]
+
+
+def query_namespaces(
+    vector: list[float],
+    top_k: int,
+    metadata_filter: dict | None,
+    namespaces: list[str],
+) -> list[dict]:
+    """Query every namespace and merge the matches by score."""
+
+    def query(namespace: str) -> list[dict]:
+        with metrics.timed("pinecone_query", upstream="pinecone"):
+            return deps.index.query(
+                vector=vector,
+                top_k=top_k,
+                filter=metadata_filter,
+                namespace=namespace,
+                include_metadata=True
+            )["matches"]
+
+    if len(namespaces) == 1:
+        return query(namespaces[0])
+
+    matches = [match for result in _fanout.map(query, namespaces) for match in result]
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return matches[:top_k]
+
+
+def group_matches(matches: list[dict]) -> list[dict]:
+    """Collapse matches that belong to the same file into one result.
+
+    Video files are ingested as one vector per segment. The best scoring
+    segment represents the file and every matching segment is listed, best
+    first, under ``segments``. Matches must be sorted by score.
+    """
+
+    groups: dict[tuple[str, str], dict] = {}
+    for match in matches:
+        result = format_result(match["score"], match["metadata"])
+        meta = result["metadata"]
+        key = (meta["s3_file_path"], meta["s3_file_name"])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = result
+        if meta["start_offset_sec"] is not None:
+            group.setdefault("segments", []).append(
+                {
+                    "score": match["score"],
+                    "segment": meta["segment"],
+                    "start_offset_sec": meta["start_offset_sec"],
+                    "end_offset_sec": meta["end_offset_sec"],
+                }
+            )
+    return list(groups.values())
+
+
+def fetch_vector(item_id: str, namespaces: list[str] | None = None) -> list[float]:
+    """Return the stored vector of an ingested item.
+
+    Every namespace is checked unless ``namespaces`` is given. Raises
+    :class:`ItemNotFound` if no namespace holds ``item_id``.
+    """
+
+    namespaces = namespaces or route_namespaces(list(settings.namespaces))
+    for namespace in namespaces:
+        with metrics.timed("pinecone_fetch", upstream="pinecone"):
+            vectors = deps.index.fetch(ids=[item_id], namespace=namespace).get("vectors", {})
+        if item_id in vectors:
+            return list(vectors[item_id]["values"])
+    raise ItemNotFound(f"Item {item_id} is not in the index.")
+
+
+def blend(parts: list[tuple[float, list[float]]]) -> list[float]:
+    """Return the normalized weighted sum of normalized vectors.
+
+    All modalities share one embedding space, so the blend of a text and an
+    image embedding is a query for items close to both.
+    """
+
+    total = [0.0] * len(parts[0][1])
+    for weight, vector in parts:
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        for i, value in enumerate(vector):
+            total[i] += weight * value / norm
+    norm = sum(value * value for value in total) ** 0.5 or 1.0
+    return [value / norm for value in total]
+
+
+def _result_id(result: dict, group: bool) -> tuple:
+    meta = result["metadata"]
+    if group:
+        # Each list may pick a different best segment of the same video.
+        return meta["s3_file_path"], meta["s3_file_name"]
+    return meta["s3_file_path"], meta["s3_file_name"], meta["segment"]
+
+
+def fuse_rankings(rankings: list[tuple[float, list[dict]]], group: bool = True) -> list[dict]:
+    """Combine ranked result lists with weighted reciprocal rank fusion.
+
+    Each result scores ``sum(weight / (RRF_K + rank))`` over the lists it
+    appears in, so items ranked well by several queries rise to the top.
+    With ``group``, results are files and segments of the same video are
+    one item. The returned ``score`` is the fusion score, not a cosine
+    similarity.
+    """
+
+    fused: dict[tuple, dict] = {}
+    for weight, results in rankings:
+        for rank, result in enumerate(results, start=1):
+            key = _result_id(result, group)
+            entry = fused.get(key)
+            if entry is None:
+                entry = fused[key] = {**result, "score": 0.0}
+            entry["score"] += weight / (RRF_K + rank)
+    return sorted(fused.values(), key=lambda result: result["score"], reverse=True)
+
+
+def _collect_fused(query: dict, end: int) -> tuple[list[dict], bool]:
+    def collect(part):
+        weight, vector = part
+        return weight, _collect({**query, "vector": vector, "fuse": None}, end)
+
+    collected = list(_fusion.map(collect, query["fuse"]))
+    with metrics.timed("result_fusion"):
+        results = fuse_rankings([(weight, results) for weight, (results, _) in collected], query["group"])
+    more = len(results) > end or any(more for _, (_, more) in collected)
+    return results[:end], more
+
+
+def _collect(query: dict, end: int) -> tuple[list[dict], bool]:
+    """Return up to ``end`` results and whether more may be available.
+
+    When grouping, Pinecone is asked for more matches than results, and the
+    request is widened using the duplication seen so far until enough
+    distinct files are found or the index has nothing more to return.
+    """
+
+    if query.get("fuse"):
+        if "results" in query:
+            # Fused once for the first page; later pages slice that ranking.
+            return query["results"][:end], len(query["results"]) > end
+        return _collect_fused(query, end)
+
+    fetch = min(end * GROUP_OVERFETCH, MAX_TOP_K) if query["group"] else end
+    while True:
+        matches = query_namespaces(query["vector"], fetch, query["filter"], query["namespaces"])
+        exhausted = len(matches) < fetch
+        with metrics.timed("result_build"):
+            if query["group"]:
+                results = group_matches(matches)
+            else:
+                results = [format_result(match["score"], match["metadata"]) for match in matches]
+
+        if len(results) >= end or exhausted or fetch >= MAX_TOP_K:
+            # Pinecone returns at most MAX_TOP_K matches, so once a grouped
+            # fetch reaches it, later pages have no further files to show.
+            capped = query["group"] and fetch >= MAX_TOP_K
+            more = len(results) > end or not (exhausted or capped)
+            return results[:end], more
+
+        # Scale by the observed matches per distinct file, plus some slack.
+        per_result = len(matches) / max(len(results), 1)
+        fetch = min(max(int(end * per_result * 1.2) + 1, fetch * 2), MAX_TOP_K)
+
+
+def _cache():
+    return shared_cache.get_cache("results", settings.result_cache_slots, RESULT_SLOT_SIZE, settings.shared_cache_dir)
+
+
+def _pack(value: dict) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+
+def _unpack(data: bytes) -> dict:
+    return json.loads(zlib.decompress(data))
+
+
+def _pack_vector(vector: list[float] | None) -> str | None:
+    # float32 is what Pinecone stores, and is far smaller than JSON floats.
+    if vector is None:
+        return None
+    return base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+
+
+def _unpack_vector(data: str | None) -> list[float] | None:
+    if data is None:
+        return None
+    return array("f", base64.b64decode(data)).tolist()
+
+
+def _pack_query(query: dict) -> bytes:
+    packed = {**query, "vector": _pack_vector(query["vector"])}
+    if query.get("fuse"):
+        packed["fuse"] = [[weight, _pack_vector(vector)] for weight, vector in query["fuse"]]
+    return _pack(packed)
+
+
+def _unpack_query(data: bytes) -> dict:
+    query = _unpack(data)
+    query["vector"] = _unpack_vector(query["vector"])
+    if query.get("fuse"):
+        query["fuse"] = [(weight, _unpack_vector(vector)) for weight, vector in query["fuse"]]
+    return query
+
+
+def _remember_query(query: dict) -> tuple[str, bool]:
+    """Store ``query`` for later pages.
+
+    Returns its id and whether it went to the shared cache, i.e. whether
+    every worker can serve cursors for it.
+    """
+
+    query_id = uuid.uuid4().hex
+    cache = _cache()
+    if cache and cache.set(f"query:{query_id}", _pack_query(query), QUERY_CACHE_TTL_SEC):
+        return query_id, True
+
+    with _queries_lock:
+        _queries[query_id] = (time.monotonic() + QUERY_CACHE_TTL_SEC, query)
+        while len(_queries) > QUERY_CACHE_SIZE:
+            _queries.popitem(last=False)
+    return query_id, False
+
+
+def _recall_query(query_id: str) -> dict:
+    cache = _cache()
+    data = cache.get(f"query:{query_id}") if cache else None
+    if data is not None:
+        metrics.cache_hits.inc(cache="query_vector")
+        return _unpack_query(data)
+
+    with _queries_lock:
+        entry = _queries.get(query_id)
+        if entry is None or entry[0] < time.monotonic():
+            _queries.pop(query_id, None)
+            metrics.cache_misses.inc(cache="query_vector")
+            raise CursorExpired("This search has expired. Please run the search again.")
+        _queries.move_to_end(query_id)
+        metrics.cache_hits.inc(cache="query_vector")
+        return entry[1]
+
+
+def _result_key(query: dict, page_size: int, top_k: int) -> str:
+    digest = hashlib.sha256()
+    vectors = [query["vector"]] if query["vector"] is not None else []
+    for weight, vector in query.get("fuse") or []:
+        digest.update(array("f", [weight]).tobytes())
+        vectors.append(vector)
+    for vector in vectors:
+        digest.update(array("f", vector).tobytes())
+    options = {key: value for key, value in query.items() if key not in ("vector", "fuse")}
+    digest.update(json.dumps([options, page_size, top_k], sort_keys=True).encode("utf-8"))
+    return f"page:{digest.hexdigest()}"
+
+
+def encode_cursor(query_id: str, offset: int, page_size: int, top_k: int) -> str:
+    payload = json.dumps({"q": query_id, "o": offset, "n": page_size, "k": top_k}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int, int, int]:
+    """Return the query id, offset, page size and ``top_k`` of a cursor.
+
+    Cursors come back from the client, so every field is checked against
+    the limits :func:`search` enforces before it is used.
+    """
+
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        query_id, offset, page_size, top_k = payload["q"], payload["o"], payload["n"], payload["k"]
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+    if not isinstance(query_id, str) or not all(isinstance(v, int) for v in (offset, page_size, top_k)):
+        raise InvalidCursor("Invalid cursor")
+    if not 1 <= top_k <= MAX_TOP_K or page_size < 1 or not 0 <= offset < top_k:
+        raise InvalidCursor("Invalid cursor")
+    return query_id, offset, page_size, top_k
+
+
+def _page(query_id: str, query: dict, offset: int, page_size: int, top_k: int) -> dict:
+    # Pinecone has no offset, so fetch up to the end of the page and slice.
+    end = min(offset + page_size, top_k)
+    results, more = _collect(query, end)
+
+    next_cursor = None
+    if end < top_k and more:
+        next_cursor = encode_cursor(query_id, end, page_size, top_k)
+
+    return {"results": results[offset:], "next_cursor": next_cursor}
+
+
+def search(
+    vector: list[float],
+    top_k: int | None = None,
+    page_size: int | None = None,
+    metadata_filter: dict | None = None,
+    modalities: list[str] | None = None,
+    group: bool = True,
+    incremental: bool = False,
+):
+    """Return the first page of matches for ``vector``.
+
+    ``top_k`` bounds the total number of results across all pages and
+    defaults to ``PINECONE_TOP_K``; ``page_size`` defaults to ``top_k`` so a
+    single page holds everything. Only the namespaces holding
+    ``modalities`` are searched (all of them if not given). With ``group``,
+    video segments are collapsed so every result is a distinct file. The
+    response includes a ``next_cursor`` for :func:`next_page` when more
+    results are available. First pages are cached host-wide for
+    ``RESULT_CACHE_TTL_SEC``.
+
+    With ``incremental``, an iterator of partial pages is returned instead
+    (see :func:`_first_page_parts`); nothing runs until the first is taken.
+    """
+
+    query = {
+        "vector": vector,
+        "filter": metadata_filter,
+        "namespaces": route_namespaces(modalities or list(settings.namespaces)),
+        "group": group,
+    }
+    parts = _first_page_parts(query, top_k, page_size, preview=incremental)
+    return parts if incremental else _join(parts)
+
+
+def search_fused(
+    parts: list[tuple[float, list[float]]],
+    fusion: str = "blend",
+    top_k: int | None = None,
+    page_size: int | None = None,
+    metadata_filter: dict | None = None,
+    modalities: list[str] | None = None,
+    group: bool = True,
+    incremental: bool = False,
+):
+    """Search with several weighted query vectors, e.g. a text and an image.
+
+    With ``blend`` the vectors are combined into one query vector; with
+    ``rrf`` each vector is searched separately (in parallel) and the ranked
+    lists are merged with :func:`fuse_rankings`. Other arguments are as
+    for :func:`search`; fused rankings have no preview, since a shallow
+    fusion ranks differently.
+    """
+
+    if fusion not in FUSION_METHODS:
+        raise ValueError(f"fusion must be one of: {', '.join(FUSION_METHODS)}")
+    parts = [(weight, vector) for weight, vector in parts if weight > 0]
+    if not parts:
+        raise ValueError("At least one query needs a positive weight")
+    if fusion == "blend" or len(parts) == 1:
+        return search(blend(parts), top_k, page_size, metadata_filter, modalities, group, incremental)
+
+    query = {
+        "vector": None,
+        "fuse": parts,
+        "filter": metadata_filter,
+        "namespaces": route_namespaces(modalities or list(settings.namespaces)),
+        "group": group,
+    }
+    parts = _first_page_parts(query, top_k, page_size)
+    return parts if incremental else _join(parts)
+
+
+def _join(parts) -> dict:
+    """Return the page made of an iterator of partial pages."""
+
+    page = {"results": [], "next_cursor": None}
+    for part in parts:
+        for update in part.get("updates", []):
+            page["results"][update["index"]] = update["result"]
+        page["results"].extend(part["results"])
+        page["next_cursor"] = part.get("next_cursor")
+    return page
+
+
+def _first_page_parts(query: dict, top_k: int | None, page_size: int | None, preview: bool = False):
+    """Yield the first page as partial pages ``{"results": [...]}``.
+
+    The last part also carries ``next_cursor``. With ``preview``, and a page
+    larger than ``PREVIEW_SIZE``, the first part holds the top results of
+    a shallow query, sent while the full page is collected concurrently;
+    the last part holds the rest of the page. Preview results that differ
+    from their copy in the full page, e.g. grouped videos whose ``segments``
+    the shallow query cut short, are sent again in the last part as
+    ``updates``: ``{"index": <position in the response>, "result": {...}}``.
+    """
+
+    top_k = top_k or settings.k
+    page_size = page_size or top_k
+    if not 1 <= top_k <= MAX_TOP_K:
+        raise ValueError(f"top_k must be between 1 and {MAX_TOP_K}")
+    if page_size < 1:
+        raise ValueError("page_size must be at least 1")
+
+    cache = _cache()
+    key = _result_key(query, page_size, top_k)
+    data = cache.get(key) if cache else None
+    if data is not None:
+        metrics.cache_hits.inc(cache="results")
+        yield _unpack(data)
+        return
+    metrics.cache_misses.inc(cache="results")
+
+    def full_page() -> dict:
+        paged = query
+        if query.get("fuse") and page_size < top_k:
+            # Deeper lists fuse differently, so the ranking is fused once to the
+            # full depth and kept with the query; pages never shift or overlap.
+            paged = {**query, "results": _collect_fused(query, top_k)[0]}
+        query_id, shared = _remember_query(paged) if page_size < top_k else ("", True)
+        page = _page(query_id, paged, 0, page_size, top_k)
+        # A page whose cursor only this worker can resolve is not shared.
+        if cache and shared:
+            cache.set(key, _pack(page), settings.result_cache_ttl_sec)
+        return page
+
+    if not preview or query.get("fuse") or min(page_size, top_k) <= PREVIEW_SIZE:
+        yield full_page()
+        return
+
+    pending = _pages.submit(full_page)
+    first, _ = _collect(query, PREVIEW_SIZE)
+    yield {"results": first}
+
+    page = pending.result()
+    # The shallow query almost always returns the top of the full page; any
+    # result it found that the full page ranks differently is not repeated.
+    sent = {_result_id(result, query["group"]): index for index, result in enumerate(first)}
+    rest, updates = [], []
+    for result in page["results"]:
+        index = sent.get(_result_id(result, query["group"]))
+        if index is None:
+            rest.append(result)
+        elif result != first[index]:
+            updates.append({"index": index, "result": result})
+    yield {"results": rest, "updates": updates, "next_cursor": page["next_cursor"]}
+
+
+def next_page(cursor: str, incremental: bool = False):
+    """Return the page a cursor points at, reusing the cached query vector.
+
+    The cursor is decoded and checked right away. With ``incremental``
+    the page is returned as a one-part iterator, as for :func:`search`.
+    """
+
+    query_id, offset, page_size, top_k = decode_cursor(cursor)
+
+    def parts():
+        yield _page(query_id, _recall_query(query_id), offset, page_size, top_k)
+
+    return parts() if incremental else _join(parts())
@@ -0,0 +1,187 @@
+"""Host-local cache shared by every uvicorn worker through a memory-mapped file.
+
+The file (under ``/dev/shm`` when available) holds a fixed number of
+fixed-size slots, so memory use does not grow with the number of workers.
+Slots are grouped into sets of ``WAYS``; a key hashes to one set and is
+stored in any slot of it. When a set is full, a CLOCK sweep over the set's
+reference bits picks the victim, approximating LRU without bookkeeping on
+reads. Each set is guarded by an ``fcntl`` byte-range lock, so workers only
+contend when they touch the same set.
+
+Slot layout::
+
+    used (B) | referenced (B) | padding (2x) | length (I) | expires (d) | key digest (16s) | payload
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+MAGIC = b"STLCACHE"
+VERSION = 1
+WAYS = 8
+
+_HEADER = struct.Struct("<8sIII")  # magic, version, slots, payload size
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<BB2xId16s")
+
+
+def default_directory() -> str:
+    return "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+
+
+class SharedCache:
+    def __init__(self, path: str, slots: int, slot_size: int):
+        self.path = path
+        self.sets = max(1, slots // WAYS)
+        self.slots = self.sets * WAYS
+        self.slot_size = slot_size
+        self.stride = _SLOT.size + slot_size
+        self.size = _HEADER_SIZE + self.slots * self.stride
+        # fcntl locks are per process, so threads also need a local lock.
+        self._lock = threading.Lock()
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, _HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, _HEADER.size, 0)
+            expected = _HEADER.pack(MAGIC, VERSION, self.slots, slot_size)
+            if not header.startswith(MAGIC):
+                # A new file; no worker maps it before the header is written.
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, expected, 0)
+                header = expected
+            matches = header == expected and os.fstat(self._fd).st_size == self.size
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, _HEADER_SIZE, 0)
+        if not matches:
+            # Other workers may have it mapped, so it is never resized or cleared.
+            os.close(self._fd)
+            raise ValueError(f"{path} was created with a different cache layout")
+        self._map = mmap.mmap(self._fd, self.size)
+
+    def _locked_set(self, digest: bytes):
+        index = int.from_bytes(digest[:8], "little") % self.sets
+        start = _HEADER_SIZE + index * WAYS * self.stride
+        return start, _SetLock(self, start, WAYS * self.stride)
+
+    def _slot(self, offset: int) -> tuple[int, int, int, float, bytes]:
+        return _SLOT.unpack_from(self._map, offset)
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached value for ``key`` or ``None``."""
+
+        digest = _digest(key)
+        start, lock = self._locked_set(digest)
+        now = time.time()
+        with lock:
+            for way in range(WAYS):
+                offset = start + way * self.stride
+                used, _, length, expires, slot_digest = self._slot(offset)
+                if not used or slot_digest != digest:
+                    continue
+                if expires and expires < now:
+                    self._map[offset] = 0
+                    return None
+                self._map[offset + 1] = 1
+                payload = offset + _SLOT.size
+                return bytes(self._map[payload : payload + length])
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        """Store ``value`` under ``key``; returns ``False`` if it is too large."""
+
+        if len(value) > self.slot_size:
+            return False
+
+        digest = _digest(key)
+        start, lock = self._locked_set(digest)
+        expires = time.time() + ttl if ttl else 0.0
+        with lock:
+            target = None
+            free = None
+            for way in range(WAYS):
+                offset = start + way * self.stride
+                used, _, _, _, slot_digest = self._slot(offset)
+                if used and slot_digest == digest:
+                    target = offset
+                    break
+                if not used and free is None:
+                    free = offset
+            if target is None:
+                target = free if free is not None else self._evict(start)
+
+            payload = target + _SLOT.size
+            self._map[payload : payload + len(value)] = value
+            _SLOT.pack_into(self._map, target, 1, 1, len(value), expires, digest)
+        return True
+
+    def _evict(self, start: int) -> int:
+        """Return the CLOCK victim of a full set, clearing reference bits."""
+
+        while True:
+            for way in range(WAYS):
+                offset = start + way * self.stride
+                if self._map[offset + 1]:
+                    self._map[offset + 1] = 0
+                else:
+                    return offset
+
+    def close(self) -> None:
+        self._map.close()
+        os.close(self._fd)
+
+
+class _SetLock:
+    def __init__(self, cache: SharedCache, start: int, length: int):
+        self.cache = cache
+        self.start = start
+        self.length = length
+
+    def __enter__(self):
+        self.cache._lock.acquire()
+        fcntl.lockf(self.cache._fd, fcntl.LOCK_EX, self.length, self.start)
+
+    def __exit__(self, *exc):
+        fcntl.lockf(self.cache._fd, fcntl.LOCK_UN, self.length, self.start)
+        self.cache._lock.release()
+
+
+_caches: dict[str, SharedCache | None] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(name: str, slots: int, slot_size: int, directory: str | None = None) -> SharedCache | None:
+    """Return the named cache, opening it on first use.
+
+    The file name carries the format version and geometry, so workers
+    started with a different configuration, e.g. during a rolling deploy,
+    open a file of their own while the old workers keep using theirs.
+
+    Returns ``None`` when ``slots`` is 0 or the cache file cannot be opened,
+    e.g. on a read-only filesystem; callers then skip caching.
+    """
+
+    if slots <= 0:
+        return None
+
+    slots = max(1, slots // WAYS) * WAYS
+    file_name = f"sock-scout-{name}-v{VERSION}-{slots}x{slot_size}.cache"
+    path = os.path.join(directory or default_directory(), file_name)
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                _caches[path] = SharedCache(path, slots, slot_size)
+            except (OSError, ValueError) as e:
+                print(f"Shared cache {name} disabled: {str(e)}")
+                _caches[path] = None
+        return _caches[path]
@@ -0,0 +1,288 @@
+"""Chunked, memory-mappable snapshots of the Pinecone index.
+
+Snapshots are written by ``scripts/export_index.py`` and used for offline
+analysis, local indexing and neighbor precomputation. A snapshot directory
+contains one set of files per chunk:
+
+- ``chunk-00000.ids.npy``        vector ids
+- ``chunk-00000.vectors.npy``    ``float32``, ``float16`` or ``int8`` matrix (``rows x dimension``)
+- ``chunk-00000.scales.npy``     per-row scales, ``int8`` snapshots only
+- ``chunk-00000.metadata.json``  columnar metadata, ``{"field": [value, ...]}``
+- ``chunk-00000.digests.npy``    hash of each row's exported values and metadata
+
+plus a ``manifest.json`` listing the chunks, the ids deleted from the index
+since they were exported, the rows superseded by a later export of the same
+namespace and id or removed from that namespace, and the time of the last
+export. Rows are identified by namespace and id, since the same id may exist
+in several namespaces; the namespace is the ``namespace`` metadata field.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Iterator
+
+import numpy as np
+
+from api import vectors as compact
+
+MANIFEST = "manifest.json"
+DTYPES = compact.DTYPES
+
+
+def _chunk_file(path: str, chunk: str, suffix: str) -> str:
+    return os.path.join(path, f"{chunk}.{suffix}")
+
+
+def to_columns(rows: list[dict]) -> dict[str, list]:
+    """Convert a list of metadata dicts into columns, padding with ``None``."""
+
+    fields: list[str] = []
+    for row in rows:
+        for field in row:
+            if field not in fields:
+                fields.append(field)
+    return {field: [row.get(field) for row in rows] for field in fields}
+
+
+def from_columns(columns: dict[str, list], rows: int) -> list[dict]:
+    """Convert columnar metadata back into one dict per row, dropping ``None``."""
+
+    result: list[dict] = [{} for _ in range(rows)]
+    for field, values in columns.items():
+        for row, value in zip(result, values):
+            if value is not None:
+                row[field] = value
+    return result
+
+
+def row_digest(values: list[float], metadata: dict | None = None) -> str:
+    """Return a short hash of a vector's values and metadata, to detect changes."""
+
+    digest = hashlib.blake2b(np.asarray(values, dtype=np.float32).tobytes(), digest_size=8)
+    digest.update(json.dumps(metadata or {}, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+
+def _namespaces(path: str, chunk: str, rows: int) -> list[str]:
+    """Return the namespace of every row of a chunk."""
+
+    with open(_chunk_file(path, chunk, "metadata.json")) as f:
+        namespaces = json.load(f).get("namespace") or [None] * rows
+    return [namespace or "" for namespace in namespaces]
+
+
+def load_manifest(path: str) -> dict | None:
+    """Return the manifest of the snapshot at ``path`` or ``None``."""
+
+    manifest_path = os.path.join(path, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path) as f:
+        return json.load(f)
+
+
+class SnapshotWriter:
+    """Append vectors to a snapshot, one chunk file set per ``chunk_rows``."""
+
+    def __init__(self, path: str, dtype: str | None = None, chunk_rows: int = 10000):
+        """Open the snapshot at ``path`` for appending, or start a new one.
+
+        ``dtype`` defaults to the existing snapshot's, or ``float32``. An
+        existing snapshot cannot change its dtype; write a new one instead.
+        """
+
+        if dtype is not None and dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        existing = load_manifest(path)
+        if existing and dtype and existing["dtype"] != dtype:
+            raise ValueError(
+                f"Snapshot at {path} stores {existing['dtype']} vectors, not {dtype}; "
+                "export a new snapshot to change the dtype"
+            )
+        self.manifest = existing or {
+            "dimension": None,
+            "dtype": dtype or "float32",
+            "rows": 0,
+            "chunks": [],
+            "deleted": [],
+            "superseded": {},
+            "exported_at": None,
+        }
+        self.manifest.setdefault("superseded", {})
+        self.dtype = self.manifest["dtype"]
+        self.chunk_rows = chunk_rows
+        self._ids: list[str] = []
+        self._vectors: list[list[float]] = []
+        self._metadata: list[dict] = []
+        self._written: set[str] = set()
+        # Chunk and row of the live row of each (namespace, id), to supersede
+        # it when the id is written again or removed from its namespace.
+        self._rows: dict[tuple[str, str], tuple[str, int]] = {}
+        for chunk in self.manifest["chunks"]:
+            superseded = set(self.manifest["superseded"].get(chunk["name"], []))
+            ids = np.load(_chunk_file(path, chunk["name"], "ids.npy"))
+            for row, (namespace, vid) in enumerate(zip(_namespaces(path, chunk["name"], len(ids)), ids)):
+                if row not in superseded:
+                    self._rows[(namespace, str(vid))] = (chunk["name"], row)
+
+    def add(self, vector_id: str, values: list[float], metadata: dict | None = None) -> None:
+        self._ids.append(vector_id)
+        self._vectors.append(values)
+        self._metadata.append(metadata or {})
+        if len(self._ids) >= self.chunk_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered rows as a new chunk."""
+
+        if not self._ids:
+            return
+
+        vectors, scales = compact.quantize(self._vectors, self.dtype)
+        if self.manifest["dimension"] is None:
+            self.manifest["dimension"] = int(vectors.shape[1])
+        elif vectors.shape[1] != self.manifest["dimension"]:
+            raise ValueError(
+                f"Vector dimension {vectors.shape[1]} does not match snapshot dimension {self.manifest['dimension']}"
+            )
+
+        chunk = f"chunk-{len(self.manifest['chunks']):05d}"
+        np.save(_chunk_file(self.path, chunk, "ids.npy"), np.asarray(self._ids, dtype=str))
+        np.save(_chunk_file(self.path, chunk, "vectors.npy"), vectors)
+        if scales is not None:
+            np.save(_chunk_file(self.path, chunk, "scales.npy"), scales)
+        with open(_chunk_file(self.path, chunk, "metadata.json"), "w") as f:
+            json.dump(to_columns(self._metadata), f)
+        digests = [row_digest(v, m) for v, m in zip(self._vectors, self._metadata)]
+        np.save(_chunk_file(self.path, chunk, "digests.npy"), np.asarray(digests, dtype=str))
+
+        superseded = self.manifest["superseded"]
+        for row, (vid, metadata) in enumerate(zip(self._ids, self._metadata)):
+            key = (metadata.get("namespace") or "", vid)
+            if key in self._rows:
+                old_chunk, old_row = self._rows[key]
+                superseded.setdefault(old_chunk, []).append(old_row)
+            self._rows[key] = (chunk, row)
+
+        self._written.update(self._ids)
+        self.manifest["chunks"].append({"name": chunk, "rows": len(self._ids)})
+        self.manifest["rows"] += len(self._ids)
+        self._ids, self._vectors, self._metadata = [], [], []
+
+    def close(self, deleted: list[str] | None = None, removed: list[tuple[str, str]] | None = None) -> dict:
+        """Flush remaining rows and write the manifest.
+
+        ``deleted`` ids are hidden in every namespace; ``removed`` hides the
+        rows of ``(namespace, id)`` pairs only. The manifest is replaced
+        atomically and written last, so readers never see chunks that are
+        still being written.
+        """
+
+        self.flush()
+        for key in removed or []:
+            if key in self._rows:
+                old_chunk, old_row = self._rows.pop(key)
+                self.manifest["superseded"].setdefault(old_chunk, []).append(old_row)
+        deleted_ids = (set(self.manifest["deleted"]) | set(deleted or [])) - self._written
+        self.manifest["deleted"] = sorted(deleted_ids)
+        self.manifest["exported_at"] = datetime.now().isoformat()
+
+        tmp_manifest = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp_manifest, "w") as f:
+            json.dump(self.manifest, f)
+        os.replace(tmp_manifest, os.path.join(self.path, MANIFEST))
+        return self.manifest
+
+
+class Snapshot:
+    """Read-only view over a snapshot; vectors are memory-mapped per chunk."""
+
+    def __init__(self, path: str):
+        manifest = load_manifest(path)
+        if manifest is None:
+            raise FileNotFoundError(f"No snapshot manifest found in {path}")
+        self.path = path
+        self.manifest = manifest
+        self.deleted = set(manifest.get("deleted", []))
+        self.superseded = {chunk: set(rows) for chunk, rows in manifest.get("superseded", {}).items()}
+
+    def __len__(self) -> int:
+        return sum(len(ids) for ids, _, _ in self.iter_chunks())
+
+    def _live_rows(self, name: str, ids: list[str]) -> list[int] | None:
+        """Return the rows of a chunk that are neither deleted nor superseded, or ``None`` for all."""
+
+        superseded = self.superseded.get(name, set())
+        if not self.deleted and not superseded:
+            return None
+        keep = [i for i, vid in enumerate(ids) if vid not in self.deleted and i not in superseded]
+        return keep if len(keep) != len(ids) else None
+
+    def iter_chunks(self, with_metadata: bool = False) -> Iterator[tuple[list[str], np.ndarray, list[dict] | None]]:
+        """Yield ``(ids, vectors, metadata)`` per chunk, skipping deleted and superseded rows.
+
+        ``metadata`` is ``None`` unless ``with_metadata`` is set. ``int8``
+        chunks are dequantized to ``float32``; other dtypes are memory-mapped.
+        """
+
+        for chunk in self.manifest["chunks"]:
+            name = chunk["name"]
+            ids = [str(i) for i in np.load(_chunk_file(self.path, name, "ids.npy"))]
+            vectors = np.load(_chunk_file(self.path, name, "vectors.npy"), mmap_mode="r")
+            if self.manifest["dtype"] == "int8":
+                vectors = compact.dequantize(vectors, np.load(_chunk_file(self.path, name, "scales.npy")))
+            metadata = None
+            if with_metadata:
+                with open(_chunk_file(self.path, name, "metadata.json")) as f:
+                    metadata = from_columns(json.load(f), len(ids))
+
+            keep = self._live_rows(name, ids)
+            if keep is not None:
+                ids = [ids[i] for i in keep]
+                vectors = vectors[keep]
+                if metadata is not None:
+                    metadata = [metadata[i] for i in keep]
+
+            yield ids, vectors, metadata
+
+    def ids(self) -> list[str]:
+        return [vid for ids, _, _ in self.iter_chunks() for vid in ids]
+
+    def digests(self) -> dict[tuple[str, str], str | None]:
+        """Return the digest of every live row by ``(namespace, id)``.
+
+        The digest is ``None`` for chunks written without digests.
+        """
+
+        result: dict[tuple[str, str], str | None] = {}
+        for chunk in self.manifest["chunks"]:
+            name = chunk["name"]
+            ids = [str(i) for i in np.load(_chunk_file(self.path, name, "ids.npy"))]
+            namespaces = _namespaces(self.path, name, len(ids))
+            digests_file = _chunk_file(self.path, name, "digests.npy")
+            digests = [str(d) for d in np.load(digests_file)] if os.path.exists(digests_file) else [None] * len(ids)
+            keep = self._live_rows(name, ids)
+            for i in range(len(ids)) if keep is None else keep:
+                result[(namespaces[i], ids[i])] = digests[i]
+        return result
+
+    def load(self, with_metadata: bool = True) -> tuple[list[str], np.ndarray, list[dict]]:
+        """Return all live ids, a ``float32`` vector matrix and metadata rows."""
+
+        all_ids: list[str] = []
+        matrices: list[np.ndarray] = []
+        all_metadata: list[dict] = []
+        for ids, vectors, metadata in self.iter_chunks(with_metadata):
+            all_ids.extend(ids)
+            matrices.append(np.asarray(vectors, dtype=np.float32))
+            if metadata is not None:
+                all_metadata.extend(metadata)
+
+        dimension = self.manifest.get("dimension") or 0
+        vectors = np.concatenate(matrices) if matrices else np.zeros((0, dimension), dtype=np.float32)
+        return all_ids, vectors, all_metadata
@@ -0,0 +1,108 @@
+"""Opt-in streaming of search responses.
+
+Clients that send ``Accept: application/x-ndjson`` or ``Accept:
+text/event-stream`` receive results as soon as they are found instead of a
+single JSON document. First pages start with the top results of a shallow
+query, sent while the full page is still being collected (see
+``search.PREVIEW_SIZE``), so clients can render the first tiles early.
+
+NDJSON responses hold one ``{"result": {...}}`` line per result followed by
+a final ``{"next_cursor": ...}`` line. Server-sent events use a ``result``
+event per result and a closing ``done`` event carrying ``next_cursor``.
+
+A preview result that turns out to differ from its copy in the full page is
+sent again as ``{"update": {"index": i, "result": {...}}}`` (an ``update``
+event), replacing the ``i``-th result of the response, so a streamed page
+ends up identical to the JSON one.
+"""
+
+import json
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from api.profiling import run_in_threadpool
+
+NDJSON = "application/x-ndjson"
+EVENT_STREAM = "text/event-stream"
+
+# Results serialized into one chunk of the response body.
+BATCH_SIZE = 50
+
+
+def requested_format(request: Request) -> str | None:
+    """Return the streaming media type the client accepts, if any."""
+
+    accept = request.headers.get("accept", "")
+    for media_type in (NDJSON, EVENT_STREAM):
+        if media_type in accept:
+            return media_type
+    return None
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _ndjson(results: list[dict], done: bool, next_cursor: str | None, updates: list[dict] = ()) -> str:
+    lines = [_dumps({"update": update}) + "\n" for update in updates]
+    lines += [_dumps({"result": result}) + "\n" for result in results]
+    if done:
+        lines.append(_dumps({"next_cursor": next_cursor}) + "\n")
+    return "".join(lines)
+
+
+def _events(results: list[dict], done: bool, next_cursor: str | None, updates: list[dict] = ()) -> str:
+    events = [f"event: update\ndata: {_dumps(update)}\n\n" for update in updates]
+    events += [f"event: result\ndata: {_dumps(result)}\n\n" for result in results]
+    if done:
+        events.append(f"event: done\ndata: {_dumps({'next_cursor': next_cursor})}\n\n")
+    return "".join(events)
+
+
+def _chunks(part: dict, serialize) -> list[str]:
+    """Serialize a partial page into chunks of at most ``BATCH_SIZE`` results."""
+
+    results = part["results"]
+    done = "next_cursor" in part
+    starts = range(0, len(results), BATCH_SIZE) if results else [0]
+    return [
+        serialize(
+            results[start : start + BATCH_SIZE],
+            done and start + BATCH_SIZE >= len(results),
+            part.get("next_cursor"),
+            part.get("updates", []) if start == 0 else [],
+        )
+        for start in starts
+    ]
+
+
+async def respond(request: Request, search, *args, **kwargs):
+    """Run ``search(*args, **kwargs)`` and return its page, or stream it.
+
+    ``search`` is one of the page functions of :mod:`api.search`. When the
+    client asked for a stream, it is called with ``incremental=True`` and
+    every partial page is sent as soon as it is ready. The first part is
+    collected before the response starts, so errors such as a bad request
+    or an unavailable upstream still get their status code.
+    """
+
+    media_type = requested_format(request)
+    if media_type is None:
+        return await run_in_threadpool(search, *args, **kwargs)
+
+    parts = search(*args, incremental=True, **kwargs)
+    first = await run_in_threadpool(next, parts)
+    serialize = _ndjson if media_type == NDJSON else _events
+
+    # One threadpool hop per partial page, not per line.
+    async def body():
+        part = first
+        while part is not None:
+            for chunk in _chunks(part, serialize):
+                yield chunk
+            part = await run_in_threadpool(next, parts, None)
+
+    # Proxies such as nginx would otherwise buffer the stream.
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
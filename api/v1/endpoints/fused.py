@@ -0,0 +1,57 @@
+import asyncio
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from api import aws_storage, embedding, search, streaming
+from api.profiling import run_in_threadpool
+from api.v1.endpoints.image import image_vector
+
+router = APIRouter()
+
+@router.post("/search/fused")
+async def query_fused(
+    request: Request,
+    query: str = Form(...),
+    file: UploadFile | None = File(None),
+    s3_uri: str | None = Form(None),
+    item_id: str | None = Form(None),
+    text_weight: float = Form(0.5),
+    fusion: str = Form("blend"),
+    top_k: int | None = Form(None),
+    page_size: int | None = Form(None),
+    file_type: str | None = Form(None),
+    date_from: str | None = Form(None),
+    date_to: str | None = Form(None),
+    group: bool = Form(True),
+):
+    try:
+        if not query:
+            raise HTTPException(status_code=400, detail="The query text cannot be empty")
+        if not 0 <= text_weight <= 1:
+            raise HTTPException(status_code=400, detail="text_weight must be between 0 and 1")
+
+        metadata_filter = search.build_filter(file_type, date_from, date_to)
+
+        # Both embeddings run at once, so the request takes about as long as the slower one.
+        text_vector, picture_vector = await asyncio.gather(
+            run_in_threadpool(embedding.embed, 'text', query),
+            image_vector(file, s3_uri, item_id),
+        )
+
+        return await streaming.respond(
+            request,
+            search.search_fused,
+            [(text_weight, text_vector), (1 - text_weight, picture_vector)],
+            fusion,
+            top_k,
+            page_size,
+            metadata_filter,
+            search.modalities_for(file_type, ['image', 'video']),
+            group,
+        )
+    except HTTPException:
+        raise
+    except embedding.EmbeddingUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (aws_storage.ObjectNotFound, search.ItemNotFound) as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -1,78 +1,75 @@
 import base64
-import requests
 from PIL import Image
 import io
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from api.config import settings
-from api import deps, aws_storage
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from api import aws_storage, embedding, metrics, search, streaming
+from api.profiling import run_in_threadpool
 
 router = APIRouter()
 
-@router.post("/search/image")
-async def query_image(file: UploadFile = File(...)):
-    try:
+def check_image(contents: bytes) -> None:
+    with metrics.timed("image_format_check"), Image.open(io.BytesIO(contents)) as img:
+        file_format = img.format.lower()
+
+    # Vertex AI Multimodal Embedding Model only supports the following image formats
+    if file_format not in ['bmp', 'gif', 'jpeg', 'png', 'jpg']:
+        raise HTTPException(status_code=400, detail="We only support BMP, GIF, JPG, JPEG, and PNG for images. Please upload a valid image file.")
+
+async def image_vector(file: UploadFile | None, s3_uri: str | None, item_id: str | None) -> list[float]:
+    """Return the query vector for an uploaded, referenced or indexed image."""
+
+    if item_id:
+        # Already ingested: reuse the stored vector instead of embedding.
+        return await run_in_threadpool(search.fetch_vector, item_id)
+    if s3_uri:
+        bucket, key = aws_storage.parse_object_ref(s3_uri)
+        return await run_in_threadpool(embedding.embed_object, 'image', bucket, key, None, check_image)
+    if not file:
+        raise HTTPException(status_code=400, detail="Upload an image, or give its s3_uri or item_id.")
+
+    with metrics.timed("upload_read"):
         contents = await file.read()
 
-        with Image.open(io.BytesIO(contents)) as img:
-            file_format = img.format.lower()
-        
-        # Vertex AI Multimodal Embedding Model only supports the following image formats
-        if file_format not in ['bmp', 'gif', 'jpeg', 'png', 'jpg']:
-            raise HTTPException(status_code=400, detail="We only support BMP, GIF, JPG, JPEG, and PNG for images. Please upload a valid image file.")
-        
+    check_image(contents)
+
+    with metrics.timed("base64_encode"):
         base64_encoded_image = base64.b64encode(contents).decode('utf-8')
-        
-        access_token = settings.get_access_token()
-        
-        url, headers, data = settings.get_embedding_request_data(access_token, 'image', base64_encoded_image)
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        # Extract the first embedding from the response
-        embedding_data = response.json()
-        vector = embedding_data['predictions'][0]['imageEmbedding']
-        
-        query_response = deps.index.query(
-            vector=vector,
-            top_k=settings.k,
-            include_metadata=True
-        )
-        
-        matches = query_response["matches"]
-        results = []
-        for match in matches:
-            meta = match["metadata"]
-            s3_name = meta.get("s3_file_name")
-            s3_path = meta.get("s3_file_path")
-            gcs_name = meta.get("gcs_file_name")
-            gcs_path = meta.get("gcs_file_path")
 
-            file_name = s3_name or gcs_name or ""
-            file_path = s3_path or gcs_path or settings.s3_bucket_name or ""
+    return await run_in_threadpool(embedding.embed, 'image', base64_encoded_image)
+
+@router.post("/search/image")
+async def query_image(
+    request: Request,
+    file: UploadFile | None = File(None),
+    s3_uri: str | None = Form(None),
+    item_id: str | None = Form(None),
+    top_k: int | None = Form(None),
+    page_size: int | None = Form(None),
+    file_type: str | None = Form(None),
+    date_from: str | None = Form(None),
+    date_to: str | None = Form(None),
+    group: bool = Form(True),
+):
+    try:
+        metadata_filter = search.build_filter(file_type, date_from, date_to)
 
-            url = ""
-            if s3_name or s3_path:
-                url = aws_storage.public_url(file_path, file_name)
-            if not url and (gcs_name or gcs_path):
-                url = f"https://storage.googleapis.com/{gcs_path or ''}{gcs_name or ''}"
+        vector = await image_vector(file, s3_uri, item_id)
 
-            results.append(
-                {
-                    "score": match["score"],
-                    "metadata": {
-                        "s3_file_name": file_name,
-                        "s3_file_path": file_path,
-                        "s3_public_url": url,
-                        "file_type": meta.get("file_type"),
-                        "segment": meta.get("segment"),
-                        "start_offset_sec": meta.get("start_offset_sec"),
-                        "end_offset_sec": meta.get("end_offset_sec"),
-                        "interval_sec": meta.get("interval_sec"),
-                    },
-                }
-            )
-        
-        return {"results": results}
+        return await streaming.respond(
+            request,
+            search.search,
+            vector,
+            top_k=top_k,
+            page_size=page_size,
+            metadata_filter=metadata_filter,
+            modalities=search.modalities_for(file_type, ['image']),
+            group=group,
+        )
+    except HTTPException:
+        raise
+    except embedding.EmbeddingUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (aws_storage.ObjectNotFound, search.ItemNotFound) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
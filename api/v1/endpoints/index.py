@@ -1,13 +1,23 @@
 from fastapi import APIRouter, HTTPException
-from api import deps
+from api import deps, index_stats
+from api.config import settings
+from api.profiling import run_in_threadpool
 
 router = APIRouter()
 
 @router.get("/index/info")
 async def get_index_info():
+    stats = index_stats.get_stats(
+        deps.index,
+        settings.namespaces,
+        settings.index_stats_refresh_sec,
+        settings.index_stats_max_age_sec,
+        settings.snapshot_path,
+    )
     try:
-        index_info = deps.index.describe_index_stats()
-        total_vectors = index_info['total_vector_count']
-        return {"total_vectors": total_vectors}
+        # Only the first request, or the first one after the statistics expired, waits for Pinecone.
+        return await run_in_threadpool(stats.get) if stats.needs_refresh() else stats.get()
+    except index_stats.StatsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve index info: {str(e)}")
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel
+from api import search, streaming
+
+router = APIRouter()
+
+class PageQuery(BaseModel):
+    cursor: str
+
+@router.post("/search/page")
+async def query_page(query: PageQuery, request: Request):
+    try:
+        return await streaming.respond(request, search.next_page, query.cursor)
+    except search.InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except search.CursorExpired as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
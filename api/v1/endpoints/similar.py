@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException, Query
+from api.config import settings
+from api import neighbors, search
+from api.profiling import run_in_threadpool
+
+router = APIRouter()
+
+@router.get("/items/{item_id}/similar")
+async def similar_items(item_id: str, top_k: int | None = Query(None, ge=1, le=search.MAX_TOP_K)):
+    try:
+        # Loading or reloading the table reads it from disk.
+        table = await run_in_threadpool(neighbors.get_table, settings.neighbors_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load neighbor table: {str(e)}")
+
+    if table is None:
+        raise HTTPException(status_code=503, detail="Similar items are not available until the neighbor table has been built.")
+    if item_id not in table:
+        raise HTTPException(status_code=404, detail=f"Item {item_id} is not in the neighbor table.")
+
+    results = []
+    for neighbor_id, score, meta in table.lookup(item_id, top_k or settings.k):
+        result = search.format_result(score, meta)
+        result["id"] = neighbor_id
+        results.append(result)
+
+    return {"results": results}
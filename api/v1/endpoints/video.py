@@ -1,79 +1,77 @@
-import os
 import base64
-import requests
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from api.config import settings
-from api import deps, aws_storage
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from api import aws_storage, embedding, metrics, search, streaming
+from api.profiling import run_in_threadpool
 
 router = APIRouter()
 
+# Vertex AI accepts inline videos up to about 20 MB (27 MB base64 encoded).
+MAX_VIDEO_BYTES = 27000000 * 3 // 4
+
 @router.post("/search/video")
-async def query_video(file: UploadFile = File(...)):
+async def query_video(
+    request: Request,
+    file: UploadFile | None = File(None),
+    s3_uri: str | None = Form(None),
+    item_id: str | None = Form(None),
+    top_k: int | None = Form(None),
+    page_size: int | None = Form(None),
+    file_type: str | None = Form(None),
+    date_from: str | None = Form(None),
+    date_to: str | None = Form(None),
+    group: bool = Form(True),
+):
     try:
-        file_path = f"/tmp/{file.filename}"
-        with open(file_path, "wb") as buffer:
-            buffer.write(await file.read())
-        
-        with open(file_path, "rb") as video_file:
-            base64_encoded_data = base64.b64encode(video_file.read())
-            base64_video = base64_encoded_data.decode('utf-8')
-        
-        if len(base64_video) > 27000000:
-            os.remove(file_path)
-            raise HTTPException(status_code=400, detail="We don't support videos greater than 20 MB. Please upload a smaller video.")
+        metadata_filter = search.build_filter(file_type, date_from, date_to)
 
-        access_token = settings.get_access_token()
-        
-        url, headers, data = settings.get_embedding_request_data(access_token, 'video', base64_video)
-        
-        response = requests.post(url, headers=headers, json=data)
-        response.raise_for_status()
-        
-        # Extract the first embedding from the response
-        embedding_data = response.json()
-        vector = embedding_data['predictions'][0]['videoEmbeddings'][0]['embedding']
-        
-        query_response = deps.index.query(
-            vector=vector,
-            top_k=settings.k,
-            include_metadata=True
-        )
-        
-        matches = query_response["matches"]
-        results = []
-        for match in matches:
-            meta = match["metadata"]
-            s3_name = meta.get("s3_file_name")
-            s3_path = meta.get("s3_file_path")
-            gcs_name = meta.get("gcs_file_name")
-            gcs_path = meta.get("gcs_file_path")
+        if item_id or s3_uri:
+            if item_id:
+                # Already ingested: reuse the stored vector instead of embedding.
+                vector = await run_in_threadpool(search.fetch_vector, item_id)
+            else:
+                bucket, key = aws_storage.parse_object_ref(s3_uri)
+                vector = await run_in_threadpool(embedding.embed_object, 'video', bucket, key, MAX_VIDEO_BYTES)
+            return await streaming.respond(
+                request,
+                search.search,
+                vector,
+                top_k=top_k,
+                page_size=page_size,
+                metadata_filter=metadata_filter,
+                modalities=search.modalities_for(file_type, ['video']),
+                group=group,
+            )
+        if not file:
+            raise HTTPException(status_code=400, detail="Upload a video, or give its s3_uri or item_id.")
 
-            file_name = s3_name or gcs_name or ""
-            file_path = s3_path or gcs_path or settings.s3_bucket_name or ""
+        # Kept in memory: a file named after the upload is clobbered by
+        # concurrent uploads of the same name.
+        with metrics.timed("upload_read"):
+            contents = await file.read()
 
-            url = ""
-            if s3_name or s3_path:
-                url = aws_storage.public_url(file_path, file_name)
-            if not url and (gcs_name or gcs_path):
-                url = f"https://storage.googleapis.com/{gcs_path or ''}{gcs_name or ''}"
+        with metrics.timed("base64_encode"):
+            base64_video = base64.b64encode(contents).decode('utf-8')
 
-            results.append(
-                {
-                    "score": match["score"],
-                    "metadata": {
-                        "s3_file_name": file_name,
-                        "s3_file_path": file_path,
-                        "s3_public_url": url,
-                        "file_type": meta.get("file_type"),
-                        "segment": meta.get("segment"),
-                        "start_offset_sec": meta.get("start_offset_sec"),
-                        "end_offset_sec": meta.get("end_offset_sec"),
-                        "interval_sec": meta.get("interval_sec"),
-                    },
-                }
-            )
-        
-        os.remove(file_path)
-        return {"results": results}
+        if len(base64_video) > 27000000:
+            raise HTTPException(status_code=400, detail="We don't support videos greater than 20 MB. Please upload a smaller video.")
+
+        vector = await run_in_threadpool(embedding.embed, 'video', base64_video)
+
+        return await streaming.respond(
+            request,
+            search.search,
+            vector,
+            top_k=top_k,
+            page_size=page_size,
+            metadata_filter=metadata_filter,
+            modalities=search.modalities_for(file_type, ['video']),
+            group=group,
+        )
+    except HTTPException:
+        raise
+    except embedding.EmbeddingUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except (aws_storage.ObjectNotFound, search.ItemNotFound) as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
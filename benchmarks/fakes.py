@@ -0,0 +1,495 @@
+"""Local stand-ins for the services the API and ingestion scripts call.
+
+- :class:`FakeVertex` serves the Vertex AI ``predict`` endpoint over HTTP with
+  configurable latency and error injection. Embeddings are derived from a
+  hash of the content, so equal content always gets the same vector.
+- :class:`InMemoryIndex` implements the parts of the Pinecone index API the
+  code uses (query with metadata filters, upsert, fetch, update, list,
+  describe_index_stats) with exact cosine search in NumPy.
+- :class:`FakeS3` is a dictionary-backed S3 client (get/head/put object and
+  ``list_objects_v2``) in the spirit of moto, without the dependency.
+- :class:`FakeEmbeddingModel` stands in for the Vertex AI SDK model used by
+  the ingestion scripts and calls :class:`FakeVertex`.
+"""
+
+import base64
+import hashlib
+import io
+import json
+import random
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import requests
+
+DIMENSION = 1408
+
+
+def embedding_for(content: str | bytes, dimension: int = DIMENSION) -> list[float]:
+    """Return a deterministic unit vector for ``content``."""
+
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    seed = int.from_bytes(hashlib.sha256(content).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+class FakeVertex:
+    """Vertex AI ``predict`` endpoint on a local port.
+
+    Each request sleeps for ``latency_ms`` plus up to ``jitter_ms`` and fails
+    with HTTP 503 with probability ``error_rate``. Use :attr:`endpoint` as
+    ``VERTEX_API_ENDPOINT``.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, port: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                status, payload = fake.predict(body)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{{location}}"
+
+    def predict(self, body: dict) -> tuple[int, dict]:
+        delay = self.latency_ms + random.random() * self.jitter_ms
+        if delay:
+            time.sleep(delay / 1000)
+        with self._lock:
+            self.requests += 1
+            if random.random() < self.error_rate:
+                self.errors += 1
+                return 503, {"error": {"code": 503, "message": "Injected failure"}}
+
+        predictions = []
+        for instance in body["instances"]:
+            if "text" in instance:
+                predictions.append({"textEmbedding": embedding_for(instance["text"])})
+            elif "image" in instance:
+                predictions.append({"imageEmbedding": embedding_for(instance["image"]["bytesBase64Encoded"])})
+            else:
+                # One embedding per 15 second segment, like a minute-long clip.
+                content = instance["video"]["bytesBase64Encoded"]
+                predictions.append({"videoEmbeddings": [
+                    {"startOffsetSec": start, "endOffsetSec": start + 15,
+                     "embedding": embedding_for(content if start == 0 else f"{content}:{start}")}
+                    for start in range(0, 60, 15)
+                ]})
+        return 200, {"predictions": predictions}
+
+    def start(self) -> "FakeVertex":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _matches_filter(metadata: dict, condition: dict | None) -> bool:
+    """Evaluate a Pinecone metadata filter against one record."""
+
+    if not condition:
+        return True
+    for field, spec in condition.items():
+        if field == "$and":
+            if not all(_matches_filter(metadata, part) for part in spec):
+                return False
+            continue
+        if field == "$or":
+            if not any(_matches_filter(metadata, part) for part in spec):
+                return False
+            continue
+
+        value = metadata.get(field)
+        if not isinstance(spec, dict):
+            spec = {"$eq": spec}
+        for op, expected in spec.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+            if op in ("$gt", "$gte", "$lt", "$lte"):
+                if not isinstance(value, (int, float)):
+                    return False
+                if op == "$gt" and not value > expected:
+                    return False
+                if op == "$gte" and not value >= expected:
+                    return False
+                if op == "$lt" and not value < expected:
+                    return False
+                if op == "$lte" and not value <= expected:
+                    return False
+    return True
+
+
+class _Namespace:
+    def __init__(self):
+        self.rows: dict[str, int] = {}
+        self.ids: list[str] = []
+        self.vectors: list[np.ndarray] = []
+        self.metadata: list[dict] = []
+        self.deleted: set[int] = set()
+        self._matrix: np.ndarray | None = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != len(self.vectors):
+            self._matrix = np.stack(self.vectors) if self.vectors else np.zeros((0, DIMENSION), dtype=np.float32)
+        return self._matrix
+
+
+class InMemoryIndex:
+    """Exact-search stand-in for a Pinecone serverless index (cosine metric)."""
+
+    def __init__(self):
+        self.namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.RLock()
+        self.queries = 0
+        self.upserts = 0
+
+    def _namespace(self, namespace: str) -> _Namespace:
+        if namespace not in self.namespaces:
+            self.namespaces[namespace] = _Namespace()
+        return self.namespaces[namespace]
+
+    def upsert(self, vectors, namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            space = self._namespace(namespace)
+            for record in vectors:
+                if isinstance(record, tuple):
+                    record = {"id": record[0], "values": record[1], "metadata": record[2] if len(record) > 2 else {}}
+                vector = np.asarray(record["values"], dtype=np.float32)
+                vector = vector / (np.linalg.norm(vector) or 1.0)
+                row = space.rows.get(record["id"])
+                if row is None:
+                    space.rows[record["id"]] = len(space.ids)
+                    space.ids.append(record["id"])
+                    space.vectors.append(vector)
+                    space.metadata.append(dict(record.get("metadata") or {}))
+                else:
+                    space.vectors[row] = vector
+                    space.metadata[row] = dict(record.get("metadata") or {})
+                    space._matrix = None
+                    space.deleted.discard(row)
+            self.upserts += 1
+            return {"upserted_count": len(vectors)}
+
+    def query(self, vector, top_k: int, filter: dict | None = None, namespace: str = "",
+              include_metadata: bool = False, include_values: bool = False, **kwargs) -> dict:
+        with self._lock:
+            self.queries += 1
+            space = self.namespaces.get(namespace)
+            if space is None or not space.ids:
+                return {"matches": [], "namespace": namespace}
+            matrix = space.matrix()
+            ids, metadata, deleted = space.ids, space.metadata, set(space.deleted)
+
+        query = np.asarray(vector, dtype=np.float32)
+        scores = matrix @ (query / (np.linalg.norm(query) or 1.0))
+        matches = []
+        for row in np.argsort(-scores):
+            if row in deleted or not _matches_filter(metadata[row], filter):
+                continue
+            match = {"id": ids[row], "score": float(scores[row])}
+            if include_metadata:
+                match["metadata"] = metadata[row]
+            if include_values:
+                match["values"] = matrix[row].tolist()
+            matches.append(match)
+            if len(matches) >= top_k:
+                break
+        return {"matches": matches, "namespace": namespace}
+
+    def fetch(self, ids: list[str], namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            space = self.namespaces.get(namespace) or _Namespace()
+            vectors = {}
+            for vector_id in ids:
+                row = space.rows.get(vector_id)
+                if row is not None and row not in space.deleted:
+                    vectors[vector_id] = {
+                        "id": vector_id,
+                        "values": space.vectors[row].tolist(),
+                        "metadata": space.metadata[row],
+                    }
+            return {"vectors": vectors, "namespace": namespace}
+
+    def update(self, id: str, set_metadata: dict | None = None, values=None, namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            space = self._namespace(namespace)
+            row = space.rows[id]
+            if set_metadata:
+                space.metadata[row].update(set_metadata)
+            if values is not None:
+                space.vectors[row] = np.asarray(values, dtype=np.float32)
+                space._matrix = None
+            return {}
+
+    def delete(self, ids: list[str], namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            space = self._namespace(namespace)
+            space.deleted.update(space.rows[i] for i in ids if i in space.rows)
+            return {}
+
+    def list(self, prefix: str = "", namespace: str = "", limit: int = 100, **kwargs):
+        with self._lock:
+            space = self.namespaces.get(namespace) or _Namespace()
+            ids = [
+                vector_id for row, vector_id in enumerate(space.ids)
+                if row not in space.deleted and vector_id.startswith(prefix)
+            ]
+        for start in range(0, len(ids), limit):
+            yield ids[start : start + limit]
+
+    def describe_index_stats(self, filter: dict | None = None, **kwargs) -> dict:
+        if filter:
+            # Like Pinecone, only pod-based indexes count by metadata.
+            raise ValueError("Serverless and starter indexes do not support describing index stats with metadata filtering")
+        with self._lock:
+            namespaces = {
+                name: {"vector_count": len(space.ids) - len(space.deleted)}
+                for name, space in self.namespaces.items()
+            }
+        return {
+            "dimension": DIMENSION,
+            "namespaces": namespaces,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+        }
+
+
+def synthetic_catalog(index: InMemoryIndex, images: int, videos: int = 0, seed: int = 0,
+                      image_namespace: str = "", video_namespace: str = "", segments: int = 4) -> None:
+    """Fill ``index`` with random image vectors and segmented video vectors."""
+
+    rng = np.random.default_rng(seed)
+    now = datetime.now().timestamp()
+    batch = []
+
+    def flush(namespace):
+        if batch:
+            index.upsert(list(batch), namespace=namespace)
+            batch.clear()
+
+    for i in range(images):
+        batch.append({
+            "id": f"image-{i}",
+            "values": rng.standard_normal(DIMENSION).astype(np.float32),
+            "metadata": {
+                "file_type": "image",
+                "s3_file_path": "benchmark-bucket/catalog/",
+                "s3_file_name": f"image-{i}.png",
+                "date_added_ts": now - i,
+            },
+        })
+        if len(batch) >= 1000:
+            flush(image_namespace)
+    flush(image_namespace)
+
+    for i in range(videos):
+        for segment in range(segments):
+            batch.append({
+                "id": f"video-{i}-{segment}",
+                "values": rng.standard_normal(DIMENSION).astype(np.float32),
+                "metadata": {
+                    "file_type": "video",
+                    "s3_file_path": "benchmark-bucket/catalog/",
+                    "s3_file_name": f"video-{i}.mp4",
+                    "segment": segment,
+                    "start_offset_sec": segment * 15,
+                    "end_offset_sec": segment * 15 + 15,
+                    "interval_sec": 15,
+                    "date_added_ts": now - i,
+                },
+            })
+        if len(batch) >= 1000:
+            flush(video_namespace)
+    flush(video_namespace)
+
+
+class FakeS3:
+    """Dictionary-backed S3 client supporting the calls the code makes."""
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], bytes] = {}
+        self.gets = 0
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, **kwargs) -> dict:
+        self.objects[(Bucket, Key)] = bytes(Body)
+        return {"ETag": self._etag(Body)}
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return f'"{hashlib.md5(body).hexdigest()}"'
+
+    @staticmethod
+    def _error(code: str, message: str) -> Exception:
+        error = Exception(f"{code}: {message}")
+        error.response = {"Error": {"Code": code}}
+        return error
+
+    def _object(self, bucket: str, key: str) -> bytes:
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise self._error("NoSuchKey", key)
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        body = self._object(Bucket, Key)
+        return {"ETag": self._etag(body), "ContentLength": len(body)}
+
+    def get_object(self, Bucket: str, Key: str, Range: str | None = None, IfMatch: str | None = None, **kwargs) -> dict:
+        data = self._object(Bucket, Key)
+        etag = self._etag(data)
+        if IfMatch and IfMatch != etag:
+            raise self._error("PreconditionFailed", Key)
+        self.gets += 1
+        response = {"ETag": etag}
+        if Range:
+            if not data:
+                raise self._error("InvalidRange", Key)
+            start, _, end = Range.removeprefix("bytes=").partition("-")
+            start = int(start)
+            end = min(int(end) if end else len(data) - 1, len(data) - 1)
+            data = data[start : end + 1]
+            response["ContentRange"] = f"bytes {start}-{end}/{len(self.objects[(Bucket, Key)])}"
+        return {**response, "Body": io.BytesIO(data), "ContentLength": len(data)}
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **kwargs) -> dict:
+        keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        return {"Contents": [{"Key": key, "Size": len(self.objects[(Bucket, key)])} for key in keys], "KeyCount": len(keys)}
+
+
+def synthetic_images(s3: FakeS3, bucket: str, prefix: str, count: int, size: int = 64, seed: int = 0) -> list[str]:
+    """Upload ``count`` distinct PNG images and return their file names."""
+
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    names = []
+    for i in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="PNG")
+        name = f"design-{i}.png"
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/{name}", Body=buffer.getvalue())
+        names.append(name)
+    return names
+
+
+def synthetic_videos(s3: FakeS3, bucket: str, prefix: str, count: int, size: int = 256 * 1024, seed: int = 0) -> list[str]:
+    """Upload ``count`` distinct video files of ``size`` random bytes and return their names.
+
+    The fake embedding service only hashes the content, so the bytes need not
+    decode as video.
+    """
+
+    rng = np.random.default_rng(seed)
+    names = []
+    for i in range(count):
+        name = f"clip-{i}.mp4"
+        s3.put_object(Bucket=bucket, Key=f"{prefix}/{name}", Body=rng.bytes(size))
+        names.append(name)
+    return names
+
+
+class FakeEmbeddingModel:
+    """Stand-in for ``MultiModalEmbeddingModel`` that calls :class:`FakeVertex`."""
+
+    def __init__(self, vertex: FakeVertex, location: str = "benchmark"):
+        self.url = vertex.endpoint.format(location=location) + "/predict"
+        self.session = requests.Session()
+
+    def get_embeddings(self, image=None, video=None, video_segment_config=None, **kwargs):
+        media = image if image is not None else video
+        content = base64.b64encode(_media_bytes(media)).decode("ascii")
+        instance = {"image" if image is not None else "video": {"bytesBase64Encoded": content}}
+        response = self.session.post(self.url, json={"instances": [instance]}, timeout=30)
+        response.raise_for_status()
+        prediction = response.json()["predictions"][0]
+        if image is not None:
+            return types.SimpleNamespace(image_embedding=prediction["imageEmbedding"])
+        return types.SimpleNamespace(video_embeddings=[
+            types.SimpleNamespace(
+                start_offset_sec=segment["startOffsetSec"],
+                end_offset_sec=segment["endOffsetSec"],
+                embedding=segment["embedding"],
+            )
+            for segment in prediction["videoEmbeddings"]
+        ])
+
+
+def _media_bytes(media) -> bytes:
+    # The SDK's Image and Video keep the loaded file in a private attribute.
+    for attribute in ("_image_bytes", "_video_bytes", "data"):
+        data = getattr(media, attribute, None)
+        if data:
+            return data
+    return b""
+
+
+def ensure_vertex_sdk() -> None:
+    """Make ``vertexai.vision_models`` importable for the ingestion scripts.
+
+    The scripts import the SDK at module level but the benchmark replaces
+    the model with :class:`FakeEmbeddingModel`, so when the SDK is not
+    installed only the media loaders it needs are provided.
+    """
+
+    try:
+        import vertexai.vision_models  # noqa: F401
+        return
+    except ImportError:
+        pass
+
+    class _Media:
+        def __init__(self, data: bytes):
+            self.data = data
+
+        @classmethod
+        def load_from_file(cls, path: str):
+            with open(path, "rb") as f:
+                return cls(f.read())
+
+    vision_models = types.ModuleType("vertexai.vision_models")
+    vision_models.Image = type("Image", (_Media,), {})
+    vision_models.Video = type("Video", (_Media,), {})
+    vision_models.MultiModalEmbeddingModel = None
+    vertexai = types.ModuleType("vertexai")
+    vertexai.init = lambda **kwargs: None
+    vertexai.vision_models = vision_models
+    sys.modules["vertexai"] = vertexai
+    sys.modules["vertexai.vision_models"] = vision_models
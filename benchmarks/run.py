@@ -0,0 +1,347 @@
+"""End-to-end benchmarks against local service stand-ins.
+
+``search`` starts a fake Vertex AI endpoint and the API (see
+:mod:`benchmarks.server`) in a subprocess, then drives the search endpoints
+at fixed concurrency levels. ``ingest`` runs the image and video ingestion
+scripts over synthetic catalogs held in a fake S3 bucket, embedding through
+the fake Vertex AI endpoint and upserting into an in-memory index.
+
+Both report latency percentiles, throughput, errors and peak RSS. Results
+can be saved as a baseline and later runs compared against it:
+
+    python -m benchmarks.run search --concurrency 1 8 32 --save baseline.json
+    python -m benchmarks.run search --concurrency 1 8 32 --compare baseline.json
+
+A comparison exits with status 1 when p95 latency or throughput regressed
+by more than ``--tolerance``.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmarks import fakes
+
+SCENARIOS = ("text", "image", "fused", "video")
+MEDIA = ("image", "video")
+QUERY_WORDS = ("striped", "argyle", "wool", "ankle", "crew", "knee-high", "neon", "pastel", "holiday", "running")
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Return the ``q``-th percentile of ``values`` with linear interpolation."""
+
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    """Summarize request latencies (seconds) as milliseconds and throughput."""
+
+    return {
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def peak_rss_mb(pid: int) -> float | None:
+    """Return the summed peak RSS of ``pid`` and its descendants (Linux only)."""
+
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        total_kb += int(line.split()[1])
+            with open(f"/proc/{current}/task/{current}/children") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError, PermissionError):
+            if current == pid:
+                return None
+    return round(total_kb / 1024, 1)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def sample_image(seed: int = 0) -> bytes:
+    s3 = fakes.FakeS3()
+    fakes.synthetic_images(s3, "sample", "query", 1, size=256, seed=seed)
+    return next(iter(s3.objects.values()))
+
+
+def sample_video(seed: int = 0) -> bytes:
+    s3 = fakes.FakeS3()
+    fakes.synthetic_videos(s3, "sample", "query", 1, size=1024 * 1024, seed=seed)
+    return next(iter(s3.objects.values()))
+
+
+def make_request(scenario: str, rng: random.Random, image: bytes, video: bytes = b""):
+    """Return the path and ``requests`` keyword arguments for one search."""
+
+    query = " ".join(rng.sample(QUERY_WORDS, 3)) + f" socks {rng.randrange(10000)}"
+    if scenario == "text":
+        return "/api/search/text", {"json": {"query": query}}
+    if scenario == "video":
+        return "/api/search/video", {"files": {"file": ("query.mp4", video, "video/mp4")}}
+    files = {"file": ("query.png", image, "image/png")}
+    if scenario == "image":
+        return "/api/search/image", {"files": files}
+    return "/api/search/fused", {"data": {"query": query}, "files": files}
+
+
+def drive(base_url: str, scenario: str, concurrency: int, duration: float, image: bytes, video: bytes = b"",
+          seed: int = 0) -> dict:
+    """Send searches from ``concurrency`` clients for ``duration`` seconds."""
+
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(number: int):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + number)
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            path, kwargs = make_request(scenario, rng, image, video)
+            start = time.perf_counter()
+            try:
+                ok = session.post(base_url + path, timeout=60, **kwargs).status_code == 200
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(client, range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - start)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen, timeout: float = 300) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"API server exited with status {process.returncode}")
+        try:
+            if requests.get(base_url + "/api", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("API server did not start in time")
+
+
+def run_search(args) -> dict:
+    vertex = fakes.FakeVertex(args.vertex_latency_ms, args.vertex_jitter_ms, args.vertex_error_rate).start()
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = dict(os.environ)
+    if args.cache:
+        env.setdefault("EMBEDDING_CACHE_SLOTS", "8192")
+        env.setdefault("RESULT_CACHE_SLOTS", "2048")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.server", "--vertex-endpoint", vertex.endpoint, "--port", str(port),
+         "--workers", str(args.workers), "--images", str(args.images), "--videos", str(args.videos)],
+        env=env,
+    )
+    results = {}
+    try:
+        wait_until_ready(base_url, server)
+        image, video = sample_image(), sample_video()
+        for scenario in args.scenarios:
+            drive(base_url, scenario, 1, args.warmup, image, video)
+            for concurrency in args.concurrency:
+                summary = drive(base_url, scenario, concurrency, args.duration, image, video, seed=concurrency)
+                summary["peak_rss_mb"] = peak_rss_mb(server.pid)
+                results[f"search.{scenario}.c{concurrency}"] = summary
+                print(format_row(f"search.{scenario}.c{concurrency}", summary), flush=True)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        vertex.stop()
+    print(f"Fake Vertex AI: {vertex.requests} requests, {vertex.errors} injected errors")
+    return results
+
+
+def ingest_catalog(medium: str, count: int, vertex: fakes.FakeVertex, args) -> dict:
+    """Ingest a synthetic catalog of ``count`` images or videos and summarize the run."""
+
+    import image_embedding_processor
+    import video_embedding_processor
+
+    from api import dedupe, s3 as s3_transfers
+
+    s3_transfers.stats = s3_transfers.TransferStats()
+    s3 = fakes.FakeS3()
+    index = fakes.InMemoryIndex()
+    model = fakes.FakeEmbeddingModel(vertex)
+    if medium == "image":
+        names = fakes.synthetic_images(s3, "benchmark-bucket", "catalog", count, seed=count)
+        detector = dedupe.DuplicateDetector(index=index) if args.duplicates != "off" else None
+
+        def process(position):
+            return image_embedding_processor.process_image(
+                names[position], "benchmark-bucket", "catalog", model, index, count, position + 1, s3,
+                max_retries=1, detector=detector, duplicates=args.duplicates,
+            )
+    else:
+        # Videos are not checked for duplicates by the ingestion script.
+        names = fakes.synthetic_videos(s3, "benchmark-bucket", "catalog", count, seed=count)
+
+        def process(position):
+            return video_embedding_processor.process_video(
+                names[position], "benchmark-bucket", "catalog", model, index, "benchmark-bucket/catalog/",
+                position + 1, count, s3, max_retries=1,
+            )
+
+    latencies: list[float] = []
+    lock = threading.Lock()
+
+    def ingest(position):
+        start = time.perf_counter()
+        ok = process(position)
+        with lock:
+            if ok:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    # The script logs every object; keep the report readable.
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=args.workers) as executor:
+        list(executor.map(ingest, range(count)))
+    summary = summarize(latencies, count - len(latencies), time.perf_counter() - start)
+    summary["vectors"] = index.describe_index_stats()["total_vector_count"]
+    summary["s3"] = s3_transfers.stats.summary()
+    summary["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return summary
+
+
+def run_ingest(args) -> dict:
+    for name, value in {"DOTENV_PATH": os.devnull, "GOOGLE_CLOUD_PROJECT_LOCATION": "benchmark"}.items():
+        os.environ.setdefault(name, value)
+    fakes.ensure_vertex_sdk()
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+    vertex = fakes.FakeVertex(args.vertex_latency_ms, args.vertex_jitter_ms, args.vertex_error_rate).start()
+    results = {}
+    try:
+        for medium in args.media:
+            for count in args.catalog:
+                summary = ingest_catalog(medium, count, vertex, args)
+                results[f"ingest.{medium}.n{count}"] = summary
+                print(format_row(f"ingest.{medium}.n{count}", summary), flush=True)
+                print(f"  {summary['s3']}")
+    finally:
+        vertex.stop()
+    return results
+
+
+def format_row(name: str, summary: dict) -> str:
+    rss = summary.get("peak_rss_mb")
+    return (
+        f"{name:<24} {summary['requests']:>7} req {summary['errors']:>5} err {summary['rps']:>8.1f}/s"
+        f"  p50 {summary['p50_ms']:>8.1f}  p95 {summary['p95_ms']:>8.1f}  p99 {summary['p99_ms']:>8.1f} ms"
+        f"  rss {rss if rss is not None else '-':>7} MB"
+    )
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Return the regressions of ``results`` relative to ``baseline``."""
+
+    regressions = []
+    for name, summary in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if before["p95_ms"] and summary["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} -> {summary['p95_ms']} ms")
+        if before["rps"] and summary["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['rps']} -> {summary['rps']}/s")
+        if summary["errors"] > before["errors"]:
+            regressions.append(f"{name}: errors {before['errors']} -> {summary['errors']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark search and ingestion against local stand-ins.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--vertex-latency-ms", type=float, default=50,
+                        help="Latency added by the fake Vertex AI endpoint to every request.")
+    common.add_argument("--vertex-jitter-ms", type=float, default=20,
+                        help="Random extra latency of up to this many milliseconds.")
+    common.add_argument("--vertex-error-rate", type=float, default=0.0,
+                        help="Fraction of embedding requests that fail with HTTP 503.")
+    common.add_argument("--save", help="Write the results to this JSON file.")
+    common.add_argument("--compare", help="Compare the results with a baseline JSON file.")
+    common.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative change in p95 latency or throughput reported as a regression.")
+
+    search_parser = subparsers.add_parser("search", parents=[common], help="Load-test the search endpoints.")
+    search_parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    search_parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 8, 32])
+    search_parser.add_argument("--duration", type=float, default=10, help="Seconds per concurrency level.")
+    search_parser.add_argument("--warmup", type=float, default=2, help="Seconds of warm-up per scenario.")
+    search_parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes.")
+    search_parser.add_argument("--images", type=int, default=10000, help="Image vectors in the catalog.")
+    search_parser.add_argument("--videos", type=int, default=1000, help="Videos (4 segments each) in the catalog.")
+    search_parser.add_argument("--cache", action="store_true", help="Enable the shared embedding and result caches.")
+
+    ingest_parser = subparsers.add_parser("ingest", parents=[common], help="Benchmark image and video ingestion.")
+    ingest_parser.add_argument("--media", nargs="+", choices=MEDIA, default=list(MEDIA))
+    ingest_parser.add_argument("--catalog", nargs="+", type=int, default=[200],
+                               help="Synthetic catalog sizes to ingest.")
+    ingest_parser.add_argument("--workers", type=int, default=16, help="Concurrent ingestion threads.")
+    ingest_parser.add_argument("--duplicates", choices=["off", "skip", "link"], default="off",
+                               help="Duplicate handling for images.")
+
+    args = parser.parse_args(argv)
+    results = run_search(args) if args.command == "search" else run_ingest(args)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline.")
+
+
+if __name__ == "__main__":
+    main()
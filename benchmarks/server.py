@@ -0,0 +1,87 @@
+"""Run the API against local stand-ins for Vertex AI and Pinecone.
+
+The process environment is set up before ``api`` is imported: Pinecone is
+replaced by an :class:`~benchmarks.fakes.InMemoryIndex` holding a synthetic
+catalog, embedding requests go to ``VERTEX_API_ENDPOINT`` (normally a
+:class:`~benchmarks.fakes.FakeVertex`) and no Google credentials are needed.
+
+    python -m benchmarks.server --vertex-endpoint http://127.0.0.1:9000/{location} --images 20000
+
+Each uvicorn worker builds its own catalog from the same seed, so all
+workers serve identical results.
+"""
+
+import argparse
+import os
+import sys
+import types
+
+BENCHMARK_ENV = {
+    "ENVIRONMENT": "benchmark",
+    "DOTENV_PATH": os.devnull,
+    "PINECONE_API_KEY": "benchmark",
+    "PINECONE_INDEX_NAME": "benchmark",
+    "PINECONE_TOP_K": "20",
+    "GOOGLE_CLOUD_PROJECT_ID": "benchmark",
+    "GOOGLE_CLOUD_PROJECT_LOCATION": "benchmark",
+    "S3_BUCKET_NAME": "benchmark-bucket",
+    # Measure the full request path unless the caches are enabled explicitly.
+    "EMBEDDING_CACHE_SLOTS": "0",
+    "RESULT_CACHE_SLOTS": "0",
+}
+
+
+def create_app():
+    """Build the FastAPI app wired to the stand-ins (a uvicorn app factory)."""
+
+    for name, value in BENCHMARK_ENV.items():
+        os.environ.setdefault(name, value)
+
+    from benchmarks import fakes
+
+    index = fakes.InMemoryIndex()
+    fakes.synthetic_catalog(
+        index,
+        images=int(os.getenv("BENCHMARK_IMAGES", "10000")),
+        videos=int(os.getenv("BENCHMARK_VIDEOS", "0")),
+        seed=int(os.getenv("BENCHMARK_SEED", "0")),
+    )
+    deps = types.ModuleType("api.deps")
+    deps.index = index
+    sys.modules["api.deps"] = deps
+
+    from api.config import settings
+
+    settings.get_access_token = lambda: "benchmark"
+
+    from api.index import app
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API against local service stand-ins.")
+    parser.add_argument("--vertex-endpoint", required=True,
+                        help="Base URL of the fake Vertex AI API, with a {location} placeholder.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--images", type=int, default=10000, help="Image vectors in the synthetic catalog.")
+    parser.add_argument("--videos", type=int, default=0, help="Videos (4 segments each) in the synthetic catalog.")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(
+        VERTEX_API_ENDPOINT=args.vertex_endpoint,
+        BENCHMARK_IMAGES=str(args.images),
+        BENCHMARK_VIDEOS=str(args.videos),
+        BENCHMARK_SEED=str(args.seed),
+    )
+
+    import uvicorn
+
+    uvicorn.run("benchmarks.server:create_app", factory=True, host="127.0.0.1", port=args.port,
+                workers=args.workers, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
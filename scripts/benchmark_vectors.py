@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""Compare the memory use and accuracy of compact vector representations.
+
+For every dtype in ``api.vectors.DTYPES`` the script reports the bytes per
+vector, the cosine similarity between each vector and its decoded form, and
+the recall of the top-k nearest neighbors against full precision ``float32``
+vectors, using a sample of the corpus as queries. Vectors come from an index
+snapshot written by ``scripts/export_index.py`` or, without one, from a
+synthetic clustered corpus of 1408-dim vectors.
+
+Usage:
+    python -m scripts.benchmark_vectors [-s /path/to/snapshot] [--rows 20000] [--queries 200] [-k 10]
+"""
+
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+from api import neighbors, snapshot, vectors
+from api.config import settings
+
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+DIMENSION = 1408
+
+
+def synthetic_corpus(rows: int, dimension: int = DIMENSION, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    """Return ``rows`` vectors scattered around random cluster centres.
+
+    Real catalogs hold many near-duplicates (video segments, product
+    variants), which is where quantization error changes rankings most.
+    """
+
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dimension)).astype(np.float32)
+    members = rng.integers(0, clusters, rows)
+    noise = rng.standard_normal((rows, dimension)).astype(np.float32) * 0.5
+    return centres[members] + noise
+
+
+def python_list_bytes(vector: list[float]) -> int:
+    """Size of a vector held as a Python list, as returned by the API."""
+
+    return sys.getsizeof(vector) + sum(sys.getsizeof(value) for value in vector)
+
+
+def benchmark(corpus: np.ndarray, queries: int, k: int) -> list[dict]:
+    corpus = neighbors.normalize(corpus)
+    rng = np.random.default_rng(1)
+    query_rows = rng.choice(len(corpus), size=min(queries, len(corpus)), replace=False)
+    query_vectors = corpus[query_rows]
+    k = min(k, len(corpus) - 1)
+
+    expected, _ = neighbors.top_neighbors(query_vectors, corpus, k)
+    expected_sets = [set(row) for row in expected]
+
+    results = []
+    for dtype in vectors.DTYPES:
+        start = time.perf_counter()
+        codes, scales = vectors.quantize(corpus, dtype)
+        encode_sec = time.perf_counter() - start
+
+        decoded = vectors.dequantize(codes, scales)
+        fidelity = np.sum(corpus * neighbors.normalize(decoded), axis=1)
+
+        start = time.perf_counter()
+        hits = 0
+        for query, expected_row in zip(query_vectors, expected_sets):
+            row_scores = vectors.scores(query, codes, scales)
+            top = np.argpartition(-row_scores, k - 1)[:k]
+            hits += len(expected_row.intersection(top))
+        search_sec = time.perf_counter() - start
+
+        stored = codes.nbytes + (scales.nbytes if scales is not None else 0)
+        results.append(
+            {
+                "dtype": dtype,
+                "bytes_per_vector": stored / len(corpus),
+                "mean_cosine": float(fidelity.mean()),
+                "min_cosine": float(fidelity.min()),
+                "recall": hits / (len(expected_sets) * k),
+                "encode_ms": encode_sec * 1000,
+                "search_ms_per_query": search_sec * 1000 / len(expected_sets),
+            }
+        )
+    return results
+
+
+def main(snapshot_path: str | None, rows: int, queries: int, k: int) -> None:
+    if snapshot_path:
+        logging.info("Loading snapshot from %s…", snapshot_path)
+        _, corpus, _ = snapshot.Snapshot(snapshot_path).load(with_metadata=False)
+        corpus = corpus[:rows]
+    else:
+        logging.info("Generating %d synthetic %d-dim vectors…", rows, DIMENSION)
+        corpus = synthetic_corpus(rows)
+    if len(corpus) < 2:
+        logging.error("Need at least two vectors to benchmark")
+        return
+
+    list_bytes = python_list_bytes(corpus[0].tolist())
+    logging.info("%d vectors, %d dims; a Python list of floats takes %d bytes per vector", len(corpus), corpus.shape[1], list_bytes)
+
+    print(f"{'dtype':<8} {'bytes/vec':>10} {'vs list':>8} {'mean cos':>9} {'min cos':>9} {f'recall@{k}':>10} {'encode ms':>10} {'ms/query':>9}")
+    for result in benchmark(corpus, queries, k):
+        print(
+            f"{result['dtype']:<8} {result['bytes_per_vector']:>10.0f} {list_bytes / result['bytes_per_vector']:>7.1f}x "
+            f"{result['mean_cosine']:>9.6f} {result['min_cosine']:>9.6f} {result['recall']:>10.4f} "
+            f"{result['encode_ms']:>10.1f} {result['search_ms_per_query']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory use and accuracy of compact vector dtypes.")
+    parser.add_argument("-s", "--snapshot", type=str, default=settings.snapshot_path,
+                        help="Snapshot directory written by export_index.py (defaults to SNAPSHOT_PATH; synthetic vectors if unset).")
+    parser.add_argument("--rows", type=int, default=20000,
+                        help="Maximum number of vectors to use.")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Number of corpus vectors used as queries.")
+    parser.add_argument("-k", type=int, default=10,
+                        help="Neighbors compared per query.")
+    args = parser.parse_args()
+    main(args.snapshot, args.rows, args.queries, args.k)
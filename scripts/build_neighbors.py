@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Precompute item-to-item neighbor lists for every vector in an index snapshot.
+
+The snapshot is produced by ``scripts/export_index.py``. The resulting table
+is memory-mapped by the API and served from ``/api/items/{id}/similar``
+without querying Pinecone. Run with ``--incremental`` after an incremental
+export to add the vectors that are not yet in the table, drop deleted ones
+and recompute those whose vector or metadata changed.
+
+Usage:
+    python -m scripts.build_neighbors -s /path/to/snapshot -o /path/to/neighbors [-n 50] [--incremental]
+"""
+
+import argparse
+import logging
+import os
+
+import numpy as np
+
+from api import neighbors, snapshot
+from api.config import settings
+
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+
+def load_existing(path: str):
+    """Return the arrays of a previously built table, or ``None``."""
+    if not os.path.exists(os.path.join(path, neighbors.MANIFEST)):
+        return None
+    table = neighbors.NeighborTable(path)
+    vectors = np.load(os.path.join(table.directory, "vectors.npy"))
+    return (
+        table.ids,
+        vectors,
+        np.asarray(table.neighbors),
+        np.asarray(table.scores),
+        table.metadata,
+    )
+
+
+def main(snapshot_path: str, output: str, top_n: int, batch_size: int, incremental: bool) -> None:
+    logging.info("Loading snapshot from %s…", snapshot_path)
+    snapshot_ids, snapshot_vectors, snapshot_metadata = snapshot.Snapshot(snapshot_path).load()
+    logging.info("%d vectors in snapshot", len(snapshot_ids))
+
+    existing = load_existing(output) if incremental else None
+    if existing and existing[2].shape[1] != min(top_n, len(existing[0]) - 1):
+        logging.warning("Table keeps %d neighbors per item but %d were requested; rebuilding it",
+                        existing[2].shape[1], top_n)
+        existing = None
+
+    removed = []
+    if existing:
+        ids, vectors, table_neighbors, table_scores, metadata = existing
+        # Snapshot.load skips tombstoned ids, so table rows missing from it were deleted.
+        removed, new_rows = neighbors.diff_snapshot(
+            ids, vectors, metadata, snapshot_ids, snapshot_vectors, snapshot_metadata
+        )
+        live = set(snapshot_ids)
+        deleted = sum(vid not in live for vid in ids)
+        changed = len(removed) - deleted
+        logging.info("%d vectors already in table, %d new, %d deleted, %d changed",
+                     len(ids), len(new_rows) - changed, deleted, changed)
+    else:
+        ids, vectors, table_neighbors, table_scores, metadata = [], None, None, None, []
+        new_rows = list(range(len(snapshot_ids)))
+
+    if not new_rows and not removed:
+        logging.info("Neighbor table is up to date")
+        return
+
+    if removed:
+        logging.info("Removing %d deleted or changed vectors…", len(removed))
+        vectors, table_neighbors, table_scores = neighbors.remove_rows(
+            vectors, table_neighbors, table_scores, removed, top_n, batch_size
+        )
+        removed_rows = set(removed)
+        ids = [vid for row, vid in enumerate(ids) if row not in removed_rows]
+        metadata = [meta for row, meta in enumerate(metadata) if row not in removed_rows]
+
+    new_ids = [snapshot_ids[row] for row in new_rows]
+    new_vectors = neighbors.normalize(snapshot_vectors[new_rows])
+    new_metadata = [snapshot_metadata[row] for row in new_rows]
+
+    if vectors is None:
+        logging.info("Building table for %d vectors (top %d)…", len(new_ids), top_n)
+        vectors = new_vectors
+        table_neighbors, table_scores = neighbors.build_table(vectors, top_n, batch_size)
+    elif new_rows:
+        logging.info("Extending table with %d vectors…", len(new_ids))
+        vectors, table_neighbors, table_scores = neighbors.extend_table(
+            vectors, table_neighbors, table_scores, new_vectors, top_n, batch_size
+        )
+
+    neighbors.save_table(
+        output,
+        list(ids) + new_ids,
+        vectors,
+        table_neighbors,
+        table_scores,
+        list(metadata) + new_metadata,
+    )
+    logging.info("Wrote neighbor table with %d rows to %s", len(vectors), output)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute nearest-neighbor lists for every vector in an index snapshot.")
+    parser.add_argument("-s", "--snapshot", type=str, default=settings.snapshot_path,
+                        help="Snapshot directory written by export_index.py (defaults to SNAPSHOT_PATH).")
+    parser.add_argument("-o", "--output", type=str, default=settings.neighbors_path,
+                        help="Directory for the neighbor table (defaults to NEIGHBORS_PATH).")
+    parser.add_argument("-n", "--top-n", type=int, default=50,
+                        help="Number of neighbors to keep per item.")
+    parser.add_argument("--batch-size", type=int, default=1024,
+                        help="Rows per matrix multiplication batch.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only add, remove and recompute the vectors that differ from an existing table.")
+    args = parser.parse_args()
+    if not args.snapshot:
+        parser.error("--snapshot is required when SNAPSHOT_PATH is not set")
+    if not args.output:
+        parser.error("--output is required when NEIGHBORS_PATH is not set")
+    main(args.snapshot, args.output, args.top_n, args.batch_size, args.incremental)
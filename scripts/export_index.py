@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""Export all vectors and metadata from the Pinecone index to a local snapshot.
+
+Id pages returned by ``index.list()`` are fetched in parallel and written to a
+chunked, memory-mappable layout (see ``api/snapshot.py``). With
+``--incremental`` only vectors that are new or whose values or metadata
+changed since the last export are written; the earlier row of a changed id is
+superseded, and ids that disappeared from a namespace are dropped from it.
+Rows are tracked per namespace and id.
+
+Usage:
+    python -m scripts.export_index -o /path/to/snapshot [--dtype float16] [--incremental]
+"""
+
+import argparse
+import logging
+import os
+import random
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import List
+
+from pinecone import Pinecone
+
+from api import snapshot
+from api.config import settings
+
+
+logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+
+BASE_DELAY_SEC = 0.5
+MAX_DELAY_SEC = 10.0
+
+
+def get_index(index_name: str) -> "Index":
+    """Initialize Pinecone index using environment variables."""
+    api_key = os.getenv("PINECONE_API_KEY")
+    if not api_key:
+        raise EnvironmentError("Missing required environment variables: PINECONE_API_KEY")
+
+    pc = Pinecone(api_key=api_key, source_tag="pinecone:stl_sample_app")
+    return pc.Index(index_name)
+
+
+def chunked(iterable: List[str], size: int) -> List[List[str]]:
+    for i in range(0, len(iterable), size):
+        yield iterable[i : i + size]
+
+
+def fetch_page(index, id_batch: List[str], namespace: str = "", max_retries: int = 3) -> dict:
+    """Fetch one page of vectors, retrying transient failures with jittered backoff."""
+    for attempt in range(max_retries):
+        try:
+            return index.fetch(ids=id_batch, namespace=namespace).get("vectors", {})
+        except Exception as exc:
+            if attempt == max_retries - 1:
+                raise
+            delay = random.uniform(0, min(MAX_DELAY_SEC, BASE_DELAY_SEC * 2**attempt))
+            logging.warning("Fetch failed (%s); retrying in %.1f s", exc, delay)
+            time.sleep(delay)
+
+
+def main(output: str, index_name: str, namespaces: List[str], dtype: str, chunk_rows: int, workers: int, incremental: bool) -> None:
+    index = get_index(index_name)
+
+    if not incremental and snapshot.load_manifest(output):
+        # Only remove files that belong to the previous snapshot.
+        for name in os.listdir(output):
+            if name.startswith("chunk-") or name == snapshot.MANIFEST:
+                os.remove(os.path.join(output, name))
+
+    known = {}
+    if incremental and snapshot.load_manifest(output):
+        # Keyed by namespace and id: the same id may exist in several namespaces.
+        known = snapshot.Snapshot(output).digests()
+        logging.info("%d vectors already exported", len(known))
+
+    writer = snapshot.SnapshotWriter(output, dtype=dtype, chunk_rows=chunk_rows)
+    listed = set()
+    exported = unchanged = 0
+
+    def write(namespace: str, vectors: dict) -> None:
+        nonlocal exported, unchanged
+        for vid, record in vectors.items():
+            metadata = dict(record.get("metadata") or {})
+            if namespace:
+                metadata["namespace"] = namespace
+            values = record.get("values")
+            if known.get((namespace, vid)) == snapshot.row_digest(values, metadata):
+                unchanged += 1
+                continue
+            writer.add(vid, values, metadata)
+            exported += 1
+
+    def drain(pending: dict, return_when: str) -> None:
+        done, _ = wait(pending, return_when=return_when)
+        for future in done:
+            write(pending.pop(future), future.result())
+        logging.info("Exported %d vectors, %d unchanged", exported, unchanged)
+
+    # Pages are fetched while listing continues, with at most two pages per
+    # worker in flight, so the export streams instead of holding the index.
+    # Incremental exports fetch every page too: ids do not change when a
+    # vector is re-upserted, so changes are only visible in the values.
+    logging.info("Listing and exporting vectors…")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        for namespace in namespaces:
+            for batch in index.list(namespace=namespace):
+                listed.update((namespace, vid) for vid in batch)
+                for id_batch in chunked(batch, 100):
+                    pending[executor.submit(fetch_page, index, id_batch, namespace)] = namespace
+                    if len(pending) >= 2 * workers:
+                        drain(pending, FIRST_COMPLETED)
+        if pending:
+            drain(pending, ALL_COMPLETED)
+
+    removed = sorted(set(known) - listed)
+    logging.info("%d vectors in index, %d exported, %d unchanged, %d deleted",
+                 len(listed), exported, unchanged, len(removed))
+
+    manifest = writer.close(removed=removed)
+    logging.info("Snapshot at %s has %d rows in %d chunks", output, manifest["rows"], len(manifest["chunks"]))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export Pinecone vectors and metadata to a local snapshot.")
+    parser.add_argument("-o", "--output", type=str, default=settings.snapshot_path,
+                        help="Snapshot directory (defaults to SNAPSHOT_PATH).")
+    parser.add_argument("-i", "--index", type=str, default=settings.index_name,
+                        help="Pinecone index name (defaults to PINECONE_INDEX_NAME).")
+    parser.add_argument("-n", "--namespace", dest="namespaces", action="append",
+                        help="Namespace to export; repeat for several (defaults to all configured namespaces).")
+    parser.add_argument("--dtype", choices=snapshot.DTYPES,
+                        help="Storage type for vectors (default float32; incremental exports keep the snapshot's).")
+    parser.add_argument("--chunk-rows", type=int, default=10000,
+                        help="Vectors per chunk file.")
+    parser.add_argument("--workers", type=int, default=8,
+                        help="Parallel fetch requests.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only export vectors that are new or changed since the last export.")
+    args = parser.parse_args()
+    if not args.output:
+        parser.error("--output is required when SNAPSHOT_PATH is not set")
+    namespaces = args.namespaces or sorted({ns for names in settings.namespaces.values() for ns in names})
+    main(args.output, args.index, namespaces, args.dtype, args.chunk_rows, args.workers, args.incremental)
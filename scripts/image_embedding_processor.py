@@ -15,6 +15,7 @@ Required Python packages:
 - boto3
 - pinecone-client
  - python-dotenv        # to load .env.<ENVIRONMENT> (or DOTENV_PATH) into os.environ
+- numpy, Pillow        # near-duplicate detection (``--duplicates``)
 
 Usage:
 1. Set up environment variables in `.env.<ENVIRONMENT>` (defaults to `.env.development`) or set ``DOTENV_PATH``.
@@ -23,10 +24,10 @@ Usage:
 """
 
 import os
+import sys
 import json
 import base64
 import time
-import uuid
 import tempfile
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -40,6 +41,10 @@ import boto3                                         # AWS S3 client
 
 from pinecone import Pinecone                         # New Pinecone constructor (v3.x+) :contentReference[oaicite:6]{index=6}
 
+# Allow running from this folder as well as ``python -m scripts.<name>`` from the repo root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api import dedupe, ingest_worker, s3             # Near-duplicate detection, event worker, pooled S3
+
 # Constants
 # Load environment variables using the same logic as ``api.config``. ``DOTENV_PATH``
 # overrides the automatically derived ``../.env.<ENVIRONMENT>`` file.
@@ -51,6 +56,8 @@ load_dotenv(dotenv_path=dotenv_path, override=True)
 
 REGION = os.getenv("GOOGLE_CLOUD_PROJECT_LOCATION", "us-east1")  # e.g., "us-east1" :contentReference[oaicite:8]{index=8}
 FILE_TYPE = 'image'
+IMAGE_EXTENSIONS = (".jpeg", ".jpg", ".png", ".bmp", ".gif")
+WORKERS = 16
 
 
 def initialize_vertex_ai():
@@ -84,56 +91,116 @@ def initialize_pinecone(index_name):
     return pc.Index(index_name)  # get reference to existing index 
 
 
-def download_from_s3(bucket, key, client, max_retries=3):
-    wait = 1
-    for attempt in range(max_retries):
-        try:
-            resp = client.get_object(Bucket=bucket, Key=key)
-            return resp["Body"].read()
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(wait)
-                wait *= 2
-            else:
-                raise e
+def make_s3_client(workers):
+    """Return an S3 client with a connection for every thread that uses it."""
+    return s3.make_client(os.getenv("AWS_REGION"), max_pool_connections=workers + s3.PART_WORKERS)
+
+
+def namespace_for(partition, collection=None):
+    """Return the namespace to upsert into.
+
+    Partitioned indexes keep each modality (and optionally each collection)
+    in its own namespace, e.g. ``image`` or ``image-spring24``.
+    """
+    if not partition:
+        return ""
+    return f"{FILE_TYPE}-{collection}" if collection else FILE_TYPE
 
 
-def process_image(image_file, bucket_name, prefix, model, index, total_images, image_index, s3_client, max_retries=5):
-    """Download an image from S3, embed via Vertex AI, and upsert to Pinecone."""
+def image_hash(image_bytes):
+    """Return the perceptual hash of an image, or None if Pillow cannot read it."""
+    try:
+        return dedupe.dhash(image_bytes)
+    except Exception:
+        return None
+
+
+def handle_duplicate(mode, index, original_id, s3_key, namespace, reason):
+    """Skip a duplicate, or link it to the original's metadata in ``link`` mode."""
+    if mode == "link":
+        dedupe.link_duplicate(index, original_id, s3_key, namespace)
+        print(f"Linked duplicate {s3_key} to {original_id} ({reason})")
+    else:
+        print(f"Skipped duplicate {s3_key} of {original_id} ({reason})")
+
+
+def process_image(image_file, bucket_name, prefix, model, index, total_images, image_index, s3_client, max_retries=5, namespace="", detector=None, duplicates="skip"):
+    """Download an image from S3, embed via Vertex AI, and upsert to Pinecone.
+
+    With a ``detector``, near-duplicates of already ingested images are not
+    upserted: a perceptual hash match skips the Vertex AI call entirely, and
+    an embedding above the cosine threshold skips the upsert. Returns whether
+    the image was ingested (or recognized as a duplicate).
+    """
     s3_key = f"{prefix}/{image_file}"
+    # Derived from the object, so a redelivered event overwrites instead of duplicating.
+    embedding_id = ingest_worker.vector_id(bucket_name, s3_key)
+
+    # Downloads are retried inside s3, so the loop below only retries embedding and upserting.
+    try:
+        image_bytes = s3.download(s3_client, bucket_name, s3_key)
+    except Exception as e:
+        print(f"Failed to download {image_file}: {e}")
+        return False
+
     attempt = 0
     while attempt < max_retries:
         try:
-            image_bytes = download_from_s3(bucket_name, s3_key, s3_client)
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(image_bytes)
-                tmp.flush()
-                image = Image.load_from_file(tmp.name)
+            phash = image_hash(image_bytes) if detector else None
+            if phash is not None:
+                original_id = detector.reserve_hash(embedding_id, phash)
+                if original_id:
+                    handle_duplicate(duplicates, index, original_id, s3_key, namespace, "perceptual hash")
+                    return True
+
+            # Removed with its contents afterwards; workers would otherwise fill the disk.
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "image")
+                with open(path, "wb") as f:
+                    f.write(image_bytes)
+                image = Image.load_from_file(path)
 
             embeddings = model.get_embeddings(image=image)  # generate embedding :contentReference[oaicite:23]{index=23}
 
             print(f"Received embeddings for: {image_file} ({image_index}/{total_images})")
 
-            date_added = datetime.now().isoformat()
-            embedding_id = str(uuid.uuid4())
+            if detector:
+                # Checks and reserves in one step, so a concurrent near-duplicate is not upserted too.
+                duplicate = detector.reserve_vector(embedding_id, embeddings.image_embedding, phash)
+                if duplicate:
+                    original_id, score = duplicate
+                    handle_duplicate(duplicates, index, original_id, s3_key, namespace, f"cosine {score:.3f}")
+                    return True
+
+            now = datetime.now()
 
             vector = [
                 {
                     'id': embedding_id,
                     'values': embeddings.image_embedding,
                     'metadata': {
-                        'date_added': date_added,
+                        'date_added': now.isoformat(),
+                        'date_added_ts': now.timestamp(),
                         'file_type': FILE_TYPE,
                         's3_file_path': f"{bucket_name}/{prefix}/",
                         's3_file_name': image_file,
                     }
                 }
             ]
-            index.upsert(vector)  # upsert to Pinecone 
+            if phash is not None:
+                vector[0]['metadata']['dhash'] = f"{phash:016x}"
+            index.upsert(vector, namespace=namespace)  # upsert to Pinecone
+            if detector:
+                # In worker mode the batch is upserted later; confirm only once it is stored.
+                ingest_worker.after_upsert(
+                    index, lambda: detector.confirm(embedding_id), lambda: detector.release(embedding_id)
+                )
             print(f"Processed and upserted: {image_file} ({image_index}/{total_images})")
-            break
+            return True
         except Exception as e:
             print(f"Error processing file {image_file}: {e}")
+            if detector:
+                detector.release(embedding_id)
             attempt += 1
             if attempt < max_retries:
                 wait_time = 5 ** attempt
@@ -141,9 +208,10 @@ def process_image(image_file, bucket_name, prefix, model, index, total_images, i
                 time.sleep(wait_time)
             else:
                 print(f"Failed to process file {image_file} after {max_retries} attempts.")
+    return False
 
 
-def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
+def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name, namespace="", duplicates="off", threshold=0.97, hash_distance=2, workers=WORKERS):
     # 1) Initialize Vertex AI with service-account credentials :contentReference[oaicite:25]{index=25}
     initialize_vertex_ai()
 
@@ -154,12 +222,11 @@ def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
     model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding@001")
 
     # 4) List image files from S3
-    s3_client = boto3.client("s3", region_name=os.getenv("AWS_REGION"))
-    resp = s3_client.list_objects_v2(Bucket=s3_bucket_name, Prefix=s3_folder_name)
+    s3_client = make_s3_client(workers)
     image_files = [
-        obj["Key"].replace(f"{s3_folder_name}/", "")
-        for obj in resp.get("Contents", [])
-        if obj["Key"].lower().endswith((".jpeg", ".jpg", ".png", ".bmp", ".gif"))
+        key.replace(f"{s3_folder_name}/", "")
+        for key in s3.list_keys(s3_client, s3_bucket_name, s3_folder_name)
+        if key.lower().endswith(IMAGE_EXTENSIONS)
     ]
 
     total_images = len(image_files)
@@ -167,8 +234,12 @@ def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
         print(f"No images found in s3://{s3_bucket_name}/{s3_folder_name}/")
         return
 
+    detector = None
+    if duplicates != "off":
+        detector = dedupe.DuplicateDetector(threshold=threshold, hash_distance=hash_distance, index=index, namespace=namespace)
+
     # 5) Process images in parallel using threading 
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         futures = []
         for i, image_file in enumerate(image_files):
             futures.append(executor.submit(
@@ -181,10 +252,53 @@ def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
                 total_images,
                 i + 1,
                 s3_client,
+                namespace=namespace,
+                detector=detector,
+                duplicates=duplicates,
             ))
         for future in as_completed(futures):
             future.result()
 
+    print(s3.stats.summary())
+    if detector:
+        print(f"Duplicates found: {detector.hash_duplicates} by perceptual hash (not embedded), "
+              f"{detector.vector_duplicates} by embedding similarity")
+
+
+def run_worker(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name, namespace="", duplicates="off",
+               threshold=0.97, hash_distance=2, queue_url=None, queue_dir=None, batch_size=16, batch_wait=2.0,
+               workers=WORKERS):
+    """Ingest images as object-created events arrive instead of listing the folder."""
+    initialize_vertex_ai()
+    index = initialize_pinecone(pinecone_index_name)
+    model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding@001")
+    s3_client = make_s3_client(workers)
+
+    if queue_url:
+        queue = ingest_worker.SqsQueue(queue_url, boto3.client("sqs", region_name=os.getenv("AWS_REGION")))
+    else:
+        queue = ingest_worker.DirectoryQueue(queue_dir)
+
+    detector = None
+    if duplicates != "off":
+        detector = dedupe.DuplicateDetector(threshold=threshold, hash_distance=hash_distance, index=index, namespace=namespace)
+
+    def accept(event):
+        return (
+            event.bucket == s3_bucket_name
+            and event.key.startswith(f"{s3_folder_name}/")
+            and event.key.lower().endswith(IMAGE_EXTENSIONS)
+        )
+
+    def process(event, batch_index):
+        # A single attempt: failed messages are redelivered by the queue.
+        return process_image(event.name, event.bucket, event.prefix, model, batch_index, 1, 1, s3_client,
+                             max_retries=1, namespace=namespace, detector=detector, duplicates=duplicates)
+
+    print(f"Waiting for new images in s3://{s3_bucket_name}/{s3_folder_name}/…")
+    ingest_worker.run_worker(queue, process, index, accept, batch_size=batch_size, max_wait_sec=batch_wait,
+                             workers=workers, report=lambda: print(s3.stats.summary()))
+
 
 if __name__ == '__main__':
     import argparse
@@ -200,6 +314,34 @@ if __name__ == '__main__':
                         help='S3 folder containing images.')
     parser.add_argument('-i', '--index', type=str, required=True,
                         help='Pinecone index name.')
+    parser.add_argument('--partition', action='store_true',
+                        help='Upsert into the "image" namespace instead of the default namespace.')
+    parser.add_argument('-c', '--collection', type=str,
+                        help='Collection name appended to the namespace (requires --partition).')
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help='Images downloaded and embedded concurrently.')
+    parser.add_argument('--duplicates', choices=['off', 'skip', 'link'], default='off',
+                        help='Skip near-duplicate images, or link them to the original in its "duplicate_files" metadata.')
+    parser.add_argument('--duplicate-threshold', type=float, default=0.97,
+                        help='Cosine similarity at or above which an image is a duplicate.')
+    parser.add_argument('--hash-distance', type=int, default=2,
+                        help='Max differing bits of the perceptual hash for the pre-check (-1 disables it).')
+    worker = parser.add_mutually_exclusive_group()
+    worker.add_argument('--queue-url', type=str,
+                        help='Run as a worker that ingests images from S3 object-created notifications in this SQS queue.')
+    worker.add_argument('--queue-dir', type=str,
+                        help='Run as a worker reading notifications from JSON files in this directory (for local testing).')
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help='Worker mode: objects embedded and upserted together.')
+    parser.add_argument('--batch-wait', type=float, default=2.0,
+                        help='Worker mode: seconds to wait for a batch to fill after the first event.')
     args = parser.parse_args()
-    main(args.project, args.bucket, args.folder, args.index)
+    namespace = namespace_for(args.partition, args.collection)
+    if args.queue_url or args.queue_dir:
+        run_worker(args.project, args.bucket, args.folder, args.index, namespace, args.duplicates,
+                   args.duplicate_threshold, args.hash_distance, args.queue_url, args.queue_dir,
+                   args.batch_size, args.batch_wait, args.workers)
+    else:
+        main(args.project, args.bucket, args.folder, args.index, namespace,
+             args.duplicates, args.duplicate_threshold, args.hash_distance, args.workers)
 
@@ -25,7 +25,8 @@ python video_embedding_processor.py -p your-gc-project-id -b your-s3-bucket-name
 import argparse
 import base64
 import os
-import uuid
+import sys
+import tempfile
 import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
@@ -35,10 +36,15 @@ from vertexai.vision_models import MultiModalEmbeddingModel, Video
 import boto3
 from pinecone import Pinecone
 
+# Allow running from this folder as well as ``python -m scripts.<name>`` from the repo root.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from api import ingest_worker, s3
+
 # Constants
 REGION = 'us-central1'
 FILE_TYPE = 'video'
 MAX_RETRIES = 5
+WORKERS = 8
 SUPPORTED_VIDEO_FORMATS = ('mov', 'mp4', 'avi', 'flv', 'mkv', 'mpeg', 'mpg', 'webm', 'wmv')
 
 # Video embedding settings
@@ -64,31 +70,47 @@ def setup_google_credentials():
     else:
         print("Warning: GOOGLE_CREDENTIALS_BASE64 environment variable not set.")
 
-def download_video_from_s3(bucket, key, client, max_retries=3):
-    wait = 1
-    for attempt in range(max_retries):
-        try:
-            resp = client.get_object(Bucket=bucket, Key=key)
-            return resp["Body"].read()
-        except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(wait)
-                wait *= 2
-            else:
-                raise e
+def make_s3_client(workers):
+    """Return an S3 client with a connection for every download thread.
 
+    Large videos are fetched as parallel ranged GETs, which use the extra
+    ``s3.PART_WORKERS`` connections.
+    """
+    return s3.make_client(os.getenv("AWS_REGION"), max_pool_connections=workers + s3.PART_WORKERS)
 
-def process_video(video_file, bucket_name, prefix, model, index, file_path, video_index, total_videos, s3_client):
-    """Process a single video file, generate embeddings, and upsert to Pinecone."""
+
+def namespace_for(partition, collection=None):
+    """Return the namespace to upsert into.
+
+    Partitioned indexes keep each modality (and optionally each collection)
+    in its own namespace, e.g. ``video`` or ``video-spring24``.
+    """
+    if not partition:
+        return ""
+    return f"{FILE_TYPE}-{collection}" if collection else FILE_TYPE
+
+
+def process_video(video_file, bucket_name, prefix, model, index, file_path, video_index, total_videos, s3_client, namespace="", max_retries=MAX_RETRIES):
+    """Process a single video file, generate embeddings, and upsert to Pinecone.
+
+    Returns whether the video was ingested.
+    """
     s3_key = f"{prefix}/{video_file}"
 
-    for attempt in range(MAX_RETRIES):
+    # Downloads are retried inside s3, so the loop below only retries embedding and upserting.
+    try:
+        # Removed with its contents afterwards; workers would otherwise fill the disk.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "video")
+            with open(path, "wb") as f:
+                s3.download_to_file(s3_client, bucket_name, s3_key, f)
+            video = Video.load_from_file(path)
+    except Exception as e:
+        print(f"Failed to download {video_file}: {e}")
+        return False
+
+    for attempt in range(max_retries):
         try:
-            video_bytes = download_video_from_s3(bucket_name, s3_key, s3_client)
-            with tempfile.NamedTemporaryFile(delete=False) as tmp:
-                tmp.write(video_bytes)
-                tmp.flush()
-                video = Video.load_from_file(tmp.name)
             video_segment_config = VideoSegmentConfig(
                 interval_sec=INTERVAL_SEC,
                 start_offset_sec=START_OFFSET_SEC,
@@ -102,36 +124,41 @@ def process_video(video_file, bucket_name, prefix, model, index, file_path, vide
 
             print(f"Received embeddings for: {video_file} ({video_index}/{total_videos})")
 
+            now = datetime.now()
             for video_embedding in embeddings.video_embeddings:
+                segment = video_embedding.start_offset_sec // INTERVAL_SEC
                 vector = [{
-                    'id': str(uuid.uuid4()),
+                    # Derived from the object, so a redelivered event overwrites instead of duplicating.
+                    'id': ingest_worker.vector_id(bucket_name, s3_key, segment),
                     'values': video_embedding.embedding,
                     'metadata': {
-                        'date_added': datetime.now().isoformat(),
+                        'date_added': now.isoformat(),
+                        'date_added_ts': now.timestamp(),
                         'file_type': FILE_TYPE,
                         's3_file_path': file_path,
                         's3_file_name': video_file,
-                        'segment': video_embedding.start_offset_sec // INTERVAL_SEC,
+                        'segment': segment,
                         'start_offset_sec': video_embedding.start_offset_sec,
                         'end_offset_sec': video_embedding.end_offset_sec,
                         'interval_sec': video_embedding.end_offset_sec - video_embedding.start_offset_sec,
                     }
                 }]
-                index.upsert(vector)
+                index.upsert(vector, namespace=namespace)
 
             print(f"Processed and upserted: {video_file} ({video_index}/{total_videos})")
-            return  # Exit function if successful
+            return True  # Exit function if successful
         except Exception as e:
             print(f"Error processing file {video_file}: {e}")
-            if attempt < MAX_RETRIES - 1:
+            if attempt < max_retries - 1:
                 wait_time = 5 ** (attempt + 1)  # Exponential backoff
                 print(f"Retrying in {wait_time} seconds...")
                 time.sleep(wait_time)
             else:
-                print(f"Failed to process file {video_file} after {MAX_RETRIES} attempts.")
+                print(f"Failed to process file {video_file} after {max_retries} attempts.")
+    return False
 
-def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
-    """Main function to process videos from S3 and upsert embeddings to Pinecone."""
+def initialize(gc_project_id, pinecone_index_name):
+    """Set up credentials and return the Pinecone index and the embedding model."""
     setup_google_credentials()
 
     # Initialize Pinecone
@@ -144,20 +171,24 @@ def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
     # Initialize Vertex AI
     vertexai.init(project=gc_project_id, location=REGION)
     model = MultiModalEmbeddingModel.from_pretrained("multimodalembedding@001")
+    return index, model
+
+def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name, namespace="", workers=WORKERS):
+    """Main function to process videos from S3 and upsert embeddings to Pinecone."""
+    index, model = initialize(gc_project_id, pinecone_index_name)
 
     # List video files in S3 bucket
-    s3_client = boto3.client("s3", region_name=os.getenv("AWS_REGION"))
-    resp = s3_client.list_objects_v2(Bucket=s3_bucket_name, Prefix=s3_folder_name)
+    s3_client = make_s3_client(workers)
     video_files = [
-        obj["Key"].replace(f"{s3_folder_name}/", "")
-        for obj in resp.get("Contents", [])
-        if obj["Key"].lower().endswith(SUPPORTED_VIDEO_FORMATS)
+        key.replace(f"{s3_folder_name}/", "")
+        for key in s3.list_keys(s3_client, s3_bucket_name, s3_folder_name)
+        if key.lower().endswith(SUPPORTED_VIDEO_FORMATS)
     ]
 
     # Process videos in parallel
     total_videos = len(video_files)
     file_path = f'{s3_bucket_name}/{s3_folder_name}/'
-    with ThreadPoolExecutor() as executor:
+    with ThreadPoolExecutor(max_workers=workers) as executor:
         futures = [
             executor.submit(
                 process_video,
@@ -170,11 +201,41 @@ def main(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name):
                 i + 1,
                 total_videos,
                 s3_client,
+                namespace=namespace,
             )
             for i, video_file in enumerate(video_files)
         ]
         for future in as_completed(futures):
             future.result()  # This will re-raise any exceptions that occurred during processing
+    print(s3.stats.summary())
+
+def run_worker(gc_project_id, s3_bucket_name, s3_folder_name, pinecone_index_name, namespace="",
+               queue_url=None, queue_dir=None, batch_size=4, batch_wait=2.0, workers=WORKERS):
+    """Ingest videos as object-created events arrive instead of listing the folder."""
+    index, model = initialize(gc_project_id, pinecone_index_name)
+    s3_client = make_s3_client(workers)
+
+    if queue_url:
+        queue = ingest_worker.SqsQueue(queue_url, boto3.client("sqs", region_name=os.getenv("AWS_REGION")))
+    else:
+        queue = ingest_worker.DirectoryQueue(queue_dir)
+
+    def accept(event):
+        return (
+            event.bucket == s3_bucket_name
+            and event.key.startswith(f"{s3_folder_name}/")
+            and event.key.lower().endswith(SUPPORTED_VIDEO_FORMATS)
+        )
+
+    def process(event, batch_index):
+        # A single attempt: failed messages are redelivered by the queue.
+        file_path = f'{event.bucket}/{event.prefix}/'
+        return process_video(event.name, event.bucket, event.prefix, model, batch_index, file_path, 1, 1,
+                             s3_client, namespace=namespace, max_retries=1)
+
+    print(f"Waiting for new videos in s3://{s3_bucket_name}/{s3_folder_name}/…")
+    ingest_worker.run_worker(queue, process, index, accept, batch_size=batch_size, max_wait_sec=batch_wait,
+                             workers=workers, report=lambda: print(s3.stats.summary()))
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Process videos from an S3 bucket and upsert embeddings to Pinecone.')
@@ -182,9 +243,22 @@ if __name__ == '__main__':
     parser.add_argument('-b', '--bucket', type=str, required=True, help='The S3 bucket name.')
     parser.add_argument('-f', '--folder', type=str, required=True, help='The S3 folder containing videos in the bucket.')
     parser.add_argument('-i', '--index', type=str, required=True, help='The Pinecone Index name.')
+    parser.add_argument('--workers', type=int, default=WORKERS, help='Videos downloaded and embedded concurrently.')
+    parser.add_argument('--partition', action='store_true', help='Upsert into the "video" namespace instead of the default namespace.')
+    parser.add_argument('-c', '--collection', type=str, help='Collection name appended to the namespace (requires --partition).')
+    worker = parser.add_mutually_exclusive_group()
+    worker.add_argument('--queue-url', type=str, help='Run as a worker that ingests videos from S3 object-created notifications in this SQS queue.')
+    worker.add_argument('--queue-dir', type=str, help='Run as a worker reading notifications from JSON files in this directory (for local testing).')
+    parser.add_argument('--batch-size', type=int, default=4, help='Worker mode: videos embedded and upserted together.')
+    parser.add_argument('--batch-wait', type=float, default=2.0, help='Worker mode: seconds to wait for a batch to fill after the first event.')
 
     args = parser.parse_args()
-    main(args.project, args.bucket, args.folder, args.index)
+    namespace = namespace_for(args.partition, args.collection)
+    if args.queue_url or args.queue_dir:
+        run_worker(args.project, args.bucket, args.folder, args.index, namespace,
+                   args.queue_url, args.queue_dir, args.batch_size, args.batch_wait, args.workers)
+    else:
+        main(args.project, args.bucket, args.folder, args.index, namespace, args.workers)
 
 """
 Setup Instructions:
@@ -223,6 +297,6 @@ $ python video_embedding_processor.py -p my-gcp-project -b my-video-bucket -f pr
 Notes:
 - Ensure that your Google Cloud service account has the necessary permissions to access Vertex AI.
 - The script supports the following video formats: AVI, FLV, MKV, MOV, MP4, MPEG, MPG, WEBM, and WMV.
-- The script uses exponential backoff for retrying failed operations, with a maximum of 5 attempts per video.
+- S3 requests are retried up to 3 times with jittered backoff; embedding and upserting use exponential backoff, with a maximum of 5 attempts per video.
 - Video embedding settings (INTERVAL_SEC, START_OFFSET_SEC, END_OFFSET_SEC) can be adjusted at the top of the script.
 """
\ No newline at end of file
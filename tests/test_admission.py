@@ -0,0 +1,110 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import admission
+
+
+def test_queue_full_is_rejected_with_retry_after():
+    async def run():
+        controller = admission.AdmissionController({"image": 1}, queue_size=1, max_wait_sec=5)
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(controller("image", None, None, slow))
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(controller("image", None, None, slow))
+        await asyncio.sleep(0)
+
+        with pytest.raises(admission.Rejected) as excinfo:
+            await controller("image", None, None, slow)
+        assert excinfo.value.status_code == 429
+        assert excinfo.value.retry_after >= 1
+
+        release.set()
+        assert await first == "done"
+        assert await queued == "done"
+
+    asyncio.run(run())
+
+
+def test_deadline_shorter_than_expected_wait_is_rejected():
+    async def run():
+        controller = admission.AdmissionController({"text": 1}, max_wait_sec=5)
+        controller.pools["text"].service_time = 2.0
+        await controller.acquire("text", 1)
+
+        with pytest.raises(admission.Rejected) as excinfo:
+            await controller.acquire("text", 1, timeout=0.5)
+        assert excinfo.value.status_code == 503
+
+    asyncio.run(run())
+
+
+def test_video_weight_scales_with_upload_size():
+    controller = admission.AdmissionController({"video": 8}, video_slot_bytes=5 * 1024 * 1024)
+    assert controller.weight("video", None) == 1
+    assert controller.weight("video", 12 * 1024 * 1024) == 3
+    assert controller.weight("video", 500 * 1024 * 1024) == 8
+
+
+def test_cancelled_waiter_does_not_leak_granted_slot(monkeypatch):
+    async def wait_for(future, timeout):
+        # Like asyncio.wait_for on Python 3.12+, which raises CancelledError
+        # even if the future completed just before the cancellation.
+        return await future
+
+    monkeypatch.setattr(admission.asyncio, "wait_for", wait_for)
+
+    async def run():
+        controller = admission.AdmissionController({"text": 1}, max_wait_sec=5)
+        await controller.acquire("text", 1)
+        waiter = asyncio.create_task(controller.acquire("text", 1))
+        await asyncio.sleep(0)
+
+        # The slot is handed to the waiter, which is cancelled before it resumes.
+        controller.release("text", 1, 0.1)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert controller.pools["text"].in_use == 0
+        await asyncio.wait_for(controller.acquire("text", 1), 1)
+
+    asyncio.run(run())
+
+
+def test_slots_are_held_until_a_streamed_body_finishes():
+    class Streamed:
+        def __init__(self):
+            async def chunks():
+                yield "a"
+                yield "b"
+            self.body_iterator = chunks()
+
+    async def run():
+        controller = admission.AdmissionController({"image": 1}, max_wait_sec=5)
+        pool = controller.pools["image"]
+
+        async def call():
+            return Streamed()
+
+        response = await controller("image", None, None, call)
+        assert pool.in_use == 1
+        assert [chunk async for chunk in response.body_iterator] == ["a", "b"]
+        assert pool.in_use == 0
+
+        # A body dropped without being sent, e.g. on disconnect, still releases.
+        response = await controller("image", None, None, call)
+        assert pool.in_use == 1
+        del response
+        assert pool.in_use == 0
+
+    asyncio.run(run())
@@ -2,6 +2,8 @@ import importlib
 import sys
 from pathlib import Path
 
+import pytest
+
 sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
 
 from tests.test_config import reload_config
@@ -26,3 +28,23 @@ def test_public_url_strips_base_bucket(monkeypatch, tmp_path):
 
 
 
+
+
+def test_parse_object_ref(monkeypatch, tmp_path):
+    env = tmp_path / ".env.development"
+    env.write_text(
+        "PINECONE_API_KEY=1\nPINECONE_INDEX_NAME=i\nPINECONE_TOP_K=1\nS3_BUCKET_NAME=socks\n"
+    )
+    settings = reload_config(monkeypatch, env)
+    aws_storage = importlib.reload(importlib.import_module("api.aws_storage"))
+    monkeypatch.setattr(aws_storage, "settings", settings, raising=False)
+
+    expected = ("socks", "designs/red sock.png")
+    assert aws_storage.parse_object_ref("s3://socks/designs/red sock.png") == expected
+    assert aws_storage.parse_object_ref("https://socks.s3.amazonaws.com/designs/red%20sock.png") == expected
+    assert aws_storage.parse_object_ref("https://s3.us-east-1.amazonaws.com/socks/designs/red%20sock.png") == expected
+    assert aws_storage.parse_object_ref("designs/red sock.png") == expected
+
+    for ref in ["s3://other-bucket/a.png", "https://example.com/a.png", "s3://socks/"]:
+        with pytest.raises(ValueError):
+            aws_storage.parse_object_ref(ref)
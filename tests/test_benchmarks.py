@@ -0,0 +1,72 @@
+import base64
+import random
+import sys
+import types
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from benchmarks import fakes, run
+
+
+def test_in_memory_index_applies_filters_and_namespaces():
+    index = fakes.InMemoryIndex()
+    index.upsert([
+        {"id": "a", "values": fakes.embedding_for("a"), "metadata": {"file_type": "image", "date_added_ts": 10}},
+        {"id": "b", "values": fakes.embedding_for("b"), "metadata": {"file_type": "video", "date_added_ts": 20}},
+    ])
+    index.upsert([{"id": "c", "values": fakes.embedding_for("c"), "metadata": {"file_type": "image"}}], namespace="image")
+
+    matches = index.query(vector=fakes.embedding_for("a"), top_k=5, include_metadata=True)["matches"]
+    assert [m["id"] for m in matches] == ["a", "b"]
+    assert matches[0]["score"] > 0.99
+
+    video = {"$and": [{"file_type": {"$in": ["video"]}}, {"date_added_ts": {"$gte": 15}}]}
+    assert [m["id"] for m in index.query(vector=fakes.embedding_for("a"), top_k=5, filter=video)["matches"]] == ["b"]
+    assert index.fetch(ids=["c"], namespace="image")["vectors"]["c"]["metadata"] == {"file_type": "image"}
+    assert index.describe_index_stats()["total_vector_count"] == 3
+
+
+def test_fake_vertex_injects_errors():
+    vertex = fakes.FakeVertex(error_rate=1.0).start()
+    try:
+        url = vertex.endpoint.format(location="test") + "/predict"
+        assert requests.post(url, json={"instances": [{"text": "socks"}]}, timeout=5).status_code == 503
+        vertex.error_rate = 0
+        prediction = requests.post(url, json={"instances": [{"text": "socks"}]}, timeout=5).json()["predictions"][0]
+        assert prediction["textEmbedding"] == fakes.embedding_for("socks")
+    finally:
+        vertex.stop()
+
+
+def test_percentiles_and_regressions():
+    assert run.percentile([0.1, 0.2, 0.3, 0.4], 50) == 0.25
+    summary = run.summarize([0.01] * 99 + [1.0], errors=1, elapsed=1.0)
+    assert summary["requests"] == 101 and summary["rps"] == 100.0
+    assert summary["p50_ms"] == 10.0 and summary["p99_ms"] > 10.0
+
+    baseline = {"search.text.c8": {"p95_ms": 100, "rps": 50, "errors": 0}}
+    assert run.compare({"search.text.c8": {"p95_ms": 110, "rps": 48, "errors": 0}}, baseline, 0.2) == []
+    assert len(run.compare({"search.text.c8": {"p95_ms": 150, "rps": 30, "errors": 2}}, baseline, 0.2)) == 3
+
+
+def test_video_ingestion_and_search_requests():
+    s3 = fakes.FakeS3()
+    names = fakes.synthetic_videos(s3, "bucket", "catalog", 2, size=1024)
+    assert names == ["clip-0.mp4", "clip-1.mp4"]
+    assert len({body for body in s3.objects.values()}) == 2
+
+    path, kwargs = run.make_request("video", random.Random(0), b"", b"video")
+    assert path == "/api/search/video"
+    assert kwargs["files"]["file"][1] == b"video"
+
+    vertex = fakes.FakeVertex().start()
+    try:
+        embeddings = fakes.FakeEmbeddingModel(vertex, "test").get_embeddings(video=types.SimpleNamespace(data=b"video"))
+        # Segmented like a real clip, the first segment being the one search uses.
+        assert [segment.start_offset_sec for segment in embeddings.video_embeddings] == [0, 15, 30, 45]
+        assert embeddings.video_embeddings[0].embedding == fakes.embedding_for(base64.b64encode(b"video").decode())
+    finally:
+        vertex.stop()
@@ -0,0 +1,118 @@
+import io
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import dedupe
+
+
+def png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def artwork(size):
+    x = np.linspace(0, 255, size)
+    pixels = np.outer(np.sin(x / 40) * 100 + 128, np.cos(x / 25) * 0.5 + 0.5).astype(np.uint8)
+    return Image.fromarray(pixels).convert("RGB")
+
+
+def test_dhash_survives_resizing():
+    original = dedupe.dhash(png(artwork(256)))
+    resized = dedupe.dhash(png(artwork(256).resize((120, 120))))
+    other = dedupe.dhash(png(artwork(256).rotate(90)))
+    assert dedupe.hamming(original, resized) <= 2
+    assert dedupe.hamming(original, other) > 10
+
+
+class FakeIndex:
+    def __init__(self, matches):
+        self.matches = matches
+        self.metadata = {"orig": {"file_type": "image"}}
+        self.updates = []
+
+    def query(self, vector, top_k, namespace=""):
+        return {"matches": self.matches}
+
+    def fetch(self, ids, namespace=""):
+        return {"vectors": {i: {"metadata": self.metadata[i]} for i in ids if i in self.metadata}}
+
+    def update(self, id, set_metadata, namespace=""):
+        self.metadata[id].update(set_metadata)
+        self.updates.append(id)
+
+
+def test_detector_checks_recent_items_then_index():
+    index = FakeIndex([{"id": "orig", "score": 0.99}])
+    detector = dedupe.DuplicateDetector(threshold=0.95, recent_size=2, index=index)
+
+    assert detector.reserve_vector("x", [1.0, 0.0]) == ("orig", 0.99)
+    index.matches = []
+    assert detector.reserve_vector("x", [1.0, 0.0]) is None
+    detector.release("x")
+
+    detector.add("a", [1.0, 0.0], image_hash=0b1010)
+    assert detector.reserve_vector("y", [2.0, 0.1])[0] == "a"
+    assert detector.reserve_hash("z", 0b1011) == "a"
+    assert detector.reserve_hash("z", 0b0101) is None
+    detector.release("z")
+
+    # The ring buffer drops the oldest item once full.
+    detector.add("b", [0.0, 1.0])
+    detector.add("c", [0.0, -1.0])
+    assert detector.reserve_vector("y", [1.0, 0.0]) is None
+    assert detector.vector_duplicates == 2 and detector.hash_duplicates == 1
+
+
+def test_concurrent_near_duplicates_reserve_only_once():
+    detector = dedupe.DuplicateDetector(threshold=0.95, index=FakeIndex([]))
+    start = threading.Barrier(8)
+    results = {}
+
+    def ingest(i):
+        start.wait()
+        try:
+            results[i] = detector.reserve_vector(f"item-{i}", [1.0, 0.001 * i])
+        except dedupe.PendingDuplicate as e:
+            results[i] = e.original_id
+
+    threads = [threading.Thread(target=ingest, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # The first item is reserved; the others wait for it to be ingested.
+    reserved = [i for i, duplicate in results.items() if duplicate is None]
+    assert len(reserved) == 1
+    assert set(results.values()) == {None, f"item-{reserved[0]}"}
+
+
+def test_duplicate_of_pending_item_waits_for_confirmation():
+    detector = dedupe.DuplicateDetector(threshold=0.95)
+    assert detector.reserve_hash("orig", 0b1010) is None
+    with pytest.raises(dedupe.PendingDuplicate):
+        detector.reserve_hash("copy", 0b1011)
+
+    # Once the original failed and was released, the copy is ingested instead.
+    detector.release("orig")
+    assert detector.reserve_hash("copy", 0b1011) is None
+    assert detector.reserve_vector("copy", [1.0, 0.0], 0b1011) is None
+    detector.confirm("copy")
+    assert detector.reserve_vector("again", [1.0, 0.0]) == ("copy", pytest.approx(1.0))
+
+
+def test_link_duplicate_appends_once():
+    index = FakeIndex([])
+    dedupe.link_duplicate(index, "orig", "designs/a-small.png")
+    dedupe.link_duplicate(index, "orig", "designs/a-small.png")
+    dedupe.link_duplicate(index, "missing", "designs/b.png")
+    assert index.metadata["orig"]["duplicate_files"] == ["designs/a-small.png"]
+    assert index.updates == ["orig"]
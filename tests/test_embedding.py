@@ -0,0 +1,149 @@
+import importlib
+import io
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.test_config import reload_config
+
+
+class StubVertex:
+    """Local stand-in for the predict endpoint with per-region delay and status."""
+
+    def __init__(self):
+        self.delay = {}
+        self.status = {}
+        self.calls = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                region = self.path.split("/")[1]
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stub.calls.append(region)
+                time.sleep(stub.delay.get(region, 0))
+                status = stub.status.get(region, 200)
+                embedding = [1.0, float(len(region))]
+                body = json.dumps({"predictions": [{"textEmbedding": embedding, "imageEmbedding": embedding}]})
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def endpoint(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{{location}}"
+
+
+@pytest.fixture
+def vertex(monkeypatch, tmp_path):
+    env = tmp_path / ".env.development"
+    env.write_text("PINECONE_API_KEY=1\nPINECONE_INDEX_NAME=i\nPINECONE_TOP_K=1\n")
+    monkeypatch.setenv("GOOGLE_CLOUD_PROJECT_LOCATION", "primary")
+    monkeypatch.setenv("GOOGLE_CLOUD_PROJECT_SECONDARY_LOCATION", "backup-region")
+    monkeypatch.setenv("EMBEDDING_HEDGE_AFTER_MS", "100")
+    monkeypatch.setenv("EMBEDDING_CIRCUIT_FAILURES", "2")
+    monkeypatch.setenv("EMBEDDING_CIRCUIT_RESET_SEC", "60")
+    settings = reload_config(monkeypatch, env)
+    stub = StubVertex()
+    settings.vertex_endpoint = stub.endpoint
+    settings.get_access_token = lambda: "token"
+    settings.shared_cache_dir = str(tmp_path)
+    embedding = importlib.reload(importlib.import_module("api.embedding"))
+    monkeypatch.setattr(embedding, "settings", settings)
+    yield embedding, stub
+    stub.server.shutdown()
+
+
+def test_slow_primary_is_hedged_to_secondary(vertex):
+    embedding, stub = vertex
+    stub.delay["primary"] = 1.0
+
+    start = time.perf_counter()
+    vector = embedding.embed("text", "green socks")
+    assert vector == [1.0, float(len("backup-region"))]
+    assert time.perf_counter() - start < 0.8
+    assert stub.calls[:2] == ["primary", "backup-region"]
+
+
+def test_fast_primary_is_not_hedged(vertex):
+    embedding, stub = vertex
+    assert embedding.embed("text", "socks") == [1.0, float(len("primary"))]
+    assert stub.calls == ["primary"]
+
+
+def test_failures_open_the_circuit(vertex):
+    embedding, stub = vertex
+    stub.status["primary"] = 500
+
+    for query in ["red socks", "blue socks"]:
+        assert embedding.embed("text", query) == [1.0, float(len("backup-region"))]
+    assert embedding.breaker_for("primary").is_open
+
+    stub.calls.clear()
+    embedding.embed("text", "green socks")
+    assert stub.calls == ["backup-region"]
+
+    stub.status["backup-region"] = 503
+    with pytest.raises(embedding.EmbeddingUnavailable):
+        embedding.embed("text", "grey socks")
+
+
+def test_client_errors_are_not_retried(vertex):
+    embedding, stub = vertex
+    stub.status["primary"] = 400
+    with pytest.raises(Exception) as excinfo:
+        embedding.embed("text", "socks")
+    assert not isinstance(excinfo.value, embedding.EmbeddingUnavailable)
+    assert stub.calls == ["primary"]
+    assert not embedding.breaker_for("primary").is_open
+
+
+def test_embeddings_are_cached(vertex):
+    embedding, stub = vertex
+    first = embedding.embed("text", "striped socks")
+    assert embedding.embed("text", "striped socks") == first
+    assert stub.calls == ["primary"]
+
+
+class FakeS3:
+    def __init__(self):
+        self.etag = '"v1"'
+        self.gets = 0
+
+    def head_object(self, Bucket, Key):
+        return {"ETag": self.etag, "ContentLength": 3}
+
+    def get_object(self, Bucket, Key, IfMatch=None, Range=None):
+        self.gets += 1
+        return {"Body": io.BytesIO(b"png")}
+
+
+def test_s3_objects_are_cached_by_etag(vertex, monkeypatch):
+    embedding, stub = vertex
+    s3 = FakeS3()
+    monkeypatch.setattr(embedding.aws_storage, "client", lambda: s3)
+
+    vector = embedding.embed_object("image", "bucket", "designs/a.png")
+    assert embedding.embed_object("image", "bucket", "designs/a.png") == vector
+    assert s3.gets == 1
+
+    s3.etag = '"v2"'
+    embedding.embed_object("image", "bucket", "designs/a.png")
+    assert s3.gets == 2
+
+    with pytest.raises(ValueError):
+        embedding.embed_object("image", "bucket", "designs/a.png", max_bytes=2)
@@ -0,0 +1,158 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import index_stats, snapshot
+from benchmarks import fakes
+
+
+class CountingIndex(fakes.InMemoryIndex):
+    def __init__(self):
+        super().__init__()
+        self.describes = 0
+
+    def describe_index_stats(self, **kwargs):
+        self.describes += 1
+        return super().describe_index_stats(**kwargs)
+
+
+class PodIndex(CountingIndex):
+    """Counts by metadata filter, like a pod-based index."""
+
+    def describe_index_stats(self, filter=None, **kwargs):
+        stats = super().describe_index_stats(**kwargs)
+        if filter:
+            with self._lock:
+                for name, space in self.namespaces.items():
+                    stats["namespaces"][name]["vector_count"] = sum(
+                        1 for row, metadata in enumerate(space.metadata)
+                        if row not in space.deleted and fakes._matches_filter(metadata, filter)
+                    )
+        return stats
+
+
+class FailingIndex(CountingIndex):
+    failing = False
+
+    def describe_index_stats(self, **kwargs):
+        if self.failing:
+            self.describes += 1
+            raise ConnectionError("Pinecone is unreachable")
+        return super().describe_index_stats(**kwargs)
+
+
+def add(index, vector_id, file_type, timestamp, namespace=""):
+    index.upsert(
+        [{"id": vector_id, "values": fakes.embedding_for(vector_id),
+          "metadata": {"file_type": file_type, "date_added_ts": timestamp}}],
+        namespace=namespace,
+    )
+
+
+def test_partitioned_counts_and_latest_ingestion():
+    index = CountingIndex()
+    for i in range(50):
+        add(index, f"image-{i}", "image", 1_700_000_000 + i, "image")
+    add(index, "video-0", "video", 1_600_000_000, "video")
+    stats = index_stats.IndexStats(index, {"image": ["image"], "video": ["video"]}, refresh_sec=3600)
+
+    info = stats.get()
+    assert info["total_vectors"] == 51
+    assert info["namespaces"]["image"]["vector_count"] == 50
+    assert info["file_types"]["image"]["vector_count"] == 50
+    assert info["file_types"]["video"]["vector_count"] == 1
+    assert info["file_types"]["image"]["last_ingested_at"] == index_stats._isoformat(1_700_000_049)
+    assert info["last_ingested_at"] == info["file_types"]["image"]["last_ingested_at"]
+
+    # Served from the cached statistics until they are older than max_age_sec.
+    add(index, "image-new", "image", 1_800_000_000, "image")
+    queries = index.queries
+    assert stats.get()["total_vectors"] == 51
+    assert index.describes == 1 and index.queries == queries
+
+    info = stats.refresh()
+    assert info["file_types"]["image"]["last_ingested_at"] == index_stats._isoformat(1_800_000_000)
+    # Resumes from the latest known times: the new image, then nothing newer, and no new video.
+    assert index.queries - queries == 2 + 1
+
+
+def test_shared_namespace_is_split_by_snapshot(tmp_path):
+    index = CountingIndex()
+    add(index, "a", "image", 1)
+    add(index, "b", "image", 2)
+    add(index, "c", "video", 3)
+
+    stats = index_stats.IndexStats(index, {"image": [""], "video": [""]})
+    assert stats.refresh()["file_types"]["image"]["vector_count"] is None
+    # The filter is not retried once the index rejected it.
+    describes = index.describes
+    stats.refresh()
+    assert index.describes == describes + 1
+
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    for vector_id, file_type in [("a", "image"), ("b", "image"), ("c", "video")]:
+        writer.add(vector_id, fakes.embedding_for(vector_id), {"file_type": file_type})
+    writer.close()
+
+    stats = index_stats.IndexStats(index, {"image": [""], "video": [""]}, snapshot_path=str(tmp_path), max_age_sec=0)
+    info = stats.get()
+    assert info["file_types"]["image"]["vector_count"] == 2
+    assert info["file_types"]["video"]["vector_count"] == 1
+    assert info["file_types_as_of"]
+    assert info["file_types"]["video"]["last_ingested_at"] == index_stats._isoformat(3)
+
+    # With max_age_sec=0 every request refreshes.
+    time.sleep(0.01)
+    describes = index.describes
+    stats.get()
+    assert index.describes == describes + 1
+
+
+def test_shared_namespace_is_split_by_filtered_stats():
+    index = PodIndex()
+    add(index, "a", "image", 1)
+    add(index, "b", "image", 2)
+    add(index, "c", "video", 3)
+
+    info = index_stats.IndexStats(index, {"image": [""], "video": [""]}).refresh()
+    assert info["file_types"]["image"]["vector_count"] == 2
+    assert info["file_types"]["video"]["vector_count"] == 1
+    assert "file_types_as_of" not in info
+
+
+def test_failed_refresh_serves_stale_stats_without_retrying():
+    index = FailingIndex()
+    add(index, "a", "image", 1, "image")
+    stats = index_stats.IndexStats(index, {"image": ["image"], "video": ["video"]}, refresh_sec=3600, max_age_sec=60)
+    assert stats.get()["stale"] is False
+
+    index.failing = True
+    stats._refreshed -= 120
+    describes = index.describes
+    # One request tries and fails; the others are served the stale snapshot.
+    for _ in range(5):
+        info = stats.get()
+        assert info["stale"] is True and info["total_vectors"] == 1 and info["age_sec"] >= 120
+    assert index.describes == describes + 1
+    assert not stats.needs_refresh()
+
+    # Only the background refresh retries, and recovers.
+    index.failing = False
+    stats._try_refresh()
+    info = stats.get()
+    assert info["stale"] is False and info["age_sec"] < 1
+
+
+def test_no_stats_yet_and_refresh_failing():
+    index = FailingIndex()
+    index.failing = True
+    stats = index_stats.IndexStats(index, {"image": [""], "video": [""]}, refresh_sec=3600)
+    with pytest.raises(index_stats.StatsUnavailable):
+        stats.get()
+    with pytest.raises(index_stats.StatsUnavailable):
+        stats.get()
+    assert index.describes == 1
@@ -0,0 +1,112 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import ingest_worker
+from api.ingest_worker import ObjectEvent
+
+
+def test_parse_events():
+    s3 = {"Records": [
+        {"eventName": "ObjectCreated:Put", "s3": {"bucket": {"name": "b"}, "object": {"key": "designs/red+sock%281%29.png"}}},
+        {"eventName": "ObjectRemoved:Delete", "s3": {"bucket": {"name": "b"}, "object": {"key": "designs/old.png"}}},
+    ]}
+    assert ingest_worker.parse_events(json.dumps(s3)) == [ObjectEvent("b", "designs/red sock(1).png")]
+    assert ingest_worker.parse_events({"Type": "Notification", "Message": json.dumps(s3)})[0].name == "red sock(1).png"
+
+    bridge = {"detail-type": "Object Created", "detail": {"bucket": {"name": "b"}, "object": {"key": "v/a.mp4"}}}
+    assert ingest_worker.parse_events(bridge) == [ObjectEvent("b", "v/a.mp4")]
+    assert ingest_worker.parse_events({"Event": "s3:TestEvent", "Bucket": "b"}) == []
+
+
+class FakeIndex:
+    def __init__(self):
+        self.upserts = []
+
+    def upsert(self, vectors, namespace=""):
+        self.upserts.append((namespace, [v["id"] for v in vectors]))
+
+
+def test_worker_batches_upserts_and_retries_failures(tmp_path):
+    queue = ingest_worker.DirectoryQueue(str(tmp_path), poll_sec=0.01)
+    for key in ["designs/a.png", "designs/b.png", "designs/broken.png", "other/c.png"]:
+        queue.put("bucket", key)
+
+    processed = []
+
+    def process(event, index):
+        processed.append(event.key)
+        if event.name == "broken.png":
+            return False
+        index.upsert([{"id": event.name, "values": [0.0]}], namespace="image")
+        return True
+
+    index = FakeIndex()
+    ingest_worker.run_worker(
+        queue, process, index, accept=lambda e: e.key.startswith("designs/"),
+        batch_size=10, max_wait_sec=0.05, max_batches=1,
+    )
+
+    assert sorted(processed) == ["designs/a.png", "designs/b.png", "designs/broken.png"]
+    # One upsert request for the whole batch.
+    assert [(namespace, sorted(ids)) for namespace, ids in index.upserts] == [("image", ["a.png", "b.png"])]
+
+    # Only the failed object is left for redelivery.
+    remaining = [name for name in os.listdir(tmp_path) if name.endswith(".json")]
+    assert len(remaining) == 1
+    assert os.listdir(tmp_path / "processing") == []
+    with open(tmp_path / remaining[0]) as f:
+        assert json.load(f)["key"] == "designs/broken.png"
+
+
+def test_vector_ids_are_derived_from_the_object():
+    image = ingest_worker.vector_id("bucket", "designs/a.png")
+    assert image == ingest_worker.vector_id("bucket", "designs/a.png")
+    assert image != ingest_worker.vector_id("bucket", "designs/b.png")
+    assert ingest_worker.vector_id("bucket", "v/a.mp4", 0) != ingest_worker.vector_id("bucket", "v/a.mp4", 1)
+
+
+def test_failed_messages_back_off_then_move_to_failed(tmp_path, monkeypatch):
+    queue = ingest_worker.DirectoryQueue(str(tmp_path), poll_sec=0.01, max_attempts=2)
+    queue.put("bucket", "designs/poison.png")
+
+    [message] = queue.receive(10, 0)
+    assert message.attempts == 1
+    queue.nack(message)
+    # Not redelivered until the retry delay has passed.
+    assert queue.receive(10, 0) == []
+
+    now = ingest_worker.time.time()
+    monkeypatch.setattr(ingest_worker.time, "time", lambda: now + ingest_worker.retry_delay(1) + 1)
+    [message] = queue.receive(10, 0)
+    assert message.attempts == 2
+    queue.nack(message)
+
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".json")] == []
+    assert len(os.listdir(tmp_path / "failed")) == 1
+
+
+def test_deferred_work_runs_only_after_a_successful_flush():
+    class FailingIndex:
+        def upsert(self, vectors, namespace=""):
+            raise RuntimeError("Pinecone unavailable")
+
+    outcomes = []
+    upserter = ingest_worker.BatchUpserter(FailingIndex())
+    upserter.upsert([{"id": "a", "values": [0.0]}])
+    ingest_worker.after_upsert(upserter, lambda: outcomes.append("done"), lambda: outcomes.append("failed"))
+    with pytest.raises(RuntimeError):
+        upserter.flush()
+    assert outcomes == ["failed"]
+
+    upserter = ingest_worker.BatchUpserter(FakeIndex())
+    upserter.upsert([{"id": "a", "values": [0.0]}])
+    ingest_worker.after_upsert(upserter, lambda: outcomes.append("done"))
+    assert outcomes == ["failed"]
+    upserter.flush()
+    assert outcomes == ["failed", "done"]
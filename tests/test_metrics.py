@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = metrics.Histogram("test_latency_seconds", "Test.", ("stage",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, stage="a")
+    histogram.observe(0.5, stage="a")
+    histogram.observe(5, stage="a")
+
+    text = "\n".join(histogram.render())
+    assert 'test_latency_seconds_bucket{stage="a",le="0.1"} 1' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="1.0"} 2' in text
+    assert 'test_latency_seconds_bucket{stage="a",le="+Inf"} 3' in text
+    assert 'test_latency_seconds_count{stage="a"} 3' in text
+
+
+def test_timed_counts_upstream_errors():
+    with pytest.raises(RuntimeError):
+        with metrics.timed("test_stage", upstream="test_upstream"):
+            raise RuntimeError("boom")
+
+    text = metrics.render()
+    assert 'search_upstream_errors_total{upstream="test_upstream"} 1' in text
+    assert 'search_stage_seconds_count{stage="test_stage"} 1' in text
@@ -0,0 +1,108 @@
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import neighbors
+
+
+def brute_force(vectors, top_n):
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :top_n]
+
+
+def test_build_table_matches_brute_force():
+    rng = np.random.default_rng(0)
+    vectors = neighbors.normalize(rng.normal(size=(50, 8)))
+    table, scores = neighbors.build_table(vectors, 5, batch_size=7)
+    assert np.array_equal(table, brute_force(vectors, 5))
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def test_extend_table_matches_full_rebuild():
+    rng = np.random.default_rng(1)
+    vectors = neighbors.normalize(rng.normal(size=(40, 8)))
+    old_neighbors, old_scores = neighbors.build_table(vectors[:30], 5)
+    _, table, _ = neighbors.extend_table(
+        vectors[:30], old_neighbors, old_scores, vectors[30:], 5
+    )
+    assert np.array_equal(table, brute_force(vectors, 5))
+
+
+def test_table_lookup_roundtrip(tmp_path):
+    rng = np.random.default_rng(2)
+    vectors = neighbors.normalize(rng.normal(size=(10, 4)))
+    table, scores = neighbors.build_table(vectors, 3)
+    ids = [f"id-{i}" for i in range(10)]
+    metadata = [{"s3_file_name": f"{i}.png"} for i in range(10)]
+    neighbors.save_table(str(tmp_path), ids, vectors, table, scores, metadata)
+
+    loaded = neighbors.get_table(str(tmp_path))
+    results = loaded.lookup("id-0", 2)
+    assert [r[0] for r in results] == [ids[n] for n in table[0, :2]]
+    assert results[0][2] == metadata[table[0, 0]]
+    assert "missing" not in loaded
+
+
+def test_extend_table_rejects_different_top_n():
+    rng = np.random.default_rng(3)
+    vectors = neighbors.normalize(rng.normal(size=(20, 8)))
+    old_neighbors, old_scores = neighbors.build_table(vectors[:15], 3)
+    with pytest.raises(ValueError, match="rebuild"):
+        neighbors.extend_table(vectors[:15], old_neighbors, old_scores, vectors[15:], 5)
+
+
+def test_remove_rows_matches_full_rebuild():
+    rng = np.random.default_rng(4)
+    vectors = neighbors.normalize(rng.normal(size=(40, 8)))
+    table, scores = neighbors.build_table(vectors, 5)
+    removed = [3, 17, 30]
+    remaining, table, _ = neighbors.remove_rows(vectors, table, scores, removed, 5)
+
+    expected = np.delete(vectors, removed, axis=0)
+    assert np.array_equal(remaining, expected)
+    assert np.array_equal(table, brute_force(expected, 5))
+
+
+def test_rebuild_does_not_touch_a_loaded_table(tmp_path):
+    rng = np.random.default_rng(5)
+    vectors = neighbors.normalize(rng.normal(size=(30, 8)))
+    table, scores = neighbors.build_table(vectors, 5)
+    ids = [f"id-{i}" for i in range(30)]
+    neighbors.save_table(str(tmp_path), ids, vectors, table, scores, [{}] * 30)
+    loaded = neighbors.NeighborTable(str(tmp_path))
+    expected = loaded.lookup("id-29", 5)
+
+    # A smaller rebuild goes to a new directory; the mapped files stay intact.
+    for rows in (10, 20):
+        smaller, smaller_scores = neighbors.build_table(vectors[:rows], 5)
+        neighbors.save_table(str(tmp_path), ids[:rows], vectors[:rows], smaller, smaller_scores, [{}] * rows)
+    assert loaded.lookup("id-29", 5) == expected
+
+    reloaded = neighbors.get_table(str(tmp_path))
+    assert len(reloaded.ids) == 20 and reloaded.directory != loaded.directory
+    builds = [name for name in os.listdir(tmp_path) if name.startswith("build-")]
+    assert len(builds) == 1 + neighbors.KEEP_BUILDS
+
+
+def test_diff_snapshot_recomputes_changed_vectors():
+    rng = np.random.default_rng(6)
+    raw = rng.normal(size=(6, 8)).astype(np.float32)
+    ids = [f"id-{i}" for i in range(5)]
+    metadata = [{"s3_file_name": f"{i}.png"} for i in range(5)]
+    vectors = neighbors.normalize(raw[:5])
+
+    # id-1 was re-ingested with a new vector, id-2 with new metadata, id-3 deleted, id-5 added.
+    snapshot_ids = ["id-0", "id-1", "id-2", "id-4", "id-5"]
+    snapshot_vectors = raw[[0, 5, 2, 4, 5]].copy()
+    snapshot_vectors[1] = rng.normal(size=8)
+    snapshot_metadata = [metadata[0], metadata[1], {"s3_file_name": "2-new.png"}, metadata[4], {}]
+
+    removed, added = neighbors.diff_snapshot(ids, vectors, metadata, snapshot_ids, snapshot_vectors, snapshot_metadata)
+    assert removed == [1, 2, 3]
+    assert added == [1, 2, 4]
@@ -0,0 +1,96 @@
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import profiling, vectors
+
+
+def test_profile_records_api_stacks(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), token="secret", interval_ms=1)
+    assert profiler.requested({"x-profile": "secret"})
+    assert not profiler.requested({"x-profile": "wrong"})
+    assert not profiler.requested({})
+    assert not profiling.Profiler(str(tmp_path)).requested({"x-profile": ""})
+
+    stop = threading.Event()
+    data = np.random.default_rng(0).standard_normal((256, 1408)).astype(np.float32)
+
+    def quantize():
+        while not stop.is_set():
+            vectors.quantize(data, "int8")
+
+    def dequantize():
+        codes, scales = vectors.quantize(data, "int8")
+        while not stop.is_set():
+            vectors.dequantize(codes, scales)
+
+    profile = profiler.start()
+    token = profiling.current.set(profile)
+    try:
+        executor = profiling.Executor(max_workers=1)
+        future = executor.submit(quantize)
+    finally:
+        profiling.current.reset(token)
+    # Another request's thread, running at the same time.
+    other = threading.Thread(target=profiling.bind(dequantize))
+    other.start()
+    time.sleep(0.2)
+    stop.set()
+    future.result()
+    other.join()
+    executor.shutdown()
+    profile_id = profiler.finish(profile, "POST", "/api/search/image", 200)
+
+    document = profiler.load(profile_id)
+    assert document["path"] == "/api/search/image" and document["ticks"] > 0
+    assert any("api.vectors.quantize" in stack for stack in document["stacks"])
+    assert not any("api.vectors.dequantize" in stack for stack in document["stacks"])
+    assert not profile.threads
+    assert profiler._thread is None or not profiler._active
+    assert profiler.load("../etc/passwd") is None
+
+
+def test_categorize():
+    assert profiling.categorize(["api.embedding._call", "requests.sessions.post", "socket.readinto"]) == "network"
+    assert profiling.categorize(["api.v1.endpoints.image.check_image", "PIL.Image.open"]) == "image"
+    assert profiling.categorize(["api.search._pack", "json.dumps", "json.encoder.encode"]) == "serialization"
+    assert profiling.categorize(["api.search.group_matches"]) == "python"
+
+
+def test_retention_and_aggregate(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), retention=2, sample_rate=1.0)
+    for _ in range(4):
+        profiler.finish(profiler.start(), "GET", "/api", 200)
+    old = profiler.finish(profiler.start(), "GET", "/api", 200)
+    os.utime(tmp_path / f"{old}.json", (0, 0))
+    profiler.finish(profiler.start(), "GET", "/api", 200)
+
+    kept = profiler.list()
+    assert len(kept) == 2 and old not in kept
+
+    assert profiler.should_sample()
+
+
+def test_aggregate_is_flushed_and_capped(tmp_path):
+    profiler = profiling.Profiler(str(tmp_path), sample_rate=1.0, flush_sec=3600, max_stacks=3)
+    for i in range(3):
+        profile = profiler.start(aggregate=True)
+        profile.stacks.update({f"api.a{i}": 1, f"api.b{i}": 1, "api.common": 5})
+        aggregate_id = profiler.finish(profile, "POST", "/api/search/text", 200)
+    # Merged in memory until the flush timer fires.
+    assert not (tmp_path / f"{aggregate_id}.json").exists()
+    assert profiler._flush_timer is not None
+
+    profiler.flush()
+    aggregate = json.loads((tmp_path / f"{aggregate_id}.json").read_text())
+    assert aggregate["requests"] == 3
+    # Rare stacks are folded into one, so no samples are lost.
+    assert aggregate["stacks"] == {"api.common": 15, profiling.OTHER_STACKS: 6}
+    assert profiler._flush_timer is None
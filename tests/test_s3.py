@@ -0,0 +1,91 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import s3
+
+
+class ClientError(Exception):
+    def __init__(self, code):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeClient:
+    def __init__(self, data, failures=0):
+        self.data = data
+        self.failures = failures
+        self.calls = []
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self.calls.append((Range, IfMatch))
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionResetError("reset while reading")
+        if Range is None:
+            return {"Body": io.BytesIO(self.data), "ContentLength": len(self.data), "ETag": '"v1"'}
+        if not self.data:
+            raise ClientError("InvalidRange")
+        start, end = (int(n) for n in Range.removeprefix("bytes=").split("-"))
+        body = self.data[start : end + 1]
+        return {
+            "Body": io.BytesIO(body),
+            "ContentLength": len(body),
+            "ContentRange": f"bytes {start}-{start + len(body) - 1}/{len(self.data)}",
+            "ETag": '"v1"',
+        }
+
+
+def test_large_objects_are_downloaded_in_pinned_ranges():
+    data = bytes(range(256)) * 10
+    client = FakeClient(data)
+    assert s3.download(client, "bucket", "video.mp4", part_size=1000) == data
+    assert sorted(client.calls) == [
+        ("bytes=0-999", None), ("bytes=1000-1999", '"v1"'), ("bytes=2000-2559", '"v1"')
+    ]
+
+    small = FakeClient(b"png")
+    assert s3.download(small, "bucket", "a.png") == b"png"
+    assert len(small.calls) == 1
+
+
+def test_download_retries_and_handles_empty_objects(monkeypatch):
+    monkeypatch.setattr(s3.time, "sleep", lambda seconds: None)
+    retries = s3.stats.retries
+    client = FakeClient(b"socks", failures=2)
+    assert s3.download(client, "bucket", "a.png") == b"socks"
+    assert s3.stats.retries == retries + 2
+
+    with pytest.raises(ConnectionResetError):
+        s3.download(FakeClient(b"socks", failures=5), "bucket", "a.png")
+
+    assert s3.download(FakeClient(b""), "bucket", "empty.png") == b""
+
+
+def test_list_keys_follows_continuation_tokens():
+    class Lister:
+        def list_objects_v2(self, Bucket, Prefix, ContinuationToken=None):
+            if ContinuationToken is None:
+                return {"Contents": [{"Key": "a"}], "IsTruncated": True, "NextContinuationToken": "t"}
+            return {"Contents": [{"Key": "b"}], "IsTruncated": False}
+
+    assert s3.list_keys(Lister(), "bucket", "designs") == ["a", "b"]
+
+
+def test_download_to_file_writes_parts_at_their_offsets(tmp_path):
+    data = bytes(range(256)) * 10
+    client = FakeClient(data)
+    with open(tmp_path / "video.mp4", "wb") as f:
+        assert s3.download_to_file(client, "bucket", "video.mp4", f, part_size=1000) == len(data)
+    assert (tmp_path / "video.mp4").read_bytes() == data
+    assert len(client.calls) == 3
+
+
+def test_botocore_does_not_retry_on_top_of_with_retries():
+    pytest.importorskip("boto3")
+    client = s3.make_client("us-east-1")
+    assert client.meta.config.retries["total_max_attempts"] == 1
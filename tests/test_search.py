@@ -0,0 +1,310 @@
+import importlib
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from tests.test_config import reload_config
+
+
+class FakeIndex:
+    def __init__(self, count):
+        self.count = count
+        self.calls = []
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, namespace="", **kwargs):
+        self.calls.append({"top_k": top_k, "filter": filter, "namespace": namespace, **kwargs})
+        # Namespaces interleave their scores so merging can be checked.
+        shift = 0.005 if namespace == "video" else 0
+        matches = [
+            {"id": f"{namespace}{i}", "score": 1 - i / 100 - shift, "metadata": {"s3_file_name": f"{namespace}{i}.png"}}
+            for i in range(min(top_k, self.count))
+        ]
+        return {"matches": matches}
+
+
+def load_search(monkeypatch, tmp_path, index):
+    env = tmp_path / ".env.development"
+    env.write_text("PINECONE_API_KEY=1\nPINECONE_INDEX_NAME=i\nPINECONE_TOP_K=5\n")
+    settings = reload_config(monkeypatch, env)
+    fake_deps = types.ModuleType("api.deps")
+    fake_deps.index = index
+    monkeypatch.setitem(sys.modules, "api.deps", fake_deps)
+    monkeypatch.setattr(importlib.import_module("api"), "deps", fake_deps, raising=False)
+    search = importlib.reload(importlib.import_module("api.search"))
+    monkeypatch.setattr(search, "settings", settings)
+    settings.shared_cache_dir = str(tmp_path)
+    return search
+
+
+def test_build_filter(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, FakeIndex(0))
+    assert search.build_filter() is None
+    assert search.build_filter(file_type="video") == {"file_type": {"$eq": "video"}}
+
+    combined = search.build_filter(file_type="image, video", date_from="2024-01-01")
+    assert combined["$and"][0] == {"file_type": {"$in": ["image", "video"]}}
+    assert "$gte" in combined["$and"][1]["date_added_ts"]
+
+    with pytest.raises(ValueError):
+        search.build_filter(date_to="yesterday")
+
+
+def test_cursor_pagination_reuses_query_vector(monkeypatch, tmp_path):
+    index = FakeIndex(30)
+    search = load_search(monkeypatch, tmp_path, index)
+
+    first = search.search([0.1, 0.2], top_k=25, page_size=12, group=False)
+    assert [r["metadata"]["s3_file_name"] for r in first["results"]] == [f"{i}.png" for i in range(12)]
+
+    second = search.next_page(first["next_cursor"])
+    assert second["results"][0]["metadata"]["s3_file_name"] == "12.png"
+    assert len(second["results"]) == 12
+
+    third = search.next_page(second["next_cursor"])
+    assert len(third["results"]) == 1
+    assert third["next_cursor"] is None
+    assert [c["top_k"] for c in index.calls] == [12, 24, 25]
+
+
+def test_single_page_defaults_to_settings_top_k(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, FakeIndex(30))
+    response = search.search([0.1])
+    assert len(response["results"]) == 5
+    assert response["next_cursor"] is None
+
+
+def test_expired_cursor(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, FakeIndex(30))
+    cursor = search.encode_cursor("unknown", 10, 10, 30)
+    with pytest.raises(search.CursorExpired):
+        search.next_page(cursor)
+
+
+def test_forged_cursors_are_rejected(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, FakeIndex(30))
+    forged = [
+        search.encode_cursor("q", 0, 10, search.MAX_TOP_K + 1),
+        search.encode_cursor("q", -5, 10, 30),
+        search.encode_cursor("q", 10, 0, 30),
+        search.encode_cursor("q", 30, 10, 30),
+        "not-a-cursor",
+    ]
+    for cursor in forged:
+        with pytest.raises(search.InvalidCursor):
+            search.next_page(cursor)
+
+
+def test_namespace_routing_and_merge(monkeypatch, tmp_path):
+    index = FakeIndex(10)
+    search = load_search(monkeypatch, tmp_path, index)
+    monkeypatch.setattr(search.settings, "namespaces", {"image": ["image"], "video": ["video"]})
+
+    search.search([0.1], top_k=3, modalities=search.modalities_for(None, ["image"]))
+    assert [c["namespace"] for c in index.calls] == ["image"]
+
+    index.calls.clear()
+    response = search.search([0.1], top_k=4, modalities=["image", "video"])
+    assert sorted(c["namespace"] for c in index.calls) == ["image", "video"]
+    names = [r["metadata"]["s3_file_name"] for r in response["results"]]
+    assert names == ["image0.png", "video0.png", "image1.png", "video1.png"]
+
+
+class SegmentIndex:
+    """Each video has four segments scoring next to each other."""
+
+    def __init__(self):
+        self.top_ks = []
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, namespace="", **kwargs):
+        self.top_ks.append(top_k)
+        matches = []
+        for i in range(min(top_k, 200)):
+            video, segment = divmod(i, 4)
+            matches.append({
+                "id": str(i),
+                "score": 1 - i / 1000,
+                "metadata": {
+                    "s3_file_name": f"{video}.mp4",
+                    "file_type": "video",
+                    "segment": segment,
+                    "start_offset_sec": segment * 15,
+                    "end_offset_sec": segment * 15 + 15,
+                },
+            })
+        return {"matches": matches}
+
+
+def test_group_collapses_video_segments(monkeypatch, tmp_path):
+    index = SegmentIndex()
+    search = load_search(monkeypatch, tmp_path, index)
+
+    response = search.search([0.1], top_k=10)
+    names = [r["metadata"]["s3_file_name"] for r in response["results"]]
+    assert names == [f"{i}.mp4" for i in range(10)]
+    assert [s["segment"] for s in response["results"][0]["segments"]] == [0, 1, 2, 3]
+    assert response["results"][0]["metadata"]["segment"] == 0
+    assert index.top_ks[-1] >= 40
+
+    ungrouped = search.search([0.1], top_k=10, group=False)
+    assert len({r["metadata"]["s3_file_name"] for r in ungrouped["results"]}) == 3
+
+
+def test_incremental_first_page_starts_with_a_preview(monkeypatch, tmp_path):
+    index = FakeIndex(60)
+    search = load_search(monkeypatch, tmp_path, index)
+
+    parts = list(search.search([0.1], top_k=40, page_size=30, group=False, incremental=True))
+    assert [len(part["results"]) for part in parts] == [search.PREVIEW_SIZE, 30 - search.PREVIEW_SIZE]
+    assert "next_cursor" not in parts[0]
+    assert sorted(c["top_k"] for c in index.calls) == [search.PREVIEW_SIZE, 30]
+
+    # Joined, the parts are the page a JSON request gets.
+    page = search.search([0.1], top_k=40, page_size=30, group=False)
+    assert [r for part in parts for r in part["results"]] == page["results"]
+    assert parts[-1]["next_cursor"] == page["next_cursor"]
+
+
+class SpreadSegmentIndex:
+    """The top video's second segment ranks below a run of images."""
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, namespace="", **kwargs):
+        matches = []
+        for i in range(min(top_k, 40)):
+            if i in (0, 15):
+                segment = i // 15
+                metadata = {
+                    "s3_file_name": "0.mp4",
+                    "file_type": "video",
+                    "segment": segment,
+                    "start_offset_sec": segment * 15,
+                    "end_offset_sec": segment * 15 + 15,
+                }
+            else:
+                metadata = {"s3_file_name": f"{i}.png", "file_type": "image"}
+            matches.append({"id": str(i), "score": 1 - i / 100, "metadata": metadata})
+        return {"matches": matches}
+
+
+def test_grouped_preview_is_patched_with_the_full_segments(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, SpreadSegmentIndex())
+    monkeypatch.setattr(search, "PREVIEW_SIZE", 2)
+
+    parts = list(search.search([0.1], top_k=10, incremental=True))
+    page = search.search([0.1], top_k=10)
+    # The shallow query saw fewer segments of the top video than the full page.
+    assert len(parts[0]["results"][0]["segments"]) == 1
+    assert parts[-1]["updates"] == [{"index": 0, "result": page["results"][0]}]
+    assert search._join(parts) == page
+
+
+def test_grouped_pages_stop_at_max_top_k(monkeypatch, tmp_path):
+    class LongVideoIndex:
+        def query(self, vector, top_k, **kwargs):
+            matches = [
+                {"id": str(i), "score": 1 - i / 10000, "metadata": {"s3_file_name": f"{i // 100}.mp4"}}
+                for i in range(top_k)
+            ]
+            return {"matches": matches}
+
+    search = load_search(monkeypatch, tmp_path, LongVideoIndex())
+    page = search.search([0.1], top_k=50, page_size=8)
+    seen = len(page["results"])
+    while page["next_cursor"]:
+        page = search.next_page(page["next_cursor"])
+        assert page["results"], "a cursor led to an empty page"
+        seen += len(page["results"])
+    assert seen == search.MAX_TOP_K // 100
+
+
+def test_first_page_and_cursor_are_shared_across_workers(monkeypatch, tmp_path):
+    index = FakeIndex(30)
+    search = load_search(monkeypatch, tmp_path, index)
+
+    first = search.search([0.5, 0.25], top_k=20, page_size=10, group=False)
+    assert search.search([0.5, 0.25], top_k=20, page_size=10, group=False) == first
+    assert len(index.calls) == 1
+
+    # Another worker has none of this process's state, only the cache file.
+    search._queries.clear()
+    second = search.next_page(first["next_cursor"])
+    assert second["results"][0]["metadata"]["s3_file_name"] == "10.png"
+
+
+def test_blend_normalizes_and_weights(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, FakeIndex(0))
+    blended = search.blend([(0.75, [2.0, 0.0]), (0.25, [0.0, 5.0])])
+    assert blended[0] == pytest.approx(0.9487, abs=1e-4)
+    assert blended[1] == pytest.approx(0.3162, abs=1e-4)
+
+
+class DirectionIndex:
+    """Scores files by how well the query points at them: x favours a*, y favours b*."""
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, namespace="", **kwargs):
+        names = ["a0", "ab", "a1", "b0", "b1"] if vector[0] > vector[1] else ["b0", "ab", "b1", "a0", "a1"]
+        matches = [
+            {"id": name, "score": 1 - i / 10, "metadata": {"s3_file_name": f"{name}.png"}}
+            for i, name in enumerate(names[:top_k])
+        ]
+        return {"matches": matches}
+
+
+def test_rrf_fusion_ranks_shared_matches_first(monkeypatch, tmp_path):
+    search = load_search(monkeypatch, tmp_path, DirectionIndex())
+    parts = [(0.5, [1.0, 0.0]), (0.5, [0.0, 1.0])]
+
+    first = search.search_fused(parts, "rrf", top_k=5, page_size=2)
+    names = [r["metadata"]["s3_file_name"] for r in first["results"]]
+    assert names[0] == "ab.png"
+    assert first["results"][0]["score"] == pytest.approx(1 / 62)
+
+    second = search.next_page(first["next_cursor"])
+    assert len(second["results"]) == 2
+    assert not {r["metadata"]["s3_file_name"] for r in second["results"]} & set(names)
+
+    with pytest.raises(ValueError):
+        search.search_fused(parts, "average")
+
+
+class SegmentDirectionIndex:
+    """Both queries find video v, each through a different segment, and distinct images."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def query(self, vector, top_k, filter=None, include_metadata=True, namespace="", **kwargs):
+        self.calls += 1
+        side = "x" if vector[0] > vector[1] else "y"
+        segment = 0 if side == "x" else 3
+        matches = [{"id": f"v-{segment}", "score": 0.99, "metadata": {
+            "s3_file_name": "v.mp4", "segment": segment, "start_offset_sec": segment * 15, "end_offset_sec": segment * 15 + 15,
+        }}]
+        matches += [
+            {"id": f"{side}{i}", "score": 0.9 - i / 100, "metadata": {"s3_file_name": f"{side}{i}.png"}}
+            for i in range(top_k - 1)
+        ]
+        return {"matches": matches[:top_k]}
+
+
+def test_rrf_fusion_combines_segments_and_pages_one_ranking(monkeypatch, tmp_path):
+    index = SegmentDirectionIndex()
+    search = load_search(monkeypatch, tmp_path, index)
+    parts = [(0.5, [1.0, 0.0]), (0.5, [0.0, 1.0])]
+
+    page = search.search_fused(parts, "rrf", top_k=12, page_size=4)
+    assert page["results"][0]["metadata"]["s3_file_name"] == "v.mp4"
+    assert page["results"][0]["score"] == pytest.approx(1 / 61)
+    calls = index.calls
+
+    names = [r["metadata"]["s3_file_name"] for r in page["results"]]
+    while page["next_cursor"]:
+        page = search.next_page(page["next_cursor"])
+        names += [r["metadata"]["s3_file_name"] for r in page["results"]]
+    assert len(names) == 12 and len(set(names)) == 12
+    assert names.count("v.mp4") == 1
+    # Later pages slice the ranking fused for the first page.
+    assert index.calls == calls
@@ -0,0 +1,78 @@
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import shared_cache
+from api.shared_cache import SharedCache, WAYS
+
+
+def test_get_and_set(tmp_path):
+    cache = SharedCache(str(tmp_path / "c.cache"), 64, 32)
+    assert cache.get("a") is None
+    assert cache.set("a", b"first")
+    assert cache.set("a", b"second")
+    assert cache.get("a") == b"second"
+    assert not cache.set("b", b"x" * 33)
+    assert cache.get("b") is None
+
+
+def test_instances_share_the_file(tmp_path):
+    path = str(tmp_path / "c.cache")
+    writer = SharedCache(path, 64, 32)
+    reader = SharedCache(path, 64, 32)
+    writer.set("vector", b"\x01\x02")
+    assert reader.get("vector") == b"\x01\x02"
+
+    # A file another worker may have mapped is never resized or cleared.
+    with pytest.raises(ValueError):
+        SharedCache(path, 128, 32)
+    assert reader.get("vector") == b"\x01\x02"
+
+
+def test_get_cache_keeps_a_file_per_geometry(tmp_path):
+    old = shared_cache.get_cache("geometry", 64, 32, str(tmp_path))
+    old.set("a", b"old")
+    new = shared_cache.get_cache("geometry", 128, 32, str(tmp_path))
+
+    assert new is not old
+    assert new.get("a") is None
+    assert old.get("a") == b"old"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "sock-scout-geometry-v1-128x32.cache",
+        "sock-scout-geometry-v1-64x32.cache",
+    ]
+
+
+def test_ttl(tmp_path, monkeypatch):
+    cache = SharedCache(str(tmp_path / "c.cache"), 64, 32)
+    cache.set("a", b"1", ttl=10)
+    assert cache.get("a") == b"1"
+    now = time.time()
+    monkeypatch.setattr(shared_cache.time, "time", lambda: now + 11)
+    assert cache.get("a") is None
+
+
+def test_clock_eviction_keeps_recently_read_entries(tmp_path):
+    # A single set, so every key competes for the same slots.
+    cache = SharedCache(str(tmp_path / "c.cache"), WAYS, 8)
+    for i in range(WAYS):
+        cache.set(str(i), b"v")
+    # The sweep clears every reference bit and evicts the first entry.
+    cache.set("new", b"v")
+    assert cache.get("0") is None
+    cache.get("1")
+
+    cache.set("newer", b"v")
+    assert cache.get("1") == b"v"
+    assert cache.get("2") is None
+    assert cache.get("new") == b"v"
+
+
+def test_get_cache_disabled(tmp_path):
+    assert shared_cache.get_cache("off", 0, 8, str(tmp_path)) is None
+    cache = shared_cache.get_cache("on", 16, 8, str(tmp_path))
+    assert cache is shared_cache.get_cache("on", 16, 8, str(tmp_path))
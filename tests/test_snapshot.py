@@ -0,0 +1,111 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import snapshot
+
+
+def test_snapshot_roundtrip_in_chunks(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path), dtype="float16", chunk_rows=2)
+    for i in range(5):
+        writer.add(f"id-{i}", [float(i)] * 4, {"file_type": "image"} if i % 2 else {"segment": i})
+    manifest = writer.close()
+
+    assert len(manifest["chunks"]) == 3
+    ids, vectors, metadata = snapshot.Snapshot(str(tmp_path)).load()
+    assert ids == [f"id-{i}" for i in range(5)]
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors[:, 0], range(5))
+    assert metadata[1] == {"file_type": "image"}
+    assert metadata[2] == {"segment": 2}
+
+
+def test_incremental_export_appends_and_tombstones(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("a", [1.0, 0.0])
+    writer.add("b", [0.0, 1.0])
+    writer.close()
+
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("c", [1.0, 1.0])
+    manifest = writer.close(deleted=["a"])
+
+    assert len(manifest["chunks"]) == 2
+    assert snapshot.Snapshot(str(tmp_path)).ids() == ["b", "c"]
+
+
+def test_int8_snapshot_is_dequantized(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path), dtype="int8")
+    writer.add("a", [0.5, -1.0, 0.25])
+    writer.add("b", [0.0, 0.0, 0.0])
+    writer.close()
+
+    assert np.load(tmp_path / "chunk-00000.vectors.npy").dtype == np.int8
+    _, vectors, _ = snapshot.Snapshot(str(tmp_path)).load()
+    assert vectors.dtype == np.float32
+    assert np.allclose(vectors, [[0.5, -1.0, 0.25], [0.0, 0.0, 0.0]], atol=0.01)
+
+
+def test_rewritten_id_supersedes_earlier_row(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("a", [1.0, 0.0], {"file_type": "image"})
+    writer.add("b", [0.0, 1.0])
+    writer.close(deleted=[])
+
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.close(deleted=["a"])
+    # "a" is re-added with new metadata after being deleted.
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("a", [1.0, 0.0], {"file_type": "video"})
+    writer.add("b", [0.5, 0.5])
+    writer.close()
+
+    ids, vectors, metadata = snapshot.Snapshot(str(tmp_path)).load()
+    assert ids == ["a", "b"]
+    assert metadata[0] == {"file_type": "video"}
+    assert np.allclose(vectors[1], [0.5, 0.5])
+
+
+def test_digests_detect_changed_rows(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path), dtype="int8")
+    writer.add("a", [1.0, 0.0], {"file_type": "image"})
+    writer.close()
+
+    digests = snapshot.Snapshot(str(tmp_path)).digests()
+    assert digests[("", "a")] == snapshot.row_digest([1.0, 0.0], {"file_type": "image"})
+    assert digests[("", "a")] != snapshot.row_digest([1.0, 0.0], {"file_type": "video"})
+    assert digests[("", "a")] != snapshot.row_digest([0.9, 0.1], {"file_type": "image"})
+
+
+def test_rows_are_kept_apart_by_namespace(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("a", [1.0, 0.0], {"namespace": "image"})
+    writer.add("a", [0.0, 1.0], {"namespace": "video"})
+    writer.add("b", [0.5, 0.5], {"namespace": "video"})
+    writer.close()
+
+    # Rewriting "a" in one namespace leaves the other namespace's row alone.
+    writer = snapshot.SnapshotWriter(str(tmp_path))
+    writer.add("a", [0.6, 0.8], {"namespace": "image"})
+    writer.close(removed=[("video", "b")])
+
+    ids, vectors, metadata = snapshot.Snapshot(str(tmp_path)).load()
+    assert sorted(zip(ids, [m["namespace"] for m in metadata])) == [("a", "image"), ("a", "video")]
+    digests = snapshot.Snapshot(str(tmp_path)).digests()
+    assert set(digests) == {("image", "a"), ("video", "a")}
+    assert digests[("image", "a")] == snapshot.row_digest([0.6, 0.8], {"namespace": "image"})
+
+
+def test_appending_with_another_dtype_is_rejected(tmp_path):
+    writer = snapshot.SnapshotWriter(str(tmp_path), dtype="float16")
+    writer.add("a", [1.0, 0.0])
+    writer.close()
+
+    with pytest.raises(ValueError, match="float16"):
+        snapshot.SnapshotWriter(str(tmp_path), dtype="int8")
+    assert snapshot.SnapshotWriter(str(tmp_path)).dtype == "float16"
+    assert snapshot.SnapshotWriter(str(tmp_path), dtype="float16").dtype == "float16"
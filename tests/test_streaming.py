@@ -0,0 +1,100 @@
+import asyncio
+import json
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import streaming
+
+PAGE = {"results": [{"score": 0.9, "metadata": {"s3_file_name": "a.png"}}, {"score": 0.8, "metadata": {}}], "next_cursor": "abc"}
+
+
+def request(accept):
+    return types.SimpleNamespace(headers={"accept": accept} if accept else {})
+
+
+def page_search(incremental=False):
+    # The first result is a preview; the last part carries the cursor.
+    parts = [{"results": PAGE["results"][:1]}, {"results": PAGE["results"][1:], "next_cursor": "abc"}]
+    return iter(parts) if incremental else PAGE
+
+
+async def body(response) -> str:
+    return "".join([chunk async for chunk in response.body_iterator])
+
+
+def test_json_unless_a_stream_is_requested():
+    assert asyncio.run(streaming.respond(request(None), page_search)) is PAGE
+    assert asyncio.run(streaming.respond(request("application/json"), page_search)) is PAGE
+    response = asyncio.run(streaming.respond(request("application/x-ndjson"), page_search))
+    assert response.media_type == streaming.NDJSON
+
+
+def test_ndjson_lines():
+    response = asyncio.run(streaming.respond(request(streaming.NDJSON), page_search))
+    lines = [json.loads(line) for line in asyncio.run(body(response)).splitlines()]
+    assert [line["result"]["score"] for line in lines[:-1]] == [0.9, 0.8]
+    assert lines[-1] == {"next_cursor": "abc"}
+
+
+def test_server_sent_events():
+    response = asyncio.run(streaming.respond(request(streaming.EVENT_STREAM), page_search))
+    events = asyncio.run(body(response)).strip().split("\n\n")
+    assert events[0].startswith("event: result\ndata: ")
+    assert json.loads(events[0].split("data: ", 1)[1])["metadata"] == {"s3_file_name": "a.png"}
+    assert events[-1] == 'event: done\ndata: {"next_cursor":"abc"}'
+
+
+def test_updated_preview_results_are_sent_again():
+    def patched_search(incremental=False):
+        update = {"index": 0, "result": {"score": 0.9, "segments": [{"segment": 0}, {"segment": 1}]}}
+        return iter([{"results": [{"score": 0.9, "segments": [{"segment": 0}]}]}, {"results": [], "updates": [update], "next_cursor": None}])
+
+    response = asyncio.run(streaming.respond(request(streaming.NDJSON), patched_search))
+    lines = [json.loads(line) for line in asyncio.run(body(response)).splitlines()]
+    assert lines[1] == {"update": {"index": 0, "result": {"score": 0.9, "segments": [{"segment": 0}, {"segment": 1}]}}}
+    assert lines[-1] == {"next_cursor": None}
+
+    response = asyncio.run(streaming.respond(request(streaming.EVENT_STREAM), patched_search))
+    events = asyncio.run(body(response)).strip().split("\n\n")
+    assert events[1].startswith("event: update\ndata: ")
+
+
+def test_first_part_is_sent_before_the_rest_is_ready():
+    produced = []
+
+    def slow_search(incremental=False):
+        def parts():
+            produced.append("preview")
+            yield {"results": [{"score": 1.0}]}
+            produced.append("rest")
+            yield {"results": [{"score": float(i)} for i in range(120)], "next_cursor": None}
+        return parts()
+
+    async def run():
+        response = await streaming.respond(request(streaming.NDJSON), slow_search)
+        chunks = response.body_iterator
+        first = await chunks.__anext__()
+        assert produced == ["preview"]
+        assert json.loads(first) == {"result": {"score": 1.0}}
+        rest = [chunk async for chunk in chunks]
+        # The rest of the page arrives in batches, the cursor with the last one.
+        assert len(rest) == 3
+        assert rest[-1].endswith('{"next_cursor":null}\n')
+
+    asyncio.run(run())
+
+
+def test_errors_are_raised_before_the_response_starts():
+    def failing_search(incremental=False):
+        def parts():
+            raise ValueError("Invalid date")
+            yield
+        return parts()
+
+    with pytest.raises(ValueError):
+        asyncio.run(streaming.respond(request(streaming.NDJSON), failing_search))
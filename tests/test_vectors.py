@@ -0,0 +1,38 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from api import vectors
+
+
+@pytest.mark.parametrize("dtype", vectors.DTYPES)
+def test_bytes_roundtrip(dtype):
+    vector = np.random.default_rng(0).standard_normal(1408).tolist()
+    data = vectors.to_bytes(vector, dtype)
+    assert len(data) == vectors.nbytes(1408, dtype)
+
+    decoded = np.asarray(vectors.from_bytes(data, dtype))
+    cosine = decoded @ vector / (np.linalg.norm(decoded) * np.linalg.norm(vector))
+    assert cosine > 0.9999
+
+
+def test_int8_scores_match_full_precision():
+    rng = np.random.default_rng(1)
+    matrix = rng.standard_normal((50, 64)).astype(np.float32)
+    matrix[3] = 0
+    query = rng.standard_normal(64)
+
+    codes, scales = vectors.quantize(matrix, "int8")
+    assert codes.dtype == np.int8 and scales.shape == (50,)
+    assert np.allclose(vectors.dequantize(codes, scales), matrix, atol=float(scales.max()))
+    assert np.allclose(vectors.scores(query, codes, scales), matrix @ query, rtol=0.05, atol=0.5)
+    assert np.argmax(vectors.scores(query, codes, scales)) == np.argmax(matrix @ query)
+
+
+def test_unknown_dtype():
+    with pytest.raises(ValueError):
+        vectors.nbytes(8, "bfloat16")